@@ -0,0 +1,209 @@
+"""
+Persistent translation memory.
+
+The memory sits in front of the translator services and remembers every
+translation by `(service, source language, target language, text)`, so that
+strings which did not change between two runs are not sent to the service again.
+"""
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import six
+
+from autotranslate.utils import get_cache_dir
+
+# the most parameters of a query of SQLite before 3.32
+MAX_VARIABLES = 999
+# the translations stored over `max_entries` before they are evicted, as a fraction of `max_entries`
+EVICT_SLACK = 0.1
+# the translations stored between two evictions of the ones older than `max_age`
+EVICT_EVERY = 10000
+
+
+def normalize_text(text):
+    """
+    Returns the form of `text` used for the lookups in the translation memory.
+    """
+    return unicodedata.normalize('NFC', six.text_type(text))
+
+
+class BaseTranslationMemory(object):
+    """
+    Defines the base methods that should be implemented by a translation memory store
+    """
+
+    def __init__(self, max_entries=None, max_age=None):
+        """
+        :param max_entries: maximum number of translations to keep, least recently used ones are evicted first
+        :param max_age:     maximum age (in seconds) of a translation before it is evicted
+        """
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, service, source_language, target_language, texts):
+        """
+        Returns a dict mapping each of the `texts` that is known to its translation.
+        """
+        raise NotImplementedError('.get_many() must be overridden.')
+
+    def contains_many(self, service, source_language, target_language, texts):
+        """
+        Returns the set of the `texts` that are known, without counting them as used.
+        """
+        return set(self.get_many(service, source_language, target_language, texts))
+
+    def set_many(self, service, source_language, target_language, translations):
+        """
+        Stores the `translations`, a dict mapping texts to their translation.
+        """
+        raise NotImplementedError('.set_many() must be overridden.')
+
+    def evict(self):
+        """
+        Removes the translations exceeding the `max_entries` and `max_age` limits.
+        """
+        raise NotImplementedError('.evict() must be overridden.')
+
+    def clear(self):
+        """
+        Removes all the translations.
+        """
+        raise NotImplementedError('.clear() must be overridden.')
+
+    def record(self, hits, misses):
+        self.hits += hits
+        self.misses += misses
+
+    @property
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class SQLiteTranslationMemory(BaseTranslationMemory):
+    """
+    Stores the translations in a SQLite database, `translation_memory.sqlite3` in the cache directory by default,
+    ':memory:' keeps them for the life of the process only.
+    """
+
+    def __init__(self, location=None, max_entries=None, max_age=None):
+        super(SQLiteTranslationMemory, self).__init__(max_entries=max_entries, max_age=max_age)
+        if location is None:
+            location = os.path.join(get_cache_dir(), 'translation_memory.sqlite3')
+        self.location = location
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(location, check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS translation_memory ('
+            'service TEXT NOT NULL, source TEXT NOT NULL, target TEXT NOT NULL, '
+            'text TEXT NOT NULL, translation TEXT NOT NULL, '
+            'created REAL NOT NULL, accessed REAL NOT NULL, '
+            'PRIMARY KEY (service, source, target, text))')
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS translation_memory_accessed ON translation_memory (accessed)')
+        self.connection.commit()
+        # an upper bound of the translations stored, counted by the next eviction
+        self.rows = None
+        self.written = 0
+
+    def select(self, columns, service, source_language, target_language, texts):
+        """
+        Returns the text and the `columns` of the stored `texts`, by as few queries as the parameters allow.
+        """
+        texts = list(texts)
+        size = MAX_VARIABLES - 3
+        rows = []
+        for start in range(0, len(texts), size):
+            chunk = texts[start:start + size]
+            rows.extend(self.connection.execute(
+                'SELECT text, {} FROM translation_memory '
+                'WHERE service = ? AND source = ? AND target = ? AND text IN ({})'.format(
+                    ', '.join(columns), ', '.join('?' * len(chunk))),
+                [service, source_language, target_language] + chunk).fetchall())
+        return rows
+
+    def get_many(self, service, source_language, target_language, texts):
+        texts = set(normalize_text(text) for text in texts)
+        found = {}
+        if not texts:
+            return found
+
+        oldest = time.time() - self.max_age if self.max_age else None
+        with self.lock:
+            for text, translation, created in self.select(('translation', 'created'), service,
+                                                          source_language, target_language, texts):
+                if oldest is None or created >= oldest:
+                    found[text] = translation
+
+            if found:
+                now = time.time()
+                self.connection.executemany(
+                    'UPDATE translation_memory SET accessed = ? '
+                    'WHERE service = ? AND source = ? AND target = ? AND text = ?',
+                    [(now, service, source_language, target_language, text) for text in found])
+                self.connection.commit()
+
+            self.record(len(found), len(texts) - len(found))
+        return found
+
+    def contains_many(self, service, source_language, target_language, texts):
+        texts = set(normalize_text(text) for text in texts)
+        oldest = time.time() - self.max_age if self.max_age else None
+        known = set()
+        with self.lock:
+            for text, created in self.select(('created',), service, source_language, target_language, texts):
+                if oldest is None or created >= oldest:
+                    known.add(text)
+        return known
+
+    def set_many(self, service, source_language, target_language, translations):
+        if not translations:
+            return
+
+        now = time.time()
+        with self.lock:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO translation_memory '
+                '(service, source, target, text, translation, created, accessed) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(service, source_language, target_language, normalize_text(text), translation, now, now)
+                 for text, translation in translations.items()])
+            self.connection.commit()
+            if self.rows is None:
+                self.rows = self.connection.execute('SELECT COUNT(*) FROM translation_memory').fetchone()[0]
+            else:
+                self.rows += len(translations)
+            self.written += len(translations)
+            # evicting on every write would sort the whole table every time
+            evict = ((self.max_entries and self.rows > self.max_entries + int(self.max_entries * EVICT_SLACK))
+                     or (self.max_age and self.written >= EVICT_EVERY))
+        if evict:
+            self.evict()
+
+    def evict(self):
+        with self.lock:
+            if self.max_age:
+                self.connection.execute('DELETE FROM translation_memory WHERE created < ?',
+                                        (time.time() - self.max_age,))
+            if self.max_entries:
+                self.connection.execute(
+                    'DELETE FROM translation_memory WHERE rowid IN ('
+                    'SELECT rowid FROM translation_memory ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                    (self.max_entries,))
+            self.connection.commit()
+            self.rows = self.connection.execute('SELECT COUNT(*) FROM translation_memory').fetchone()[0]
+            self.written = 0
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM translation_memory')
+            self.connection.commit()
+            self.rows = 0
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM translation_memory').fetchone()[0]
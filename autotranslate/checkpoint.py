@@ -0,0 +1,119 @@
+"""
+The checkpoint journal of `translate_messages`.
+
+The translations are appended to the journal as soon as they are received,
+so a run that is killed can be resumed with `--resume` without translating them again.
+The journal is removed once the run completes.
+A run holds a lock on its journal, another run cannot use the same journal meanwhile.
+"""
+import errno
+import io
+import json
+import os
+import threading
+
+import six
+
+from autotranslate.files import fcntl
+
+
+class JournalInUse(IOError):
+    """
+    Raised when the journal is used by another run.
+    """
+
+
+class Journal(object):
+    """
+    A JSON lines file of the translations received, `{"language": ..., "source": ..., "translation": ...}`.
+    """
+
+    def __init__(self, path, resume=False):
+        """
+        :param path:    the path of the journal
+        :param resume:  keep the translations of the previous run instead of starting over
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.translations = {}
+        # appended to, not truncated before the lock is taken
+        self.file = io.open(path, 'a', encoding='utf-8')
+        try:
+            self.acquire()
+            if resume:
+                self.load()
+            else:
+                self.file.truncate(0)
+        except BaseException:
+            self.file.close()
+            raise
+
+    def acquire(self):
+        """
+        Takes the lock of the journal file without waiting for the run holding it, it is held until it is closed.
+        The lock is not taken where `fcntl` is not available.
+        """
+        if fcntl is None:
+            return
+        try:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (IOError, OSError) as e:
+            if e.errno in (errno.EAGAIN, errno.EACCES):
+                raise JournalInUse(e.errno, 'used by another run', self.path)
+            raise
+        try:
+            replaced = os.stat(self.path).st_ino != os.fstat(self.file.fileno()).st_ino
+        except OSError:
+            replaced = True
+        if replaced:
+            # removed by the run which held the lock
+            raise JournalInUse(errno.EAGAIN, 'used by another run', self.path)
+
+    def load(self):
+        try:
+            f = io.open(self.path, encoding='utf-8')
+        except (IOError, OSError):
+            return
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the last line may be cut short by the crash
+                    continue
+                self.translations.setdefault(record['language'], {})[record['source']] = record['translation']
+
+    def get(self, target_language):
+        """
+        Returns the translations to `target_language` received so far by their source strings.
+        """
+        with self.lock:
+            return dict(self.translations.get(target_language, {}))
+
+    def write(self, target_language, translations):
+        """
+        Appends the `translations` to `target_language` by their source strings to the journal.
+        """
+        lines = [json.dumps({'language': target_language, 'source': source, 'translation': translation},
+                            ensure_ascii=False) + u'\n'
+                 for source, translation in translations.items()]
+        with self.lock:
+            self.translations.setdefault(target_language, {}).update(translations)
+            for line in lines:
+                # json.dumps() returns str on python 2
+                self.file.write(line if isinstance(line, six.text_type) else line.decode('utf-8'))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self, remove=False):
+        try:
+            if remove:
+                try:
+                    os.remove(self.path)
+                except OSError as e:
+                    # removed already
+                    if e.errno != errno.ENOENT:
+                        raise
+        finally:
+            # releases the lock
+            self.file.close()
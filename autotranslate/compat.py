@@ -10,17 +10,38 @@ except ImportError:
     from django.utils import importlib
 
 try:
-    import goslate
+    # Moved to collections.abc in Python 3.3
+    from collections.abc import Iterable
 except ImportError:
-    goslate = None
-except SyntaxError:
-    import sys
-    import warnings
-    warnings.warn('goslate disabled due lack support of Python-%s' % (
-        sys.version.split()[0][:3]), RuntimeWarning)
-    goslate = None
+    from collections import Iterable
 
 try:
-    import googleapiclient
+    # Django 1.8+, without importing the test machinery of django
+    from django.core.signals import setting_changed
 except ImportError:
-    googleapiclient = None
+    from django.test.signals import setting_changed
+
+try:
+    # Django 1.10+
+    from django.utils.deprecation import MiddlewareMixin
+except ImportError:
+    MiddlewareMixin = object
+
+
+def import_optional(module_name):
+    """
+    Returns the optional package `module_name`, or None if it is not installed.
+
+    The optional packages are only imported by the services that use them,
+    so an unused backend neither slows down the startup nor needs to be installed.
+    """
+    try:
+        return importlib.import_module(module_name)
+    except ImportError:
+        return None
+    except SyntaxError:
+        import sys
+        import warnings
+        warnings.warn('%s disabled due lack support of Python-%s' % (
+            module_name, sys.version.split()[0][:3]), RuntimeWarning)
+        return None
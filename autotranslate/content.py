@@ -0,0 +1,132 @@
+"""
+Translates the text fields of Django models into per-language fields, e.g. `title` into `title_de`,
+as django-modeltranslation lays them out.
+
+The rows are read in chunks by primary key, the values of a chunk are translated by a single call
+to the translator service per language, identical values once, and the chunk is written back
+by `bulk_update()`, so neither all the rows nor a request per row are ever needed.
+"""
+import logging
+from collections import OrderedDict
+
+from django.db import transaction
+
+from autotranslate.utils import translate_strings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+# the translations kept across the chunks per language, identical values in different chunks are translated once
+DEFAULT_CACHE_SIZE = 100000
+
+
+def localized_field_name(field, language, pattern='{field}_{language}'):
+    """
+    Returns the name of the field holding the translation of `field` into the language, `title_pt_br`
+    for `title` in `pt-BR`.
+    """
+    return pattern.format(field=field, language=language.lower().replace('-', '_'))
+
+
+def translate_fields(queryset, fields, languages, source_language='en', skip_translated=False,
+                     chunk_size=DEFAULT_CHUNK_SIZE, pattern='{field}_{language}', cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Translates the `fields` of the rows of the `queryset` (or of a model) into the per-language fields.
+
+    :param fields:          the names of the text fields to translate
+    :param languages:       the target languages, e.g. `['de', 'pt-BR']`
+    :param skip_translated: leave the per-language fields that are not empty
+    :param chunk_size:      rows read, translated and written at once
+    :param pattern:         the names of the per-language fields, see `localized_field_name()`
+    :param cache_size:      translations kept in memory across the chunks per language
+    :return:                the counts of `rows` read, rows `updated` and `strings` translated per language
+    """
+    if not hasattr(queryset, 'model'):
+        queryset = queryset._default_manager.all()
+    model = queryset.model
+    targets = dict(((field, language), localized_field_name(field, language, pattern))
+                   for field in fields for language in languages)
+    for name in list(fields) + list(targets.values()):
+        # raises FieldDoesNotExist before anything is translated
+        model._meta.get_field(name)
+
+    counts = {'rows': 0, 'updated': 0, 'strings': dict.fromkeys(languages, 0)}
+    caches = dict((language, {}) for language in languages)
+    queryset = queryset.order_by('pk').only('pk', *(list(fields) + list(targets.values())))
+    last = None
+    while True:
+        chunk = queryset.filter(pk__gt=last) if last is not None else queryset
+        rows = list(chunk[:chunk_size])
+        if not rows:
+            break
+        last = rows[-1].pk
+        counts['rows'] += len(rows)
+
+        changed = {}
+        for language in languages:
+            strings = translate_rows(rows, fields, language, source_language, targets, skip_translated,
+                                     caches[language], cache_size, changed)
+            counts['strings'][language] += strings
+
+        if changed:
+            update_rows(model, list(changed.values()), sorted(set(name for names in changed.values()
+                                                                   for name in names[1])))
+            counts['updated'] += len(changed)
+        logger.debug('translated {} rows of `{}`'.format(counts['rows'], model._meta.label))
+
+    logger.info('translated {} of {} rows of `{}` into {}'.format(
+        counts['updated'], counts['rows'], model._meta.label, ', '.join(languages)))
+    return counts
+
+
+def translate_rows(rows, fields, language, source_language, targets, skip_translated, cache, cache_size, changed):
+    """
+    Sets the translations of the `fields` of the `rows` into the language, the rows changed are added
+    to `changed` by primary key, with the names of their fields changed.
+    Returns the number of strings sent to the translator service.
+    """
+    values, pending = set(), OrderedDict()
+    for row in rows:
+        for field in fields:
+            value = getattr(row, field)
+            if not value or (skip_translated and getattr(row, targets[(field, language)])):
+                continue
+            values.add(value)
+            if value not in cache:
+                pending[value] = None
+
+    if pending:
+        strings = list(pending)
+        if len(cache) + len(strings) > cache_size:
+            # keep the translations of this chunk only
+            kept = dict((value, cache[value]) for value in values if value in cache)
+            cache.clear()
+            cache.update(kept)
+        cache.update(zip(strings, translate_strings(strings, language, source_language, False)))
+
+    for row in rows:
+        for field in fields:
+            value = getattr(row, field)
+            target = targets[(field, language)]
+            if not value or (skip_translated and getattr(row, target)):
+                continue
+            if getattr(row, target) != cache[value]:
+                setattr(row, target, cache[value])
+                changed.setdefault(row.pk, (row, set()))[1].add(target)
+    return len(pending)
+
+
+def update_rows(model, changed, names):
+    """
+    Writes the `names` fields of the `(row, names)` changed.
+    """
+    manager = model._default_manager
+    rows = [row for row, row_names in changed]
+    if hasattr(manager, 'bulk_update'):
+        manager.bulk_update(rows, names)
+        return
+
+    # django < 2.2
+    with transaction.atomic(using=manager.db):
+        for row, row_names in changed:
+            manager.filter(pk=row.pk).update(**dict((name, getattr(row, name)) for name in row_names))
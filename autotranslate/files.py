@@ -0,0 +1,83 @@
+"""
+Atomic and change-aware writes of the files produced by `translate_messages`.
+"""
+import contextlib
+import io
+import os
+import tempfile
+
+import six
+
+from autotranslate.compat import import_optional
+
+fcntl = import_optional('fcntl')
+
+
+def write_atomic(path, data):
+    """
+    Replaces the file at `path` by `data` bytes, readers never see a partially written file.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix='.{}.'.format(name), suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            # keep the permissions of the file replaced, mkstemp() creates it private
+            os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+        except OSError:
+            pass
+        if hasattr(os, 'replace'):
+            os.replace(temp_path, path)
+        else:
+            # python 2
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_if_changed(path, data):
+    """
+    Writes `data` bytes to the file at `path` atomically, unless it has that content already.
+    Returns True if the file was written.
+    """
+    try:
+        with io.open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    except (IOError, OSError):
+        pass
+    write_atomic(path, data)
+    return True
+
+
+def save_po(po, path=None):
+    """
+    Saves the `polib.POFile` like `po.save()` does, if its content changed.
+    Returns True if the file was written.
+    """
+    contents = six.text_type(po)
+    return write_if_changed(path or po.fpath, contents.encode(po.encoding))
+
+
+@contextlib.contextmanager
+def locked(path):
+    """
+    Holds an exclusive lock on `<path>.lock` shared by the processes, e.g. the workers of a web server
+    updating the file at `path`. The lock is not taken where `fcntl` is not available.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open('{}.lock'.format(path), 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,70 @@
+"""
+Custom translations of terms, which the translation service should not translate itself.
+
+The terms are replaced by HTML tags before the strings are sent to the service
+and the tags are replaced by the custom translations afterwards.
+"""
+import re
+
+import six
+
+from autotranslate.placeholders import tag_pattern
+
+# the service may add spaces inside the tag, change its case or add a closing tag, e.g. `<T123T5 /></T123T5>`
+TAG_PATTERN = tag_pattern('T')
+
+
+class Glossary(object):
+    """
+    The custom translations of a language pair, compiled into a single pattern.
+    """
+
+    def __init__(self, custom_translations):
+        """
+        :param custom_translations: `(original, translation, id)` tuples,
+                                    the ones with the highest priority first
+        """
+        self.translations = {}
+        originals = []
+        for original, translation, pk in custom_translations:
+            if not original or original in self.translations:
+                continue
+            self.translations[original] = (pk, translation)
+            originals.append(original)
+
+        self.by_id = dict((six.text_type(pk), translation) for pk, translation in self.translations.values())
+        # the alternatives are tried in order at each position, so tags are skipped
+        # and the terms with a higher priority win
+        self.pattern = re.compile('|'.join(['<[^<>]*>'] + [re.escape(original) for original in originals])) \
+            if originals else None
+
+    def __len__(self):
+        return len(self.translations)
+
+    def protect(self, text):
+        """
+        Replaces the terms in `text` by tags.
+        """
+        if self.pattern is None:
+            return text
+        return self.pattern.sub(self._protect_term, text)
+
+    def _protect_term(self, match):
+        if match.group(0) not in self.translations:
+            # a tag
+            return match.group(0)
+        return '<T123T{}/>'.format(self.translations[match.group(0)][0])
+
+    def restore(self, text):
+        """
+        Replaces the tags in the translated `text` by the custom translations.
+        """
+        if not self.by_id:
+            return text
+        return TAG_PATTERN.sub(self._restore_tag, text)
+
+    def _restore_tag(self, match):
+        if match.group(1) is None:
+            # closing tag added by the service
+            return ''
+        return self.by_id.get(match.group(1), match.group(0))
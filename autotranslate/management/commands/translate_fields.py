@@ -0,0 +1,64 @@
+import logging
+from optparse import make_option
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+
+from autotranslate.content import DEFAULT_CHUNK_SIZE, translate_fields
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('autotranslate the text fields of a model into its per-language fields, '
+            'e.g. `translate_fields blog.Post title body -l de` fills up `title_de` and `body_de`.')
+    args = '<app_label.Model> <field> [<field> ...]'
+
+    # `option_list` was removed in django 1.10, `add_arguments()` is used instead
+    option_list = getattr(BaseCommand, 'option_list', ()) + (
+        make_option('--locale', '-l', default=[], dest='locale', action='append',
+                    help='autotranslate the fields into the given language(s) (e.g. pt-BR). '
+                         'can be used multiple times.'),
+        make_option('--untranslated', '-u', default=False, dest='skip_translated', action='store_true',
+                    help='autotranslate the empty per-language fields only.'),
+        make_option('--chunk-size', default=DEFAULT_CHUNK_SIZE, dest='chunk_size', type='int',
+                    help='number of rows read, translated and written at once.'),
+        make_option('--field-name', default='{field}_{language}', dest='field_name',
+                    help='names of the per-language fields, `{field}_{language}` by default.'),
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='the model, as app_label.Model')
+        parser.add_argument('fields', nargs='+', help='the text fields to autotranslate')
+        parser.add_argument('--locale', '-l', default=[], dest='locale', action='append',
+                            help='autotranslate the fields into the given language(s) (e.g. pt-BR). '
+                                 'can be used multiple times.')
+        parser.add_argument('--untranslated', '-u', default=False, dest='skip_translated', action='store_true',
+                            help='autotranslate the empty per-language fields only.')
+        parser.add_argument('--chunk-size', default=DEFAULT_CHUNK_SIZE, dest='chunk_size', type=int,
+                            help='number of rows read, translated and written at once.')
+        parser.add_argument('--field-name', default='{field}_{language}', dest='field_name',
+                            help='names of the per-language fields, `{field}_{language}` by default.')
+
+    def handle(self, *args, **options):
+        # positional arguments are passed as `args` by optparse
+        args = args or (options['model'],) + tuple(options['fields'])
+        if len(args) < 2:
+            raise CommandError('usage: translate_fields {}'.format(self.args))
+        if not options['locale']:
+            raise CommandError('at least one --locale should be given')
+        assert options['chunk_size'] > 0, '--chunk-size should be a positive number'
+
+        try:
+            model = apps.get_model(args[0])
+        except (LookupError, ValueError) as e:
+            raise CommandError(e)
+        try:
+            counts = translate_fields(model, args[1:], options['locale'], skip_translated=options['skip_translated'],
+                                      chunk_size=options['chunk_size'], pattern=options['field_name'])
+        except FieldDoesNotExist as e:
+            raise CommandError(e)
+
+        for language in options['locale']:
+            logger.info('{} strings translated into `{}`'.format(counts['strings'][language], language))
@@ -1,13 +1,23 @@
+import json
 import logging
+import multiprocessing
 import os
-import re
+import time
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 from optparse import make_option
 
 import polib
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
-from autotranslate.utils import translate_strings
+from autotranslate import signals
+from autotranslate.checkpoint import Journal
+from autotranslate.files import save_po, write_atomic, write_if_changed
+from autotranslate.manifest import Manifest, entry_key, file_state, has_translation
+from autotranslate.metrics import RunMetrics
+from autotranslate.sharding import assign_shards, parse_shard
+from autotranslate.utils import get_cache_dir, get_translator, translate_strings
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +26,17 @@ class Command(BaseCommand):
     help = ('autotranslate all the message files that have been generated '
             'using the `makemessages` command.')
 
-    option_list = BaseCommand.option_list + (
+    # thread pool of --jobs, while the command runs
+    pool = None
+    # single process pools of --processes, while the command runs, a file is loaded and saved by the same one
+    process_pools = None
+    # checkpoint journal, while the command runs
+    journal = None
+    # translations by target language and source string, kept between the runs of --watch
+    cache = None
+
+    # `option_list` was removed in django 1.10, `add_arguments()` is used instead
+    option_list = getattr(BaseCommand, 'option_list', ()) + (
         make_option('--locale', '-l', default=[], dest='locale', action='append',
                     help='autotranslate the message files for the given locale(s) (e.g. pt_BR). '
                          'can be used multiple times.'),
@@ -24,6 +44,33 @@ class Command(BaseCommand):
                     help='autotranslate the fuzzy and empty messages only.'),
         make_option('--set-fuzzy', '-f', default=False, dest='set_fuzzy', action='store_true',
                     help='set the fuzzy flag on autotranslated messages.'),
+        make_option('--jobs', '-j', default=1, dest='jobs', type='int',
+                    help='number of message files to autotranslate concurrently.'),
+        make_option('--incremental', '-i', default=False, dest='incremental', action='store_true',
+                    help='skip the message files and messages that did not change since the last run.'),
+        make_option('--manifest', default=None, dest='manifest',
+                    help='file remembering the state of the last run for --incremental.'),
+        make_option('--resume', default=False, dest='resume', action='store_true',
+                    help='reuse the translations received by the previous run which did not complete.'),
+        make_option('--checkpoint', default=None, dest='checkpoint',
+                    help='file the translations are saved to as they are received, for --resume.'),
+        make_option('--stats', default=None, dest='stats',
+                    help='write a JSON report of the timings, requests and characters per locale to the file.'),
+        make_option('--compile', '-c', default=False, dest='compile', action='store_true',
+                    help='compile the .mo files of the message files changed, like `compilemessages`.'),
+        make_option('--processes', '-p', default=0, dest='processes', type='int',
+                    help='parse and save the message files in this many worker processes.'),
+        make_option('--dry-run', '-n', default=False, dest='dry_run', action='store_true',
+                    help='report the strings, characters and requests to translate without translating.'),
+        make_option('--shard', default=None, dest='shard',
+                    help='translate only the I-th of N shares of the message files, e.g. 1/4.'),
+        make_option('--merge-shard', default=[], dest='merge_shard', action='append',
+                    help='check the message files were all translated by the shards of the --stats reports given. '
+                         'can be used multiple times.'),
+        make_option('--watch', '-w', default=False, dest='watch', action='store_true',
+                    help='keep running and autotranslate the new messages whenever the message files change.'),
+        make_option('--interval', default=1.0, dest='interval', type='float',
+                    help='seconds between the checks of the message files for --watch.'),
     )
 
     def add_arguments(self, parser):
@@ -38,22 +85,218 @@ class Command(BaseCommand):
                             help='autotranslate the fuzzy and empty messages only.')
         parser.add_argument('--set-fuzzy', '-f', default=False, dest='set_fuzzy', action='store_true',
                             help='set the fuzzy flag on autotranslated messages.')
+        parser.add_argument('--jobs', '-j', default=1, dest='jobs', type=int,
+                            help='number of message files to autotranslate concurrently.')
+        parser.add_argument('--incremental', '-i', default=False, dest='incremental', action='store_true',
+                            help='skip the message files and messages that did not change since the last run.')
+        parser.add_argument('--manifest', default=None, dest='manifest',
+                            help='file remembering the state of the last run for --incremental.')
+        parser.add_argument('--resume', default=False, dest='resume', action='store_true',
+                            help='reuse the translations received by the previous run which did not complete.')
+        parser.add_argument('--checkpoint', default=None, dest='checkpoint',
+                            help='file the translations are saved to as they are received, for --resume.')
+        parser.add_argument('--stats', default=None, dest='stats',
+                            help='write a JSON report of the timings, requests and characters per locale to the file.')
+        parser.add_argument('--compile', '-c', default=False, dest='compile', action='store_true',
+                            help='compile the .mo files of the message files changed, like `compilemessages`.')
+        parser.add_argument('--processes', '-p', default=0, dest='processes', type=int,
+                            help='parse and save the message files in this many worker processes.')
+        parser.add_argument('--dry-run', '-n', default=False, dest='dry_run', action='store_true',
+                            help='report the strings, characters and requests to translate without translating.')
+        parser.add_argument('--shard', default=None, dest='shard',
+                            help='translate only the I-th of N shares of the message files, e.g. 1/4.')
+        parser.add_argument('--merge-shard', default=[], dest='merge_shard', action='append',
+                            help='check the message files were all translated by the shards of the --stats reports '
+                                 'given. can be used multiple times.')
+        parser.add_argument('--watch', '-w', default=False, dest='watch', action='store_true',
+                            help='keep running and autotranslate the new messages whenever the message files change.')
+        parser.add_argument('--interval', default=1.0, dest='interval', type=float,
+                            help='seconds between the checks of the message files for --watch.')
 
     def set_options(self, **options):
         self.locale = options['locale']
         self.skip_translated = options['skip_translated']
         self.set_fuzzy = options['set_fuzzy']
+        self.jobs = options.get('jobs') or 1
+        self.watch = options.get('watch', False)
+        self.interval = options.get('interval') or 1.0
+        self.manifest = None
+        if options.get('incremental') or self.watch:
+            self.manifest = Manifest(options.get('manifest') or get_manifest_path())
+        self.resume = options.get('resume', False)
+        self.checkpoint = options.get('checkpoint')
+        self.stats = options.get('stats')
+        self.compile = options.get('compile', False)
+        self.processes = options.get('processes') or 0
+        self.dry_run = options.get('dry_run', False)
+        self.shard = None
+        if options.get('shard'):
+            try:
+                self.shard = parse_shard(options['shard'])
+            except ValueError as e:
+                raise CommandError(e)
+        self.shard_reports = options.get('merge_shard') or []
+        self.metrics = RunMetrics()
 
     def handle(self, *args, **options):
         self.set_options(**options)
 
         assert getattr(settings, 'USE_I18N', False), 'i18n framework is disabled'
         assert getattr(settings, 'LOCALE_PATHS', []), 'locale paths is not configured properly'
+        assert self.jobs > 0, '--jobs should be a positive number'
+        assert self.processes >= 0, '--processes should not be a negative number'
+
+        if self.shard_reports:
+            return self.merge_shards()
+        if self.watch:
+            return self.watch_files()
+
+        catalogs = self.run()
+        failures = sum(1 for catalog in catalogs if catalog.error is not None)
+        if failures:
+            raise CommandError('{} of {} message files could not be translated'.format(failures, len(catalogs)))
+
+    def run(self):
+        """
+        Translates the message files found, logs and reports the outcome.
+        Returns the catalogs of the message files, the failed ones have their `error` set.
+
+        :rtype: list[Catalog]
+        """
+        self.metrics = RunMetrics()
+        self.metrics.start()
+        with self.metrics.phase('discover'):
+            catalogs = [Catalog(*args) for args in self.find_files()]
+        if self.processes and catalogs:
+            # before any thread is started, the workers may be forked
+            self.process_pools = [multiprocessing.Pool(1) for _ in range(min(self.processes, len(catalogs)))]
+        self.pool = ThreadPool(min(self.jobs, len(catalogs))) if self.jobs > 1 and len(catalogs) > 1 else None
+        if not self.dry_run:
+            self.journal = self.open_journal()
+        try:
+            catalogs = self.translate_catalogs(catalogs)
+        finally:
+            for pool in [self.pool] + (self.process_pools or []):
+                if pool is not None:
+                    pool.close()
+                    pool.join()
+            self.pool = self.process_pools = None
+            if self.manifest is not None:
+                self.manifest.save()
+            if self.journal is not None:
+                # the journal is kept for --resume unless every file has been translated
+                self.journal.close(remove=all(catalog.error is None for catalog in catalogs))
+                self.journal = None
+            self.metrics.stop()
+
+        failures = 0
+        for catalog in catalogs:
+            if catalog.error is not None:
+                failures += 1
+                logger.error('failed to translate `{}` for locale `{}`: {!r}'.format(
+                    catalog.path, catalog.target_language, catalog.error))
+            elif not self.dry_run:
+                logger.info('translated `{}` for locale `{}` ({}{})'.format(
+                    catalog.path, catalog.target_language, 'written' if catalog.written else 'unchanged',
+                    ', compiled' if catalog.compiled else ''))
+        written = sum(1 for catalog in catalogs if catalog.error is None and catalog.written)
+        self.metrics.count_files(total=len(catalogs), written=written,
+                                 unchanged=len(catalogs) - written - failures, failed=failures,
+                                 compiled=sum(1 for catalog in catalogs if catalog.compiled))
+
+        translation_memory = getattr(get_translator(), 'memory', None) if catalogs else None
+        if translation_memory is not None:
+            logger.info('translation memory: {hits} hits, {misses} misses'.format(**translation_memory.stats))
+
+        self.report()
+        return catalogs
+
+    def open_journal(self):
+        """
+        Returns the checkpoint journal of the run, None if it cannot be used, e.g. the cache directory is read-only
+        or another run is using it, the run goes on without it then.
+        """
+        try:
+            return Journal(self.checkpoint or get_checkpoint_path(), resume=self.resume)
+        except (IOError, OSError) as e:
+            logger.warning('running without a checkpoint journal, the run cannot be resumed: {}'.format(e))
+            return None
+
+    def watch_files(self):
+        """
+        Translates the message files, then again every time they change, e.g. by `makemessages`,
+        until interrupted. The translator service stays set up and the translations are kept
+        in memory between the runs, the unchanged message files and messages are skipped as with --incremental.
+        """
+        self.cache = {}
+        logger.info('watching the message files for changes, every {}s'.format(self.interval))
+        try:
+            state = None
+            while True:
+                current = self.watch_state()
+                if current != state:
+                    # taken before the run, so the changes made during the run are translated by the next one
+                    state = current
+                    catalogs = self.run()
+                    failures = sum(1 for catalog in catalogs if catalog.error is not None)
+                    if failures:
+                        logger.error('{} of {} message files could not be translated'.format(
+                            failures, len(catalogs)))
+                    # the files written by the run are not changes to translate
+                    for catalog in catalogs:
+                        if catalog.written:
+                            state[catalog.path] = stat_file(catalog.path)
+                self.wait()
+        except KeyboardInterrupt:
+            logger.info('stopped watching the message files')
+        finally:
+            self.cache = None
+
+    def watch_state(self):
+        """
+        Returns the size and mtime of the message files under the locale paths, by their paths.
+        """
+        state = {}
+        for directory in settings.LOCALE_PATHS:
+            for root, dirs, files in os.walk(directory):
+                for file_name in files:
+                    if file_name.endswith('.po'):
+                        path = os.path.join(root, file_name)
+                        stat = stat_file(path)
+                        # unless removed meanwhile
+                        if stat is not None:
+                            state[path] = stat
+        return state
+
+    def wait(self):
+        time.sleep(self.interval)
+
+    def report(self):
+        """
+        Logs the summary of the metrics of the run, writes them to the file of --stats
+        and sends them by `autotranslate.signals.run_finished`.
+        """
+        report = self.metrics.report()
+        locales = report['locales'].values()
+        logger.info('{} requests, {} characters, {} retries in {:.2f}s'.format(
+            sum(c['requests'] for c in locales), sum(c['characters'] for c in locales),
+            sum(c['retries'] for c in locales), report['wall_time']))
+
+        if self.stats:
+            write_atomic(self.stats, json.dumps(report, indent=2, sort_keys=True).encode('utf-8'))
+        signals.run_finished.send(sender=self.__class__, report=report)
+
+    def find_files(self):
+        """
+        Yields `(root, file_name, target_language)` for every message file
+        under the locale paths that should be translated, in a stable order.
+        """
         for directory in settings.LOCALE_PATHS:
             # walk through all the paths
             # and find all the pot files
             for root, dirs, files in os.walk(directory):
-                for file in files:
+                dirs.sort()
+                for file in sorted(files):
                     if not file.endswith('.po'):
                         # process file only
                         # if its a pot file
@@ -66,7 +309,224 @@ class Command(BaseCommand):
                         logger.info('skipping translation for locale `{}`'.format(target_language))
                         continue
 
-                    self.translate_file(root, file, target_language)
+                    yield root, file, target_language
+
+    def translate_catalogs(self, catalogs):
+        """
+        Translates the message files in phases, the failed ones get their `error` set:
+
+        - load: parse the files and pick the entries to translate
+        - plan: collect the unique strings per target language across all the files
+        - translate: translate every unique string once per target language
+        - save: fill up the entries of every file with the translations and save it
+
+        The files are kept parsed from their load to their save up to AUTOTRANSLATE_MAX_PARSED_SIZE bytes,
+        the others are parsed again to be saved, so the memory used does not grow with all the files translated.
+        With --processes the files are loaded and saved in the worker processes, every file by the same one
+        which keeps it parsed in between, only the strings and their translations are passed around.
+        With --dry-run the translations are only estimated after the plan, nothing is translated or saved.
+        With --shard only the catalogs of the shard are translated once all of them are loaded,
+        the unchanged ones of --incremental are parsed too, to weigh them the same on every machine.
+        Returns the catalogs translated.
+
+        :type catalogs: list[Catalog]
+        :rtype: list[Catalog]
+        """
+        if self.process_pools is not None:
+            catalogs_to_load = [catalog for catalog in catalogs if not self.is_unchanged(catalog)]
+            self.assign_workers(catalogs_to_load)
+            self.keep_parsed(catalogs_to_load)
+            self.run_processes(load_worker, catalogs_to_load)
+        else:
+            self.keep_parsed(catalogs)
+            self.run_jobs(self.load_catalog, catalogs)
+        if self.shard is not None:
+            self.run_jobs(self.weigh_catalog, [catalog for catalog in catalogs if catalog.unchanged])
+            catalogs = self.select_shard(catalogs)
+
+        plan = self.plan_translations([catalog for catalog in catalogs if catalog.error is None])
+        if self.dry_run:
+            self.estimate_plan(plan, [catalog for catalog in catalogs if catalog.error is None])
+            return catalogs
+
+        languages = sorted(plan)
+        results = self.run_jobs(lambda language: self.translate_plan(plan[language], language), languages)
+        self.translations = {}
+        for language, result in zip(languages, results):
+            if isinstance(result, Exception):
+                for catalog in catalogs:
+                    if catalog.target_language == language and catalog.error is None:
+                        catalog.error = result
+            else:
+                self.translations[language] = result
+
+        if self.process_pools is not None:
+            self.run_processes(save_worker, [catalog for catalog in catalogs if catalog.error is None])
+        else:
+            self.run_jobs(self.save_catalog, [catalog for catalog in catalogs if catalog.error is None])
+        return catalogs
+
+    def select_shard(self, catalogs):
+        """
+        Returns the catalogs of the shard of --shard, the shares of the catalogs
+        have about the same number of entries to translate.
+        The catalogs are weighed by their entries to translate regardless of the manifest of --incremental,
+        which is local to every machine, so the machines agree on the shards.
+        """
+        index, count = self.shard
+        units = OrderedDict((get_unit_key(catalog.path), catalog) for catalog in catalogs)
+        shards = assign_shards(dict((unit, catalog.weight) for unit, catalog in units.items()), count)
+        selected = OrderedDict((unit, catalog) for unit, catalog in units.items() if shards[unit] == index)
+        logger.info('shard {}/{}: {} of {} message files, {} of {} strings'.format(
+            index, count, len(selected), len(units), sum(len(catalog.strings) for catalog in selected.values()),
+            sum(len(catalog.strings) for catalog in catalogs)))
+        self.metrics.shard = {'index': index, 'count': count,
+                              'units': dict((unit, len(catalog.strings)) for unit, catalog in selected.items())}
+        return list(selected.values())
+
+    def merge_shards(self):
+        """
+        Checks the --stats reports of --merge-shard come from all the shards of the same split,
+        that every message file was translated by exactly one of them and that, once merged,
+        the message files have all their entries translated.
+        The metrics of the shards are added up into the report of this run,
+        the message files are recorded in the manifest with --incremental.
+        """
+        self.metrics.start()
+        problems = []
+        with self.metrics.phase('merge'):
+            shards = {}
+            for path in self.shard_reports:
+                with open(path) as f:
+                    report = json.load(f)
+                if not report.get('shard'):
+                    raise CommandError('`{}` is not the --stats report of a --shard run'.format(path))
+                shards.setdefault(report['shard']['index'], []).append(report)
+                for locale, counters in report['locales'].items():
+                    self.metrics.count(locale, **counters)
+                self.metrics.count_files(**report['files'])
+                self.metrics.add_phases(report['phases'])
+
+            counts = set(report['shard']['count'] for reports in shards.values() for report in reports)
+            count = max(counts)
+            if len(counts) > 1:
+                problems.append('the shards come from different splits: {}'.format(
+                    ', '.join('N={}'.format(c) for c in sorted(counts))))
+            missing = [index for index in range(1, count + 1) if index not in shards]
+            if missing:
+                problems.append('missing shards: {}'.format(', '.join('{}/{}'.format(i, count) for i in missing)))
+            problems.extend('shard {}/{} is given {} times'.format(index, count, len(reports))
+                            for index, reports in sorted(shards.items()) if len(reports) > 1)
+
+            units = {}
+            for index, reports in sorted(shards.items()):
+                for report in reports:
+                    for unit in report['shard']['units']:
+                        units.setdefault(unit, []).append(index)
+
+            found = set()
+            for root, file_name, target_language in self.find_files():
+                path = os.path.join(root, file_name)
+                unit = get_unit_key(path)
+                found.add(unit)
+                if unit not in units:
+                    problems.append('`{}` was not translated by any shard'.format(path))
+                elif len(units[unit]) > 1:
+                    problems.append('`{}` was translated by several shards: {}'.format(
+                        path, ', '.join(str(index) for index in units[unit])))
+
+                po = polib.pofile(path)
+                untranslated = sum(1 for entry in po if not entry.obsolete and not has_translation(entry))
+                if untranslated:
+                    problems.append('`{}` has {} untranslated entries'.format(path, untranslated))
+                if self.manifest is not None:
+                    self.manifest.record(path, po)
+            problems.extend('`{}` was translated by a shard but is not found'.format(unit)
+                            for unit in sorted(set(units) - found))
+        self.metrics.stop()
+
+        self.report()
+
+        for problem in problems:
+            logger.error(problem)
+        if problems:
+            raise CommandError('the {} shards could not be merged: {}'.format(count, problems[0]))
+        logger.info('merged {} shards of {} message files'.format(count, len(found)))
+
+    def run_jobs(self, func, items):
+        """
+        Calls `func` for every item, concurrently if --jobs is given.
+        Returns the results in the order of `items`, the exception raised instead for the failed ones,
+        which is also set as `error` of the failed catalogs.
+        """
+        def call(item):
+            try:
+                return func(item)
+            except Exception as e:
+                logger.debug('error while translating `{}`'.format(getattr(item, 'path', item)), exc_info=True)
+                if isinstance(item, Catalog):
+                    item.error = e
+                return e
+
+        if self.pool is not None and len(items) > 1:
+            # imap() yields the results in the order of `items`,
+            # so the log output does not depend on the scheduling
+            return list(self.pool.imap(call, items))
+        return [call(item) for item in items]
+
+    def assign_workers(self, catalogs):
+        """
+        Assigns the catalogs to the worker processes of --processes loading and saving them, the largest files first,
+        the catalogs keep their worker from then on.
+        """
+        catalogs = [catalog for catalog in catalogs if catalog.worker is None]
+        sizes = dict((catalog.path, get_file_size(catalog.path)) for catalog in catalogs)
+        workers = assign_shards(sizes, len(self.process_pools))
+        for catalog in catalogs:
+            catalog.worker = workers[catalog.path] - 1
+
+    def keep_parsed(self, catalogs):
+        """
+        Picks the catalogs kept parsed from their load to their save, in their order, until their files add up to
+        AUTOTRANSLATE_MAX_PARSED_SIZE bytes per process.
+        """
+        max_size = getattr(settings, 'AUTOTRANSLATE_MAX_PARSED_SIZE', 64 * 1024 * 1024)
+        sizes = {}
+        for catalog in catalogs:
+            size = sizes.get(catalog.worker, 0) + get_file_size(catalog.path)
+            catalog.keep = size <= max_size
+            if catalog.keep:
+                sizes[catalog.worker] = size
+
+    def run_processes(self, worker, catalogs):
+        """
+        Runs the `worker` for every catalog in its worker process and applies its results to the catalog.
+        """
+        options = {'locale': self.locale, 'skip_translated': self.skip_translated, 'set_fuzzy': self.set_fuzzy,
+                   'compile': self.compile}
+        self.assign_workers(catalogs)
+        results = []
+        for catalog in catalogs:
+            state = {'root': catalog.root, 'file_name': catalog.file_name, 'keep': catalog.keep,
+                     'target_language': catalog.target_language, 'strings': catalog.strings,
+                     'translated': self.translated_entries(catalog.path), 'record': self.manifest is not None}
+            if worker is save_worker and not catalog.unchanged:
+                translations = self.translations[catalog.target_language]
+                state['translations'] = dict((string, translations[string]) for string in catalog.strings)
+            results.append(self.process_pools[catalog.worker].apply_async(worker, ((options, state),)))
+
+        for catalog, result in zip(catalogs, results):
+            result = result.get()
+            self.metrics.add_phases(result.pop('phases'))
+            state = result.pop('manifest', None)
+            if state is not None:
+                self.manifest.record_state(catalog.path, state)
+            for name, value in result.items():
+                setattr(catalog, name, value)
+            if catalog.error is not None:
+                logger.debug('error while translating `{}`: {}'.format(catalog.path, catalog.error))
+            elif worker is load_worker:
+                self.metrics.count(catalog.target_language, files=1)
 
     def translate_file(self, root, file_name, target_language):
         """
@@ -76,17 +536,243 @@ class Command(BaseCommand):
         :param file_name:       name of the file to be translated (it should be a pot file)
         :param target_language: language in which the file needs to be translated
         """
-        logger.info('filling up translations for locale `{}`'.format(target_language))
+        catalog = Catalog(root, file_name, target_language)
+        self.translate_catalogs([catalog])
+        if catalog.error is not None:
+            raise catalog.error
+
+    def load_catalog(self, catalog):
+        """
+        Parses the message file and picks its entries to translate,
+        unchanged files in the incremental mode are not parsed at all.
+        Only the strings are kept for the files not kept parsed until they are saved.
+        """
+        logger.debug('filling up translations for locale `{}`'.format(catalog.target_language))
+
+        if self.is_unchanged(catalog):
+            return
+
+        with self.metrics.phase('parse'):
+            catalog.stat = stat_file(catalog.path)
+            catalog.po = polib.pofile(catalog.path)
+        with self.metrics.phase('extract'):
+            catalog.entries = self.get_entries_to_translate(catalog.po, catalog.path)
+            catalog.strings = self.get_strings_to_translate(catalog.entries)
+            catalog.weight = self.count_entries(catalog.po)
+        if not catalog.keep:
+            catalog.po = None
+            catalog.entries = []
+        self.metrics.count(catalog.target_language, files=1)
+
+    def weigh_catalog(self, catalog):
+        """
+        Parses the message file skipped as unchanged only to count its entries to translate for --shard.
+        """
+        with self.metrics.phase('parse'):
+            po = polib.pofile(catalog.path)
+        with self.metrics.phase('extract'):
+            catalog.weight = self.count_entries(po)
+
+    def count_entries(self, po):
+        """
+        Returns the number of entries to translate of the po file, regardless of the last run of --incremental.
+        """
+        return sum(1 for entry in po if self.need_translate(entry))
 
-        po = polib.pofile(os.path.join(root, file_name))
-        strings = self.get_strings_to_translate(po)
-        # translate the strings,
-        # all the translated strings are returned
-        # in the same order on the same index
-        # viz. [a, b] -> [trans_a, trans_b]
-        translated_strings = translate_strings(strings, target_language, 'en', False)
-        self.update_translations(po, translated_strings)
-        po.save()
+    def reload_catalog(self, catalog):
+        """
+        Parses the message file again to save it, its strings to translate should not have changed since it was loaded.
+        """
+        with self.metrics.phase('parse'):
+            stat = stat_file(catalog.path)
+            po = polib.pofile(catalog.path)
+        with self.metrics.phase('extract'):
+            entries = self.get_entries_to_translate(po, catalog.path)
+            strings = self.get_strings_to_translate(entries)
+        if strings != catalog.strings:
+            raise CommandError('`{}` changed while it was translated'.format(catalog.path))
+        catalog.po = po
+        catalog.entries = entries
+        catalog.stat = stat
+
+    def is_unchanged(self, catalog):
+        """
+        Returns True if the message file did not change since the last run in the incremental mode.
+        """
+        if self.manifest is not None and self.manifest.is_unchanged(catalog.path):
+            logger.debug('skipping unchanged `{}`'.format(catalog.path))
+            catalog.unchanged = True
+        return catalog.unchanged
+
+    def plan_translations(self, catalogs):
+        """
+        Returns the unique strings to translate of the `catalogs` by target language,
+        so a string repeated in several files, locale paths or contexts is translated once.
+
+        :rtype: dict[str, list[six.text_type]]
+        """
+        plan = {}
+        total = 0
+        with self.metrics.phase('plan'):
+            for catalog in catalogs:
+                strings = catalog.strings
+                total += len(strings)
+                self.metrics.count(catalog.target_language, strings=len(strings))
+                # the order of the first occurrence is kept, so the requests are stable
+                unique = plan.setdefault(catalog.target_language, OrderedDict())
+                for string in strings:
+                    unique[string] = None
+
+            plan = dict((language, list(unique)) for language, unique in plan.items())
+        for language, strings in plan.items():
+            self.metrics.count(language, unique=len(strings))
+        if total:
+            logger.info('translating {} unique of {} strings'.format(sum(len(s) for s in plan.values()), total))
+        return plan
+
+    def estimate_plan(self, plan, catalogs):
+        """
+        Logs the strings and characters to translate, the requests the translation service would be sent
+        and the strings found in its translation memory, per file and per target language.
+        The strings repeated in several files are translated once, they are counted for the first file
+        they are found in, so the requests of the files may add up to more than the ones of their language,
+        whose requests are filled up with the strings of all its files.
+        The estimates are added to the metrics of the run.
+        """
+        translator = get_translator() if plan else None
+        files = OrderedDict()
+        seen = dict((language, set()) for language in plan)
+        for catalog in catalogs:
+            new = OrderedDict()
+            for string in catalog.strings:
+                if string not in seen[catalog.target_language]:
+                    new[string] = None
+            seen[catalog.target_language].update(new)
+            estimate = translator.estimate(list(new), catalog.target_language, 'en') \
+                if new else {'requests': 0, 'cache_hits': 0}
+            estimate.update(locale=catalog.target_language, strings=len(catalog.strings),
+                            characters=sum(len(string) for string in catalog.strings))
+            files[catalog.path] = estimate
+            logger.info('`{}` for locale `{}`: {strings} strings, {characters} characters, {requests} requests, '
+                        '{cache_hits} cache hits'.format(catalog.path, catalog.target_language, **estimate))
+
+        locales = {}
+        for language in sorted(plan):
+            strings = plan[language]
+            estimate = translator.estimate(strings, language, 'en')
+            estimate.update(unique=len(strings), characters=sum(len(string) for string in strings))
+            locales[language] = estimate
+            logger.info('locale `{}`: {unique} unique strings, {characters} characters, {requests} requests, '
+                        '{cache_hits} cache hits'.format(language, **estimate))
+
+        self.metrics.dry_run = {'files': files, 'locales': locales}
+
+    def translate_plan(self, strings, target_language):
+        """
+        Returns the translations of the unique `strings` by the strings.
+
+        The translations are saved to the checkpoint journal every `AUTOTRANSLATE_CHECKPOINT_SIZE` strings
+        and the ones saved by the previous run are reused with --resume,
+        the ones of the previous runs of --watch are reused too.
+        """
+        translations = self.journal.get(target_language) if self.journal is not None else {}
+        if self.cache is not None:
+            known = self.cache.setdefault(target_language, {})
+            translations.update((string, known[string]) for string in strings if string in known)
+        pending = [string for string in strings if string not in translations]
+        if len(pending) < len(strings):
+            logger.info('reusing {} of {} translations for locale `{}`'.format(
+                len(strings) - len(pending), len(strings), target_language))
+
+        checkpoint_size = getattr(settings, 'AUTOTRANSLATE_CHECKPOINT_SIZE', 1000)
+        for start in range(0, len(pending), checkpoint_size):
+            chunk = pending[start:start + checkpoint_size]
+            # translate the strings,
+            # all the translated strings are returned
+            # in the same order on the same index
+            # viz. [a, b] -> [trans_a, trans_b]
+            with self.metrics.phase('translate'):
+                translated = dict(zip(chunk, translate_strings(chunk, target_language, 'en', False)))
+            if self.journal is not None:
+                self.journal.write(target_language, translated)
+            if self.cache is not None:
+                self.cache[target_language].update(translated)
+            translations.update(translated)
+        return translations
+
+    def save_catalog(self, catalog):
+        """
+        Fills up the entries of the message file with the translations
+        and saves it atomically, if its content changed, compiles it with --compile.
+        The file is parsed again if it was not kept parsed or changed since it was loaded, e.g. by `makemessages`
+        meanwhile, the changes are not overwritten, and released once saved.
+        """
+        if catalog.po is not None and stat_file(catalog.path) != catalog.stat:
+            logger.debug('`{}` changed since it was loaded'.format(catalog.path))
+            catalog.po = None
+            catalog.keep = False
+        if catalog.po is None and not catalog.keep and not catalog.unchanged:
+            self.reload_catalog(catalog)
+
+        if catalog.po is not None and catalog.entries:
+            translations = self.translations[catalog.target_language]
+            with self.metrics.phase('update'):
+                self.update_translations(catalog.entries, [translations[string] for string in catalog.strings])
+            with self.metrics.phase('save'):
+                catalog.written = save_po(catalog.po)
+
+        if self.compile:
+            with self.metrics.phase('compile'):
+                self.compile_catalog(catalog)
+
+        if catalog.po is not None:
+            self.record_catalog(catalog)
+        catalog.po = None
+        catalog.entries = []
+
+    def record_catalog(self, catalog):
+        """
+        Records the message file saved in the manifest of --incremental.
+        """
+        if self.manifest is not None:
+            with self.metrics.phase('save'):
+                self.manifest.record(catalog.path, catalog.po)
+
+    def compile_catalog(self, catalog):
+        """
+        Writes the .mo file next to the message file, unless it is up to date.
+        The fuzzy entries are left out, as `compilemessages` does.
+        """
+        mo_path = os.path.splitext(catalog.path)[0] + '.mo'
+        if not catalog.written and os.path.exists(mo_path) and \
+                os.path.getmtime(mo_path) >= os.path.getmtime(catalog.path):
+            return
+
+        po = catalog.po if catalog.po is not None else polib.pofile(catalog.path)
+        catalog.compiled = write_if_changed(mo_path, po.to_binary())
+
+    def get_entries_to_translate(self, po, path):
+        """Return the entries of the po file that should be translated.
+
+        In the incremental mode the entries translated in the last run are skipped,
+        unless their translation has been removed since.
+
+        :param po: POFile object to translate
+        :type po: polib.POFile
+        :param path: path of the po file
+        :rtype: list[polib.POEntry]
+        """
+        entries = [entry for entry in po if self.need_translate(entry)]
+        translated = self.translated_entries(path)
+        if translated is not None:
+            entries = [entry for entry in entries if not has_translation(entry) or entry_key(entry) not in translated]
+        return entries
+
+    def translated_entries(self, path):
+        """
+        Returns the keys of the entries translated by the last run in the incremental mode, None otherwise.
+        """
+        return self.manifest.translated_entries(path) if self.manifest is not None else None
 
     def need_translate(self, entry):
         if self.skip_translated:
@@ -96,8 +782,8 @@ class Command(BaseCommand):
     def get_strings_to_translate(self, po):
         """Return list of string to translate from po file.
 
-        :param po: POFile object to translate
-        :type po: polib.POFile
+        :param po: POFile object or list of entries to translate
+        :type po: polib.POFile | list[polib.POEntry]
         :return: list of string to translate
         :rtype: collections.Iterable[six.text_type]
         """
@@ -105,9 +791,9 @@ class Command(BaseCommand):
         for index, entry in enumerate(po):
             if not self.need_translate(entry):
                 continue
-            strings.append(humanize_placeholders(entry.msgid))
+            strings.append(entry.msgid)
             if entry.msgid_plural:
-                strings.append(humanize_placeholders(entry.msgid_plural))
+                strings.append(entry.msgid_plural)
         return strings
 
     def update_translations(self, entries, translated_strings):
@@ -127,72 +813,156 @@ class Command(BaseCommand):
 
             if entry.msgid_plural:
                 # fill the first plural form with the entry.msgid translation
-                translation = next(translations)
-                translation = fix_translation(entry.msgid, translation)
-                entry.msgstr_plural[0] = translation
+                entry.msgstr_plural[0] = next(translations)
 
                 # fill the rest of plural forms with the entry.msgid_plural translation
                 translation = next(translations)
-                translation = fix_translation(entry.msgid_plural, translation)
                 for k, v in entry.msgstr_plural.items():
                     if k != 0:
                         entry.msgstr_plural[k] = translation
             else:
-                translation = next(translations)
-                translation = fix_translation(entry.msgid, translation)
-                entry.msgstr = translation
+                entry.msgstr = next(translations)
 
             # Set the 'fuzzy' flag on translation
             if self.set_fuzzy and 'fuzzy' not in entry.flags:
                 entry.flags.append('fuzzy')
 
 
-def humanize_placeholders(msgid):
-    """Convert placeholders to the (google translate) service friendly form.
+class Catalog(object):
+    """
+    A message file to translate, its parsed entries and strings to translate, whether it was written
+    and the error that stopped it if any.
+    """
 
-    %(name)s -> __name__
-    %s       -> __item__
-    %d       -> __number__
+    def __init__(self, root, file_name, target_language):
+        self.root = root
+        self.file_name = file_name
+        self.target_language = target_language
+        self.path = os.path.join(root, file_name)
+        self.po = None
+        self.entries = []
+        self.strings = []
+        # the size and mtime of the file when it was parsed
+        self.stat = None
+        # the number of entries to translate regardless of --incremental, by which --shard splits the catalogs
+        self.weight = 0
+        # whether it is kept parsed from its load to its save
+        self.keep = True
+        self.unchanged = False
+        self.written = False
+        self.compiled = False
+        self.error = None
+        # the index of the worker process of --processes loading and saving it
+        self.worker = None
+
+
+class WorkerCommand(Command):
+    """
+    Loads and saves a message file in a worker process of --processes.
     """
 
-    # return re.sub(
-    #         r'%(?:\((\w+)\))?([sd])',
-    #         lambda match: r'__{0}__'.format(
-    #                 match.group(1).lower() if match.group(1) else 'number' if match.group(2) == 'd' else 'item'),
-    #         msgid)
+    def __init__(self, options, translated=None, translations=None, record=False):
+        super(WorkerCommand, self).__init__()
+        self.set_options(**options)
+        self.translated = translated
+        self.translations = translations
+        self.record = record
+        # the state of the file saved, recorded in the manifest by the command
+        self.state = None
+
+    def translated_entries(self, path):
+        return self.translated
+
+    def record_catalog(self, catalog):
+        if self.record:
+            self.state = file_state(catalog.path, catalog.po)
 
-    msgid = re.sub(
-            r'%(?:\(([\w\|\:\.]+)\))?(s)',
-            lambda match: r'_____{0}_____{1}'.format(match.group(1).lower() if match.group(1) else 's', '[[[[xstr]]]]'),
-            msgid)
 
-    msgid = re.sub(
-            r'%(?:\(([\w\|\:\.]+)\))?(d)',
-            lambda match: r'_____{0}_____{1}'.format(match.group(1).lower() if match.group(1) else 'd', '[[[[xnum]]]]'),
-            msgid)
+def run_worker(options, state, func):
+    """
+    Runs `func(command, catalog)` for the catalog described by `state` in a worker process.
+    Returns the attributes of the catalog it changed, the phases it timed and the error it raised, if any.
+    """
+    catalog = Catalog(state['root'], state['file_name'], state['target_language'])
+    catalog.keep = state.get('keep', True)
+    command = WorkerCommand(options, state['translated'],
+                            {catalog.target_language: state.get('translations', {})}, state['record'])
+    result = {}
+    try:
+        result.update(func(command, catalog, state))
+    except Exception as e:
+        # the exception may not be picklable
+        result['error'] = CommandError('{!r}'.format(e))
+    result['phases'] = dict(command.metrics.phases)
+    return result
+
+
+# the parsed message files of a worker process, by their paths, from the load to the save of a run
+_loaded = {}
+
+
+def load_worker(arguments):
+    def load(command, catalog, state):
+        command.load_catalog(catalog)
+        if catalog.po is not None:
+            _loaded[catalog.path] = (catalog.po, catalog.entries, catalog.stat)
+        return {'strings': catalog.strings, 'weight': catalog.weight}
+    return run_worker(arguments[0], arguments[1], load)
+
+
+def save_worker(arguments):
+    def save(command, catalog, state):
+        catalog.unchanged = 'translations' not in state
+        catalog.strings = state['strings']
+        loaded = _loaded.pop(catalog.path, None)
+        if loaded is not None:
+            catalog.po, catalog.entries, catalog.stat = loaded
+        else:
+            # parsed again, not kept parsed or not loaded by this worker
+            catalog.keep = False
+        command.save_catalog(catalog)
+        result = {'written': catalog.written, 'compiled': catalog.compiled}
+        if command.state is not None:
+            result['manifest'] = command.state
+        return result
+    return run_worker(arguments[0], arguments[1], save)
+
+
+def stat_file(path):
+    """
+    Returns the size and mtime of the file at `path`, None if it does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime
+
 
-    return msgid
+def get_file_size(path):
+    """
+    Returns the size of the file at `path`, 0 if it does not exist (yet).
+    """
+    return os.path.getsize(path) if os.path.exists(path) else 0
 
 
-def restore_placeholders(msgid, translation):
-    """Restore placeholders in the translated message."""
-    placehoders = re.findall(r'(\s*)(%(?:\(\w+\))?[sd])(\s*)', msgid)
-    return re.sub(
-            r'(\s*)(_____[\w]+?_____)(\s*)',
-            lambda matches: '{0}{1}{2}'.format(placehoders[0][0], placehoders[0][1], placehoders.pop(0)[2]),
-            translation)
+def get_unit_key(path):
+    """
+    Returns the name of the message file at `path` shared by the machines of --shard,
+    relative to the locale path it was found under.
+    """
+    for index, directory in enumerate(settings.LOCALE_PATHS):
+        relative = os.path.relpath(path, directory)
+        if not relative.startswith(os.pardir):
+            return '{}:{}'.format(index, relative.replace(os.sep, '/'))
+    return path
 
 
-def fix_translation(msgid, translation):
-    # Google Translate removes a lot of formatting, these are the fixes:
-    # - Add newline in the beginning if msgid also has that
-    if msgid.startswith('\n') and not translation.startswith('\n'):
-        translation = u'\n' + translation
+def get_manifest_path():
+    """Return the path of the manifest used by --incremental, unless it is given."""
+    return getattr(settings, 'AUTOTRANSLATE_MANIFEST', None) or os.path.join(get_cache_dir(), 'manifest.json')
 
-    # - Add newline at the end if msgid also has that
-    if msgid.endswith('\n') and not translation.endswith('\n'):
-        translation += u'\n'
 
-    # Remove spaces that have been placed between %(id) tags
-    translation = restore_placeholders(msgid, translation)
-    return translation
+def get_checkpoint_path():
+    """Return the path of the checkpoint journal, unless it is given."""
+    return getattr(settings, 'AUTOTRANSLATE_CHECKPOINT', None) or os.path.join(get_cache_dir(), 'checkpoint.jsonl')
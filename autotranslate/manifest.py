@@ -0,0 +1,129 @@
+"""
+The manifest of the incremental mode of `translate_messages`.
+
+It remembers, for every message file, its size, mtime and content hash after the last run,
+and the entries (by msgctxt, msgid and msgid_plural) that were translated in it,
+so unchanged files are skipped without parsing them and only new or changed entries are translated.
+"""
+import hashlib
+import json
+import os
+import threading
+
+from autotranslate.files import write_atomic
+
+# the files recorded between two saves of the manifest, it is saved at the end of the run as well
+SAVE_EVERY = 100
+
+
+def entry_key(entry):
+    """
+    Returns the key of a `polib.POEntry`, it changes with its source strings only.
+    """
+    source = u'\x04'.join([entry.msgctxt or u'', entry.msgid, entry.msgid_plural or u''])
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+
+
+def has_translation(entry):
+    """
+    Returns True if the `polib.POEntry` has a translation, fuzzy or not.
+    """
+    if entry.msgid_plural:
+        return any(entry.msgstr_plural.values())
+    return bool(entry.msgstr)
+
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def file_state(path, po):
+    """
+    Returns the state of the file at `path` and the translated entries of its `polib.POFile`.
+    """
+    stat = os.stat(path)
+    return {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'hash': file_hash(path),
+        'entries': sorted(entry_key(entry) for entry in po if has_translation(entry)),
+    }
+
+
+class Manifest(object):
+    """
+    A JSON file mapping the paths of the message files to their state after the last run.
+    """
+
+    def __init__(self, path, save_every=SAVE_EVERY):
+        """
+        :param path:        the path of the manifest
+        :param save_every:  the files recorded between two saves, rewriting it for every file would take
+                            quadratic time
+        """
+        self.path = path
+        self.save_every = save_every
+        self.unsaved = 0
+        self.lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.files = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.files = {}
+
+    def is_unchanged(self, path):
+        """
+        Returns True if the file at `path` did not change since it was recorded.
+        """
+        with self.lock:
+            state = self.files.get(os.path.abspath(path))
+        if state is None:
+            return False
+
+        stat = os.stat(path)
+        if state['size'] == stat.st_size and state['mtime'] == stat.st_mtime:
+            return True
+        if state['size'] != stat.st_size or state['hash'] != file_hash(path):
+            return False
+
+        # touched only, remember the new mtime
+        with self.lock:
+            state['mtime'] = stat.st_mtime
+        return True
+
+    def translated_entries(self, path):
+        """
+        Returns the set of the keys of the entries which were translated in the file at `path`.
+        """
+        with self.lock:
+            state = self.files.get(os.path.abspath(path))
+        return set(state['entries']) if state else set()
+
+    def record(self, path, po):
+        """
+        Records the state of the file at `path` and the translated entries of its `polib.POFile`.
+        """
+        self.record_state(path, file_state(path, po))
+
+    def record_state(self, path, state):
+        """
+        Records the `file_state()` of the file at `path`.
+        """
+        with self.lock:
+            self.files[os.path.abspath(path)] = state
+            self.unsaved += 1
+            if self.unsaved >= self.save_every:
+                self._save()
+
+    def save(self):
+        """
+        Saves the files recorded since the last save.
+        """
+        with self.lock:
+            if self.unsaved:
+                self._save()
+
+    def _save(self):
+        write_atomic(self.path, json.dumps(self.files, sort_keys=True).encode('utf-8'))
+        self.unsaved = 0
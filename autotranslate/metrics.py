@@ -0,0 +1,112 @@
+"""
+The metrics of a `translate_messages` run: the time spent in every phase
+and the strings, requests, characters, retries and translation memory lookups per locale.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from autotranslate import signals
+from autotranslate.throttling import monotonic
+
+LOCALE_COUNTERS = ('files', 'strings', 'unique', 'requests', 'segments', 'characters', 'retries',
+                   'cache_hits', 'cache_misses')
+
+
+class RunMetrics(object):
+    """
+    Collects the metrics of a run, the services report theirs by `autotranslate.signals`.
+
+    The phases run by several jobs at once are summed over the jobs.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.phases = defaultdict(float)
+        self.locales = defaultdict(lambda: dict.fromkeys(LOCALE_COUNTERS, 0))
+        self.files = dict.fromkeys(('total', 'written', 'unchanged', 'failed', 'compiled'), 0)
+        # the estimates of --dry-run
+        self.dry_run = None
+        # the message files translated by --shard
+        self.shard = None
+        self.started = None
+        self.wall_time = None
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Adds the time spent in the block to the phase `name`.
+        """
+        start = monotonic()
+        try:
+            yield
+        finally:
+            elapsed = monotonic() - start
+            with self.lock:
+                self.phases[name] += elapsed
+
+    def add_phases(self, phases):
+        """
+        Adds the time spent in the `phases`, e.g. by a worker process.
+        """
+        with self.lock:
+            for name, elapsed in phases.items():
+                self.phases[name] += elapsed
+
+    def count(self, locale, **counts):
+        with self.lock:
+            counters = self.locales[locale]
+            for name, value in counts.items():
+                counters[name] += value
+
+    def count_files(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                self.files[name] += value
+
+    def start(self):
+        self.started = monotonic()
+        signals.request_sent.connect(self.on_request_sent, dispatch_uid=self.dispatch_uid('request_sent'))
+        signals.memory_lookup.connect(self.on_memory_lookup, dispatch_uid=self.dispatch_uid('memory_lookup'))
+        signals.strings_processed.connect(self.on_strings_processed,
+                                          dispatch_uid=self.dispatch_uid('strings_processed'))
+
+    def stop(self):
+        signals.request_sent.disconnect(dispatch_uid=self.dispatch_uid('request_sent'))
+        signals.strings_processed.disconnect(dispatch_uid=self.dispatch_uid('strings_processed'))
+        signals.memory_lookup.disconnect(dispatch_uid=self.dispatch_uid('memory_lookup'))
+        self.wall_time = monotonic() - self.started
+
+    def dispatch_uid(self, signal_name):
+        return 'autotranslate.metrics.{}.{}'.format(signal_name, id(self))
+
+    def on_request_sent(self, sender, target_language, segments, characters, latency, retries, **kwargs):
+        self.count(target_language, requests=1, segments=segments, characters=characters, retries=retries)
+        with self.lock:
+            self.phases['network'] += latency
+
+    def on_strings_processed(self, sender, phase, elapsed, **kwargs):
+        with self.lock:
+            self.phases[phase] += elapsed
+
+    def on_memory_lookup(self, sender, target_language, hits, misses, **kwargs):
+        self.count(target_language, cache_hits=hits, cache_misses=misses)
+
+    def report(self):
+        """
+        Returns the metrics as a dict which can be dumped to JSON.
+        """
+        with self.lock:
+            report = {
+                'finished': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'wall_time': self.wall_time,
+                'files': dict(self.files),
+                'phases': dict(self.phases),
+                'locales': dict((locale, dict(counters)) for locale, counters in self.locales.items()),
+            }
+            if self.dry_run is not None:
+                report['dry_run'] = self.dry_run
+            if self.shard is not None:
+                report['shard'] = self.shard
+            return report
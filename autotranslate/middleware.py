@@ -0,0 +1,15 @@
+from django.utils.translation import get_language
+
+from autotranslate import runtime
+from autotranslate.compat import MiddlewareMixin
+
+
+class RuntimeTranslationMiddleware(MiddlewareMixin):
+    """
+    Translates the messages missing for the active language in the background,
+    it goes after `django.middleware.locale.LocaleMiddleware`.
+    See `autotranslate.runtime`.
+    """
+
+    def process_request(self, request):
+        runtime.install(get_language())
@@ -0,0 +1,173 @@
+"""
+Packs the strings sent to a service into as few requests as its limits allow.
+
+The services limit the number of strings and the number of characters of a request.
+The strings are sent in their order unless grouping them first-fit decreasing by length,
+so the short labels fill up the requests of the long help texts, takes fewer requests.
+Strings longer than a request are split on sentence boundaries.
+"""
+import bisect
+import re
+from collections import namedtuple
+
+from autotranslate.placeholders import tag_pattern
+
+# the tags of the placeholders and of the glossary terms, never cut through
+TAGS = tag_pattern('PT')
+# the whitespace after the end of a sentence
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?:;])\s+')
+WHITESPACE = re.compile(r'\s+')
+
+
+def split_text(text, max_characters, patterns=(SENTENCE_BOUNDARY, WHITESPACE)):
+    """
+    Splits the text into pieces of at most `max_characters`, on sentence boundaries if possible,
+    on whitespace otherwise.
+    Returns the pieces and the whitespace separating them, `text == p0 + s0 + p1 + s1 + ... + pn`.
+    """
+    if len(text) <= max_characters:
+        return [text], []
+    if not patterns:
+        # a single word longer than a request
+        pieces = split_characters(text, max_characters)
+        return pieces, [u''] * (len(pieces) - 1)
+
+    parts, separators, start = [], [], 0
+    for match in patterns[0].finditer(text):
+        parts.append(text[start:match.start()])
+        separators.append(match.group(0))
+        start = match.end()
+    parts.append(text[start:])
+
+    # merge the parts as long as they fit into a request
+    merged, merged_separators = [parts[0]], []
+    for part, separator in zip(parts[1:], separators):
+        if len(merged[-1]) + len(separator) + len(part) <= max_characters:
+            merged[-1] += separator + part
+        else:
+            merged.append(part)
+            merged_separators.append(separator)
+
+    # and split the ones still too long by the next pattern
+    pieces, piece_separators = [], []
+    for index, part in enumerate(merged):
+        if index:
+            piece_separators.append(merged_separators[index - 1])
+        part_pieces, part_separators = split_text(part, max_characters, patterns[1:])
+        pieces.extend(part_pieces)
+        piece_separators.extend(part_separators)
+    return pieces, piece_separators
+
+
+def split_characters(text, max_characters):
+    """
+    Splits the text into pieces of at most `max_characters`, anywhere but inside the tags.
+    """
+    tags = [match.span() for match in TAGS.finditer(text)]
+    pieces, start = [], 0
+    while len(text) - start > max_characters:
+        end = start + max_characters
+        for tag_start, tag_end in tags:
+            if tag_start < end < tag_end:
+                # before the tag, or after it if the tag alone is longer than a request
+                end = tag_start if tag_start > start else tag_end
+                break
+        pieces.append(text[start:end])
+        start = end
+    pieces.append(text[start:])
+    return pieces
+
+
+class Packing(namedtuple('Packing', 'pieces batches spans')):
+    """
+    The `pieces` of the strings sent to the service, the `batches` of the indexes of the pieces sent
+    in a single request and the `(start, end, separators)` pieces of each string.
+    """
+    __slots__ = ()
+
+    def join(self, translations):
+        """
+        Returns the translations of the strings from the `translations` of the pieces.
+        """
+        joined = []
+        for start, end, separators in self.spans:
+            translation = translations[start]
+            for separator, piece in zip(separators, translations[start + 1:end]):
+                translation += separator + piece
+            joined.append(translation)
+        return joined
+
+
+def pack(strings, max_segments, max_characters=None):
+    """
+    Returns the `Packing` of the `strings` into requests of at most `max_segments` strings
+    and `max_characters` characters.
+    """
+    if not max_characters:
+        # the order of the strings is kept
+        indexes = list(range(len(strings)))
+        batches = [indexes[start:start + max_segments] for start in range(0, len(strings), max_segments)]
+        return Packing(list(strings), batches, [(index, index + 1, ()) for index in indexes])
+
+    pieces, spans = [], []
+    for text in strings:
+        if len(text) > max_characters:
+            text_pieces, separators = split_text(text, max_characters)
+        else:
+            text_pieces, separators = [text], ()
+        spans.append((len(pieces), len(pieces) + len(text_pieces), tuple(separators)))
+        pieces.extend(text_pieces)
+
+    batches = pack_in_order(pieces, max_segments, max_characters)
+    minimum = max(-(-len(pieces) // max_segments), -(-sum(len(piece) for piece in pieces) // max_characters))
+    if len(batches) > minimum:
+        # the strings of mixed lengths fill up the requests better sorted by length
+        decreasing = pack_decreasing(pieces, max_segments, max_characters)
+        if len(decreasing) < len(batches):
+            batches = decreasing
+    return Packing(pieces, batches, spans)
+
+
+def pack_in_order(pieces, max_segments, max_characters):
+    """
+    Returns the batches of the indexes of the `pieces`, filled up in their order.
+    """
+    batches, size = [], 0
+    for index, piece in enumerate(pieces):
+        if batches and len(batches[-1]) < max_segments and size + len(piece) <= max_characters:
+            batches[-1].append(index)
+            size += len(piece)
+        else:
+            batches.append([index])
+            size = len(piece)
+    return batches
+
+
+def pack_decreasing(pieces, max_segments, max_characters):
+    """
+    Returns the batches of the indexes of the `pieces`, filled up best fit decreasing by length.
+
+    The batches which can take more pieces are kept sorted by their free characters,
+    so the one a piece fits best is found by a binary search, in O(pieces * log(batches)).
+    """
+    if not pieces:
+        return []
+    smallest = min(len(piece) for piece in pieces)
+    batches = []
+    # (free characters, batch number) of the batches which are not full
+    free = []
+    for index in sorted(range(len(pieces)), key=lambda i: len(pieces[i]), reverse=True):
+        size = len(pieces[index])
+        position = bisect.bisect_left(free, (size, -1))
+        if position < len(free):
+            space, number = free.pop(position)
+            batches[number].append(index)
+            space -= size
+        else:
+            number, space = len(batches), max_characters - size
+            batches.append([index])
+        if len(batches[number]) < max_segments and space >= smallest:
+            bisect.insort(free, (space, number))
+
+    # the pieces are sent in their order, in the order of the first one of every request
+    return sorted(sorted(batch) for batch in batches)
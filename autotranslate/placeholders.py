@@ -0,0 +1,110 @@
+"""
+Protects the placeholders of a message from the translation service.
+
+Every placeholder (`%(name)s`, `%s`, `%d`, `{name}`, HTML tags, ...) of a message
+is replaced by a tag the services leave alone, in a single pass over the message.
+The translation is restored in a single pass as well, putting the original placeholders
+back in place of the tags.
+"""
+import re
+from collections import namedtuple
+
+import six
+
+PLACEHOLDER_PATTERN = re.compile(r"""
+    # no groups, they would disable the fast scan for the first character
+    # printf style: a bare conversion is %s, %d or %%, the others are too common in prose e.g. 50%off,
+    # any conversion with a mapping key, a width or a precision e.g. %(name)s, %5i, %.2f
+    %(?:
+        (?:\([^()\s]+\)[-\#0+]*(?:\*|\d+)?    # mapping key, flags and width
+         | [-\#0+]*(?:\*|\d+)                  # flags and width
+         | [-\#0+]*(?:\*|\d+)?(?=\.)           # flags and width before a precision
+        )
+        (?:\.(?:\*|\d+))?                      # precision
+        [hlL]?[diouxXeEfFgGcrs]
+      | [sd%]
+    )
+  | \{[\w.\[\]]*(?:![rsa])?(?::[^{}]*)?\}  # str.format style e.g. {name}
+  | <[a-zA-Z/!][^<>]*>                    # html tags
+""", re.VERBOSE)
+
+
+def tag_pattern(kinds):
+    """
+    Returns the pattern of the `<T123{kind}{n}/>` tags of the `kinds`, e.g. `P` for the placeholders.
+    The services may add spaces inside the tag, change its case or add a closing tag,
+    the index is the first group, which is None for a stray closing tag.
+    """
+    tag = r'T123[{}]'.format(kinds)
+    return re.compile(r'<\s*{0}(\d+)\s*/?\s*>(?:<\s*/\s*{0}\d+\s*>)?|<\s*/\s*{0}\d+\s*>'.format(tag),
+                      re.IGNORECASE)
+
+
+TAG_PATTERN = tag_pattern('P')
+
+# html entities the services return for characters of the message,
+# `&amp;` has to be the last one
+ENTITIES = (('&quot;', '"'), ('&#39;', "'"), ('&#x27;', "'"), ('&lt;', '<'), ('&gt;', '>'), ('&amp;', '&'))
+
+
+class ProtectedString(namedtuple('ProtectedString', 'text template placeholders')):
+    """
+    A message, the template with tags sent to the service and the placeholders replaced by the tags.
+    """
+    __slots__ = ()
+
+    def restore(self, translation):
+        """
+        Returns the translation of the `template` with the placeholders and formatting of `text`.
+        """
+        if self.placeholders:
+            translation = TAG_PATTERN.sub(self._restore_tag, translation)
+
+        for entity, character in ENTITIES:
+            if entity in translation and entity not in self.text:
+                translation = translation.replace(entity, character)
+
+        # the services remove a lot of formatting:
+        # - add newline in the beginning if the message also has that
+        if self.text.startswith('\n') and not translation.startswith('\n'):
+            translation = u'\n' + translation
+
+        # - add newline at the end if the message also has that
+        if self.text.endswith('\n') and not translation.endswith('\n'):
+            translation += u'\n'
+        return translation
+
+    def _restore_tag(self, match):
+        if match.group(1) is None:
+            # closing tag added by the service
+            return ''
+
+        index = int(match.group(1))
+        if index >= len(self.placeholders):
+            return match.group(0)
+        return self.placeholders[index]
+
+
+def protect(text):
+    """
+    Returns the `ProtectedString` of the message `text`.
+    """
+    text = six.text_type(text)
+    placeholders = []
+
+    def replace(match):
+        placeholder = match.group(0)
+        if placeholder == '%%':
+            return placeholder
+        placeholders.append(placeholder)
+        return u'<T123P{}/>'.format(len(placeholders) - 1)
+
+    template = PLACEHOLDER_PATTERN.sub(replace, text)
+    return ProtectedString(text, template, tuple(placeholders))
+
+
+def protect_many(strings):
+    """
+    Returns the `ProtectedString` of each of the messages in `strings`.
+    """
+    return [protect(text) for text in strings]
@@ -0,0 +1,356 @@
+"""
+Translates the messages missing from the message files at runtime, without blocking the requests.
+
+A message without a translation for the active language is served untranslated, as gettext does,
+and queued; a background thread translates the queued messages by the configured translator service,
+keeps them in memory, so they are served translated from then on, and writes them back to the message files.
+With `AUTOTRANSLATE_TRANSLATION_MEMORY` the translations also survive restarts without new requests.
+
+    MIDDLEWARE = [
+        ...
+        'django.middleware.locale.LocaleMiddleware',
+        'autotranslate.middleware.RuntimeTranslationMiddleware',
+    ]
+"""
+import gettext
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import polib
+import six
+from django.conf import settings
+
+from autotranslate.compat import setting_changed
+from autotranslate.files import locked, save_po
+from autotranslate.manifest import has_translation
+from autotranslate.throttling import monotonic
+
+logger = logging.getLogger(__name__)
+
+# separates the context from the message in the msgids looked up by pgettext()
+CONTEXT_SEPARATOR = u'\x04'
+
+NPLURALS = re.compile(r'nplurals\s*=\s*(\d+)')
+
+
+def split_context(message):
+    """
+    Returns the context and the message of a msgid looked up by `gettext()` or `pgettext()`.
+    """
+    context, separator, message = message.rpartition(CONTEXT_SEPARATOR)
+    return context or None, message
+
+
+class Backfill(object):
+    """
+    Translates the messages missing from the message files in a background thread.
+
+    The messages are queued once, however many requests miss them while they are being translated,
+    and every batch of them is translated by a single call to the translator service per locale.
+    """
+
+    def __init__(self, translator=None, delay=0.5, write_back=True, set_fuzzy=True, domain='django',
+                 retry_after=60):
+        """
+        :param translator:  the `BaseTranslatorService`, defaults to the one of `translate_messages`
+        :param delay:       seconds the thread waits for more missing messages before translating them
+        :param retry_after: seconds the messages which failed to translate are not queued again
+        :param write_back:  add the translations to the message files of the first of `LOCALE_PATHS`
+        :param set_fuzzy:   set the fuzzy flag on the translations written back
+        :param domain:      the message files written back, `django.po` by default
+        """
+        self.translator = translator
+        self.delay = delay
+        self.write_back = write_back
+        self.set_fuzzy = set_fuzzy
+        self.domain = domain
+        self.retry_after = retry_after
+        # (locale, (msgctxt, msgid, msgid_plural)) -> the translations of msgid and msgid_plural
+        self.translations = {}
+        # (locale, message) -> when it failed to translate
+        self.failed = {}
+        self.lock = threading.Lock()
+        self.queue = []
+        self.queued = set()
+        self.wakeup = threading.Event()
+        self.idle = threading.Condition(self.lock)
+        self.thread = None
+
+    def translate(self, locale, message):
+        """
+        Returns the translations of the `(msgctxt, msgid, msgid_plural)` message into the locale,
+        or None after queueing the message if it has not been translated yet.
+        """
+        key = (locale, message)
+        translations = self.translations.get(key)
+        if translations is None and message[1]:
+            with self.lock:
+                if key not in self.queued and key not in self.translations and not self.is_failed(key):
+                    self.queued.add(key)
+                    self.queue.append(key)
+                    self.start()
+                    self.wakeup.set()
+        return translations
+
+    def is_failed(self, key):
+        """
+        Returns True if the message failed to translate less than `retry_after` seconds ago,
+        called with the lock held.
+        """
+        failed = self.failed.get(key)
+        if failed is None:
+            return False
+        if monotonic() - failed < self.retry_after:
+            return True
+        del self.failed[key]
+        return False
+
+    def start(self):
+        """
+        Starts the thread, again in a forked process, called with the lock held.
+        """
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.run, name='autotranslate-backfill')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            if self.delay:
+                # the messages missing from the same pages are translated together
+                time.sleep(self.delay)
+            self.wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        Translates the queued messages.
+        """
+        with self.lock:
+            keys, self.queue = self.queue, []
+
+        messages = OrderedDict()
+        for locale, message in keys:
+            messages.setdefault(locale, []).append(message)
+        for locale, locale_messages in messages.items():
+            try:
+                translated = self.translate_messages(locale, locale_messages)
+            except Exception:
+                # queued again by the next request missing them after a while, not by every request
+                logger.warning('failed to translate {} messages for locale `{}`'.format(
+                    len(locale_messages), locale), exc_info=True)
+                failed = monotonic()
+                with self.lock:
+                    for message in locale_messages:
+                        self.failed[(locale, message)] = failed
+                continue
+
+            with self.lock:
+                for message, translations in translated.items():
+                    self.translations[(locale, message)] = translations
+            if self.write_back:
+                try:
+                    self.write_messages(locale, translated)
+                except Exception:
+                    logger.warning('failed to write back {} translations for locale `{}`'.format(
+                        len(translated), locale), exc_info=True)
+
+        with self.lock:
+            self.queued.difference_update(keys)
+            self.idle.notify_all()
+
+    def wait(self, timeout=None):
+        """
+        Waits until the queued messages have been translated, returns False on timeout.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self.lock:
+            while self.queued:
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.idle.wait(remaining)
+        return True
+
+    def translate_messages(self, locale, messages):
+        """
+        Returns the translations of the `(msgctxt, msgid, msgid_plural)` messages into the locale.
+        """
+        strings = OrderedDict()
+        for context, msgid, msgid_plural in messages:
+            strings[msgid] = None
+            if msgid_plural:
+                strings[msgid_plural] = None
+        strings = list(strings)
+
+        if self.translator is not None:
+            translated = self.translator.translate_strings(strings, locale, 'en', False)
+        else:
+            from autotranslate.utils import translate_strings
+            translated = translate_strings(strings, locale, 'en', False)
+        translated = dict(zip(strings, translated))
+
+        return dict((message, tuple(translated[string] for string in message[1:] if string))
+                    for message in messages)
+
+    def write_messages(self, locale, translated):
+        """
+        Adds the `translated` messages to the message file of the locale, or fills up their empty entries.
+        The entries translated meanwhile, by another process as well, are left alone.
+        """
+        path = os.path.join(settings.LOCALE_PATHS[0], locale, 'LC_MESSAGES', '{}.po'.format(self.domain))
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError:
+            # created by another thread or process meanwhile
+            if not os.path.isdir(os.path.dirname(path)):
+                raise
+        with locked(path):
+            # read inside the lock, the other processes may have written it since
+            self.merge_messages(path, translated)
+
+    def merge_messages(self, path, translated):
+        """
+        Merges the `translated` messages into the message file at `path`.
+        """
+        if os.path.exists(path):
+            po = polib.pofile(path)
+        else:
+            po = polib.POFile()
+            po.metadata = {'Content-Type': 'text/plain; charset=UTF-8'}
+        match = NPLURALS.search(po.metadata.get('Plural-Forms', ''))
+        nplurals = int(match.group(1)) if match else 2
+
+        entries = dict(((entry.msgctxt, entry.msgid), entry) for entry in po)
+        for (context, msgid, msgid_plural), translations in sorted(
+                translated.items(), key=lambda item: (item[0][0] or u'', item[0][1])):
+            entry = entries.get((context, msgid))
+            if entry is None:
+                entry = polib.POEntry(msgctxt=context, msgid=msgid, msgid_plural=msgid_plural or u'')
+                if msgid_plural:
+                    entry.msgstr_plural = dict((index, u'') for index in range(nplurals))
+                po.append(entry)
+            elif has_translation(entry) or bool(entry.msgid_plural) != bool(msgid_plural):
+                continue
+
+            if msgid_plural:
+                for index in entry.msgstr_plural:
+                    entry.msgstr_plural[index] = translations[0 if index == 0 else 1]
+            else:
+                entry.msgstr = translations[0]
+            if self.set_fuzzy and 'fuzzy' not in entry.flags:
+                entry.flags.append('fuzzy')
+        save_po(po, path)
+
+
+class RuntimeTranslations(gettext.NullTranslations):
+    """
+    The fallback of a Django translation looking up the messages it misses in the `Backfill`.
+    """
+
+    def __init__(self, locale, backfill):
+        gettext.NullTranslations.__init__(self)
+        self.locale = locale
+        self.backfill = backfill
+
+    def gettext(self, message):
+        translations = self.backfill.translate(self.locale, split_context(message) + (None,))
+        if translations is not None:
+            return translations[0]
+        if self._fallback:
+            return self._fallback.gettext(message)
+        return message
+
+    def ngettext(self, msgid1, msgid2, n):
+        context, msgid = split_context(msgid1)
+        translations = self.backfill.translate(self.locale, (context, msgid, split_context(msgid2)[1]))
+        if translations is not None:
+            return translations[0] if n == 1 else translations[1]
+        if self._fallback:
+            return self._fallback.ngettext(msgid1, msgid2, n)
+        return msgid1 if n == 1 else msgid2
+
+    if six.PY2:
+        def ugettext(self, message):
+            translations = self.backfill.translate(self.locale, split_context(message) + (None,))
+            if translations is not None:
+                return translations[0]
+            if self._fallback:
+                return self._fallback.ugettext(message)
+            return six.text_type(message)
+
+        def ungettext(self, msgid1, msgid2, n):
+            context, msgid = split_context(msgid1)
+            translations = self.backfill.translate(self.locale, (context, msgid, split_context(msgid2)[1]))
+            if translations is not None:
+                return translations[0] if n == 1 else translations[1]
+            if self._fallback:
+                return self._fallback.ungettext(msgid1, msgid2, n)
+            return six.text_type(msgid1 if n == 1 else msgid2)
+
+
+_install_lock = threading.Lock()
+
+
+def install(language, backfill=None):
+    """
+    Makes the Django translation of the language fall back to the `Backfill`, once.
+    The source language, English, is never translated.
+    """
+    from django.utils.translation import to_locale, trans_real
+
+    if not language or language.split('-')[0] == 'en':
+        return
+    translation = trans_real.translation(language)
+    if isinstance(translation._fallback, RuntimeTranslations):
+        return
+    with _install_lock:
+        if not isinstance(translation._fallback, RuntimeTranslations):
+            runtime = RuntimeTranslations(to_locale(language), backfill or get_backfill())
+            # ahead of the translation of `LANGUAGE_CODE`, which is shared by all the languages
+            runtime._fallback = translation._fallback
+            translation._fallback = runtime
+
+
+def create_backfill():
+    """
+    Returns a new `Backfill` configured by `AUTOTRANSLATE_RUNTIME`.
+    """
+    config = getattr(settings, 'AUTOTRANSLATE_RUNTIME', None) or {}
+    return Backfill(delay=config.get('DELAY', 0.5), write_back=config.get('WRITE_BACK', True),
+                    set_fuzzy=config.get('SET_FUZZY', True), domain=config.get('DOMAIN', 'django'),
+                    retry_after=config.get('RETRY_AFTER', 60))
+
+
+_backfill = None
+_backfill_lock = threading.Lock()
+
+
+def get_backfill():
+    """
+    Returns the shared `Backfill`, it is created on first use.
+    """
+    global _backfill
+    if _backfill is None:
+        with _backfill_lock:
+            if _backfill is None:
+                _backfill = create_backfill()
+    return _backfill
+
+
+def reset_backfill(*args, **kwargs):
+    """
+    Discards the shared `Backfill` when its settings are changed by the tests.
+    """
+    global _backfill
+    if kwargs.get('setting') == 'AUTOTRANSLATE_RUNTIME':
+        with _backfill_lock:
+            _backfill = None
+
+
+setting_changed.connect(reset_backfill)
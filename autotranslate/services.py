@@ -1,20 +1,65 @@
-import collections
-import six
+# -*- coding: utf-8 -*-
+import functools
+import logging
+import os
+import random
 import re
+import six
+import threading
+import time
 
-from autotranslate.compat import goslate, googleapiclient
+from autotranslate import packing, placeholders, signals
+from autotranslate.compat import import_optional, Iterable
+from autotranslate.glossary import Glossary
+from autotranslate.throttling import error_status, get_throttle, monotonic
+from autotranslate.transport import Httplib2Transport, get_transport
 
 from django.conf import settings
 
-from yandex_translate import YandexTranslate
-from googleapiclient.discovery import build
+logger = logging.getLogger(__name__)
 
 
-class BaseTranslatorService:
+class BaseTranslatorService(object):
     """
     Defines the base methods that should be implemented
+
+    Services sending the strings to an API only need to implement `.translate_segments()`,
+    the placeholders are protected and restored by `.translate_strings()`.
     """
 
+    # maximum number of strings sent in a single request
+    max_segments = 128
+
+    # maximum number of characters sent in a single request, None for no limit
+    max_characters = None
+
+    # HTTP statuses of the quota errors and transient failures, which are retried
+    retry_statuses = (429, 500, 502, 503, 504)
+
+    _throttle = None
+    _throttle_lock = threading.Lock()
+
+    @property
+    def throttle(self):
+        """
+        The `autotranslate.throttling.Throttle` all the requests of the service go through.
+        """
+        if self._throttle is None:
+            with self._throttle_lock:
+                if self._throttle is None:
+                    self._throttle = get_throttle(self.__class__.__name__)
+        return self._throttle
+
+    def is_retryable(self, error):
+        """
+        Returns True if the request which raised `error` should be retried.
+        """
+        status = error_status(error)
+        if status is not None:
+            return status in self.retry_statuses
+        # network errors
+        return isinstance(error, (IOError, OSError))
+
     def translate_string(self, text, target_language, source_language='en'):
         """
         Returns a single translated string literal for the target language.
@@ -27,112 +72,487 @@ class BaseTranslatorService:
         in the same order as in the strings.
         :return:    if `optimized` is True returns a generator else an array
         """
-        raise NotImplementedError('.translate_strings() must be overridden.')
+        assert isinstance(strings, Iterable), '`strings` should a iterable containing string_types'
+        start = monotonic()
+        protected, segments = self.prepare_strings(strings, target_language, source_language)
+        self.strings_processed('protect', protected, target_language, source_language, monotonic() - start)
+
+        packed = self.pack(segments)
+        translated = [None] * len(packed.pieces)
+        for batch in packed.batches:
+            pieces = [packed.pieces[index] for index in batch]
+            for index, translation in zip(batch, self.request_segments(pieces, target_language, source_language)):
+                translated[index] = translation
+
+        start = monotonic()
+        translations = self.finish_translations(protected, packed.join(translated), target_language, source_language)
+        self.strings_processed('restore', protected, target_language, source_language, monotonic() - start)
+        return (t for t in translations) if optimized else translations
+
+    def translate_strings_async(self, strings, target_language, source_language='en'):
+        """
+        Returns an awaitable resolving to a list of translated strings for the target language
+        in the same order as in the strings.
+
+        Services without native asyncio support run `.translate_strings()`
+        in the default executor of the current event loop.
+        """
+        import asyncio
+        return asyncio.get_event_loop().run_in_executor(
+            None, functools.partial(self.translate_strings, list(strings), target_language, source_language, False))
+
+    def prepare_strings(self, strings, target_language, source_language='en'):
+        """
+        Returns the `placeholders.ProtectedString` of each string
+        and the list of strings as they are sent to the API.
+        """
+        protected = placeholders.protect_many(strings)
+        return protected, [p.template for p in protected]
 
+    def estimate(self, strings, target_language, source_language='en'):
+        """
+        Returns the number of `requests` `.translate_strings()` would send for the strings
+        and of the `cache_hits` it would find, without sending any request.
+        """
+        protected, segments = self.prepare_strings(strings, target_language, source_language)
+        return {'requests': len(self.pack(segments).batches), 'cache_hits': 0}
 
-class GoSlateTranslatorService(BaseTranslatorService):
+    def pack(self, segments):
+        """
+        Returns the `autotranslate.packing.Packing` of the prepared strings into requests
+        within `max_segments` and `max_characters`.
+        """
+        return packing.pack(segments, self.max_segments, self.max_characters)
+
+    def request_segments(self, segments, target_language, source_language='en'):
+        """
+        Calls `.translate_segments()` through the throttle of the service
+        and reports the request by `autotranslate.signals.request_sent`.
+        """
+        attempts = []
+
+        def translate(*args):
+            attempts.append(args)
+            return self.translate_segments(*args)
+
+        start = monotonic()
+        translations = self.throttle.call(translate, (segments, target_language, source_language), self.is_retryable)
+        self.request_sent(segments, target_language, source_language, monotonic() - start, len(attempts) - 1)
+        return translations
+
+    def request_sent(self, segments, target_language, source_language, latency, retries):
+        signals.request_sent.send(
+            sender=self.__class__, target_language=target_language, source_language=source_language,
+            segments=len(segments), characters=sum(len(segment) for segment in segments),
+            latency=latency, retries=retries)
+
+    def strings_processed(self, phase, protected, target_language, source_language, elapsed):
+        signals.strings_processed.send(
+            sender=self.__class__, target_language=target_language, source_language=source_language,
+            phase=phase, strings=len(protected), elapsed=elapsed)
+
+    def translate_segments(self, segments, target_language, source_language='en'):
+        """
+        Returns the raw translations of at most `max_segments` prepared strings,
+        sent in a single request.
+        """
+        raise NotImplementedError('.translate_segments() must be overridden.')
+
+    def finish_translations(self, protected, translations, target_language, source_language='en'):
+        """
+        Restores the placeholders of the strings in their raw translations.
+        """
+        translations = [p.restore(translation) for p, translation in zip(protected, translations)]
+        for p, translation in zip(protected, translations):
+            logger.debug(u'{} -> {}'.format(p.text, translation))
+        return translations
+
+
+class CachedTranslatorService(BaseTranslatorService):
     """
-    Uses the free web-based API for translating.
-    https://bitbucket.org/zhuoqiang/goslate
+    Looks up the translations in a translation memory first
+    and sends only the unknown strings to the wrapped service.
     """
 
+    def __init__(self, service, memory, service_name=None):
+        """
+        :param service:         the `BaseTranslatorService` doing the actual translations
+        :param memory:          a `autotranslate.cache.BaseTranslationMemory` instance
+        :param service_name:    the name the translations of `service` are stored under,
+                                defaults to the import path of its class
+        """
+        self.service = service
+        self.memory = memory
+        self.service_name = service_name or '{}.{}'.format(service.__class__.__module__,
+                                                           service.__class__.__name__)
 
-    def __init__(self):
-        self.developer_key = getattr(settings, 'YANDEX_TRANSLATE_KEY', None)
-        self.yandex_translate_obj = YandexTranslate(self.developer_key)
+    def translate_string(self, text, target_language, source_language='en'):
+        return self.translate_strings([text], target_language, source_language, False)[0]
 
-        # self.number = self.yandex_translate_obj.translate("_|_number_|_(~d~", 'fr')
-        # self.text_item = self.yandex_translate_obj.translate("_|_item_|_(~s~", 'fr')
-        # self.character_s = self.yandex_translate_obj.translate("s", 'fr')
-        # self.character_d = self.yandex_translate_obj.translate("d", 'fr')
+    def translate_strings(self, strings, target_language, source_language='en', optimized=True):
+        assert isinstance(strings, Iterable), '`strings` should a iterable containing string_types'
+        from autotranslate.cache import normalize_text
+
+        keys = [normalize_text(text) for text in strings]
+        known = self.memory.get_many(self.service_name, source_language, target_language, keys)
+        signals.memory_lookup.send(sender=self.__class__, target_language=target_language,
+                                   source_language=source_language,
+                                   hits=sum(1 for key in keys if key in known),
+                                   misses=sum(1 for key in keys if key not in known))
+
+        # translate every unknown string only once, even if it is repeated
+        pending, seen = [], set(known)
+        for key in keys:
+            if key not in seen:
+                seen.add(key)
+                pending.append(key)
+
+        if pending:
+            translated = self.service.translate_strings(list(pending), target_language, source_language, False)
+            translated = dict(zip(pending, translated))
+            self.memory.set_many(self.service_name, source_language, target_language, translated)
+            known.update(translated)
+
+        translations = [known[key] for key in keys]
+        return (t for t in translations) if optimized else translations
+
+    def estimate(self, strings, target_language, source_language='en'):
+        from autotranslate.cache import normalize_text
+
+        keys = [normalize_text(text) for text in strings]
+        known = self.memory.contains_many(self.service_name, source_language, target_language, keys)
+        pending = [key for key in set(keys) if key not in known]
+        if pending:
+            estimate = self.service.estimate(pending, target_language, source_language)
+        else:
+            estimate = {'requests': 0, 'cache_hits': 0}
+        estimate['cache_hits'] += sum(1 for key in keys if key in known)
+        return estimate
+
+
+class RouterTranslatorService(BaseTranslatorService):
+    """
+    Splits the strings across several services, in proportion to their observed speed
+    and within their rate limits, and fails over to the other services when one of them fails.
 
-        # assert goslate, '`GoSlateTranslatorService` requires `goslate` package'
-        # self.service = goslate.Goslate()
+    A service which failed is not used for `cooldown` seconds, unless all the others failed as well.
+    """
+
+    def __init__(self, services, cooldown=None):
+        """
+        :param services:    the `BaseTranslatorService` instances to route the strings to
+        :param cooldown:    seconds a failed service is left alone, `AUTOTRANSLATE_ROUTER['COOLDOWN']` by default
+        """
+        assert services, '`RouterTranslatorService` requires at least one service'
+        config = getattr(settings, 'AUTOTRANSLATE_ROUTER', None) or {}
+        self.services = list(services)
+        self.cooldown = cooldown if cooldown is not None else config.get('COOLDOWN', 60)
+        self.lock = threading.Lock()
+        # moving average of the seconds per string of every service
+        self.latencies = [None] * len(self.services)
+        self.failed_until = [0] * len(self.services)
+        # the calling thread -> the threads sending the other shares of its calls
+        self.pools = {}
+        self.pools_pid = os.getpid()
+
+    def get_pool(self):
+        """
+        Returns the threads of the calling thread sending the shares of the services but one at once,
+        so the concurrent callers, e.g. the jobs of `translate_messages`, do not wait for each other.
+        It is created on first use, the ones of the threads which ended are stopped.
+        """
+        current = threading.current_thread()
+        with self.lock:
+            if self.pools_pid != os.getpid():
+                # the threads are not forked
+                self.pools, self.pools_pid = {}, os.getpid()
+            ended = [self.pools.pop(thread) for thread in list(self.pools) if not thread.is_alive()]
+            pool = self.pools.get(current)
+            if pool is None:
+                from multiprocessing.pool import ThreadPool
+                pool = self.pools[current] = ThreadPool(max(1, len(self.services) - 1))
+        for ended_pool in ended:
+            ended_pool.close()
+        return pool
+
+    def close(self):
+        """
+        Stops the threads of the router.
+        """
+        with self.lock:
+            pools, self.pools = list(self.pools.values()) if self.pools_pid == os.getpid() else [], {}
+        for pool in pools:
+            pool.close()
+            pool.join()
 
     def translate_string(self, text, target_language, source_language='en'):
-        assert isinstance(text, six.string_types), '`text` should a string literal'
-        direction = source_language+'-'+target_language
-        response = self.yandex_translate_obj.translate(text, direction)
-        return response['text'][0]
+        return self.translate_strings([text], target_language, source_language, False)[0]
 
     def translate_strings(self, strings, target_language, source_language='en', optimized=True):
-        assert isinstance(strings, collections.Iterable), '`strings` should a iterable containing string_types'
-        direction = source_language+'-'+target_language
-        translation_list = strings
-        count = 0
-
-        from autotranslate.utils import look_placeholders
-        from .management.commands.translate_messages import fix_translation
-        from general.models import CustomTranslationDictionary
-        for item in strings:
-            #add HTML tag for custom translation
-            for custom_translation in CustomTranslationDictionary.objects\
-                    .filter(input_language=source_language, output_language=target_language)\
-                    .order_by('-priority').values_list('original', 'id'):
-                look_up_text = custom_translation[0]
-                if look_up_text in item:
-                    item = item.replace(look_up_text, "<T123T"+str(custom_translation[1])+"/>")
-
-            response = self.yandex_translate_obj.translate(item, direction, 'html')
-            translation_response = response['text'][0]
+        assert isinstance(strings, Iterable), '`strings` should a iterable containing string_types'
+        strings = list(strings)
+        translations = [None] * len(strings)
+        if strings:
+            self.route(list(range(len(strings))), strings, translations, target_language, source_language, set())
+        return (t for t in translations) if optimized else translations
+
+    def estimate(self, strings, target_language, source_language='en'):
+        strings = list(strings)
+        now = monotonic()
+        with self.lock:
+            healthy = [i for i in range(len(self.services)) if self.failed_until[i] <= now]
+            shares = self.split(list(range(len(strings))), self.weights(healthy or range(len(self.services))))
+
+        estimate = {'requests': 0, 'cache_hits': 0}
+        for service_index, indexes in shares:
+            share = self.services[service_index].estimate([strings[index] for index in indexes],
+                                                          target_language, source_language)
+            for name in estimate:
+                estimate[name] += share[name]
+        return estimate
+
+    def route(self, indexes, strings, translations, target_language, source_language, excluded):
+        """
+        Translates the `strings` at `indexes` into `translations` by the services which are not `excluded`.
+        """
+        now = monotonic()
+        with self.lock:
+            candidates = [i for i in range(len(self.services)) if i not in excluded]
+            healthy = [i for i in candidates if self.failed_until[i] <= now]
+            shares = self.split(indexes, self.weights(healthy or candidates))
+
+        def translate(share):
+            service_index, share_indexes = share
             try:
-                translation_response = fix_translation(item,  translation_response)
-            except IndexError:
-                pass
+                self.translate_share(service_index, share_indexes, strings, translations,
+                                     target_language, source_language)
+            except Exception as e:
+                return e
+
+        if len(shares) > 1:
+            # the calling thread sends the first share itself
+            others = self.get_pool().map_async(translate, shares[1:])
+            errors = [translate(shares[0])] + others.get()
+        else:
+            errors = [translate(share) for share in shares]
+
+        failed = [(share, error) for share, error in zip(shares, errors) if error is not None]
+        if not failed:
+            return
+
+        with self.lock:
+            for (service_index, share_indexes), error in failed:
+                logger.warning('`{}` failed with {!r}, failing over'.format(
+                    self.services[service_index].__class__.__name__, error))
+                self.failed_until[service_index] = now + self.cooldown
+                excluded.add(service_index)
+        if len(excluded) == len(self.services):
+            raise failed[0][1]
+        self.route([index for (_, share_indexes), _ in failed for index in share_indexes],
+                   strings, translations, target_language, source_language, excluded)
+
+    def weights(self, candidates):
+        """
+        Returns the strings per second expected from each of the `candidates` by their index.
+        """
+        known = [self.latencies[i] for i in candidates if self.latencies[i]]
+        default = sum(known) / len(known) if known else 1.0
+        weights = {}
+        for i in candidates:
+            weight = 1.0 / (self.latencies[i] or default)
+            bucket = self.services[i].throttle.bucket
+            if bucket is not None:
+                # the rate limit of the service in strings per second
+                weight = min(weight, bucket.rate * self.services[i].max_segments)
+            weights[i] = weight
+        return weights
+
+    def split(self, indexes, weights):
+        """
+        Returns `(service index, string indexes)` of the services getting strings, in proportion to `weights`.
+        """
+        total = sum(weights.values())
+        shares, start = [], 0
+        items = sorted(weights.items())
+        for n, (service_index, weight) in enumerate(items):
+            if n == len(items) - 1:
+                end = len(indexes)
+            else:
+                end = min(len(indexes), start + int(len(indexes) * weight / total + 0.5))
+            if end > start:
+                shares.append((service_index, indexes[start:end]))
+            start = end
+        return shares
+
+    def translate_share(self, service_index, indexes, strings, translations, target_language, source_language):
+        start = monotonic()
+        translated = self.services[service_index].translate_strings(
+            [strings[index] for index in indexes], target_language, source_language, False)
+        for index, translation in zip(indexes, translated):
+            translations[index] = translation
+
+        latency = (monotonic() - start) / len(indexes)
+        with self.lock:
+            previous = self.latencies[service_index]
+            self.latencies[service_index] = latency if previous is None else 0.7 * previous + 0.3 * latency
+
+
+class PseudoTranslationError(IOError):
+    """
+    The error injected by `PseudoTranslatorService`, retried like a 503 response.
+    """
+    status = 503
+
+
+class PseudoTranslatorService(BaseTranslatorService):
+    """
+    Pseudo-translates the strings offline, deterministically, e.g. `Cities` -> `[Çíţíéš~]`,
+    to load test the command and run it in CI without network or API keys.
+
+    The latency, jitter, batch limit and rate of injected errors of the requests are simulated,
+    configured by `AUTOTRANSLATE_PSEUDO` or the arguments.
+    """
+    accents = dict(zip(map(ord, u'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'),
+                       u'àƀçđéƒĝĥíĵķļɱñöþǫŕšţüṽŵẋýžÀƁÇĐÉƑĜĤÍĴĶĻṀÑÖÞǪŔŠŢÜṼŴẊÝŽ'))
 
-            if "_____s_____[[[[xstr]]]]" in translation_response:
-                translation_response = translation_response.replace('_____s_____[[[[xstr]]]]', '%s')
+    # the tags and entities are left alone
+    markup_pattern = re.compile(r'(<[^<>]*>|&#?\w+;)')
+    padding_pattern = re.compile(r'^(\s*)(.*?)(\s*)$', re.DOTALL)
 
-            if "_____d_____[[[[xnum]]]]" in translation_response:
-                translation_response = translation_response.replace('_____d_____[[[[xnum]]]]', '%d')
+    def __init__(self, max_segments=None, max_characters=None, latency=None, jitter=None, error_rate=None,
+                 expansion=None, seed=None):
+        """
+        :param max_segments:    maximum number of strings in a request
+        :param max_characters:  maximum number of characters in a request
+        :param latency:         seconds every request takes
+        :param jitter:          at most this many seconds are added to the latency at random
+        :param error_rate:      the ratio of the requests failing with `PseudoTranslationError`
+        :param expansion:       the translations are longer than the strings by this ratio
+        :param seed:            the seed of the jitter and the injected errors
+        """
+        config = getattr(settings, 'AUTOTRANSLATE_PSEUDO', None) or {}
+        self.max_segments = max_segments or config.get('MAX_SEGMENTS', 128)
+        self.max_characters = max_characters or config.get('MAX_CHARACTERS')
+        self.latency = latency if latency is not None else config.get('LATENCY', 0)
+        self.jitter = jitter if jitter is not None else config.get('JITTER', 0)
+        self.error_rate = error_rate if error_rate is not None else config.get('ERROR_RATE', 0)
+        self.expansion = expansion if expansion is not None else config.get('EXPANSION', 0.3)
+        self.random = random.Random(seed if seed is not None else config.get('SEED', 0))
+        self.random_lock = threading.Lock()
 
-            variables = re.findall('_____(.*?)_____', item)
-            translate_variables = re.findall('_____(.*?)_____', translation_response)
-            for translate_variable, variable in zip(translate_variables, variables):
-                if look_placeholders(item, variable, translation_response) == 's':
-                    translation_response = re.sub(r'_____' + re.escape(translate_variable) + r'_____', '%(' + variable + ')', translation_response)
-                    translation_response = translation_response.replace('[[[[xstr]]]]', 's')
-                elif look_placeholders(item, variable, translation_response) == 'd':
-                    translation_response = re.sub(r'_____' + re.escape(translate_variable) + r'_____', '%(' + variable + ')', translation_response)
-                    translation_response = translation_response.replace('[[[[xnum]]]]', 'd')
-                else:
-                    translation_response = re.sub(r'_____' + re.escape(translate_variable) + r'_____', '%(' + variable + ')', translation_response)
+    def translate_string(self, text, target_language, source_language='en'):
+        return self.translate_strings([text], target_language, source_language, False)[0]
+
+    def translate_segments(self, segments, target_language, source_language='en'):
+        assert len(segments) <= self.max_segments, 'too many strings in a request'
+        assert not self.max_characters or sum(len(s) for s in segments) <= self.max_characters, \
+            'too many characters in a request'
+        with self.random_lock:
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+            failed = self.error_rate and self.random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            raise PseudoTranslationError('injected error')
+        return [self.pseudo_translate(segment) for segment in segments]
+
+    def pseudo_translate(self, text):
+        """
+        Returns the pseudo-translation of the text, the markup and surrounding whitespace are kept.
+        """
+        leading, text, trailing = self.padding_pattern.match(text).groups()
+        if not text:
+            return leading + trailing
 
-            translation_response = translation_response.replace('%(s)s', '%s')
-            translation_response = translation_response.replace('%(d)d', '%d')
+        parts = self.markup_pattern.split(text)
+        # the even parts are the text between the markup
+        parts[::2] = [part.translate(self.accents) for part in parts[::2]]
+        length = sum(len(part) for part in parts[::2])
+        return u'{}[{}{}]{}'.format(leading, u''.join(parts), u'~' * int(length * self.expansion), trailing)
 
-            # because French
-            translation_response = translation_response.replace(')_s', ')s')
 
-            variables = re.findall('\{(.*?)\}', item)
-            translate_variables = re.findall('\{(.*?)\}', translation_response)
-            for translate_variable, variable in zip(translate_variables, variables):
-                translation_response = re.sub(r'\{' + re.escape(translate_variable) + r'\}', '{' + variable + '}', translation_response )
+class GoSlateTranslatorService(BaseTranslatorService):
+    """
+    Uses the free web-based API for translating.
+    https://bitbucket.org/zhuoqiang/goslate
+    """
 
-            if translation_response[0] == '\n' and item[0] != '\n':
-                translation_response = ' ' + translation_response
+    # the yandex API accepts at most 10k characters in a request
+    max_characters = 10000
 
-            if translation_response.endswith('\n') and  not item.endswith('\n'):
-                translation_response = translation_response + ' '
+    def __init__(self, max_segments=128):
+        self.developer_key = getattr(settings, 'YANDEX_TRANSLATE_KEY', None)
+        self.client = None
 
-            # final cleanup
-            translation_response = translation_response.replace('[[[[xstr]]]]', 's')
-            translation_response = translation_response.replace('[[[[xnum]]]]', 'd')
+        # number of strings sent in a single request,
+        # the yandex API accepts multiple `text` parameters
+        # and returns the translations in the same order
+        self.max_segments = max_segments
 
-            translation_list[count] = translation_response
-            count += 1
+        self.glossaries = {}
+        self.glossaries_lock = threading.Lock()
 
-            #removing HTML tag with custom translation
-            for custom_translation in CustomTranslationDictionary.objects\
-                    .filter(input_language=source_language, output_language=target_language)\
-                    .order_by('-priority').values_list('translation', 'id'):
-                look_up_text = "<T123T"+str(custom_translation[1])+" />"
+        # assert goslate, '`GoSlateTranslatorService` requires `goslate` package'
+        # self.service = goslate.Goslate()
 
-                if look_up_text in translation_response:
-                    translation_response = translation_response.replace(look_up_text, custom_translation[0])
-            print translation_response.encode('utf-8')
-        return translation_list
+    def build_client(self):
+        yandex_translate = import_optional('yandex_translate')
+        assert yandex_translate, '`GoSlateTranslatorService` requires `yandex.translate` package'
+        # `YandexTranslate` opens a connection per request
+        return YandexTranslateClient(self.developer_key, get_transport())
 
+    @property
+    def yandex_translate_obj(self):
+        # the client is stateless, it can be shared by the threads
+        if self.client is None:
+            self.client = self.build_client()
+        return self.client
+
+    def translate_string(self, text, target_language, source_language='en'):
+        assert isinstance(text, six.string_types), '`text` should a string literal'
+        # throttled, retried and protected like the batches
+        return self.translate_strings([text], target_language, source_language, False)[0]
+
+    def prepare_strings(self, strings, target_language, source_language='en'):
+        protected, segments = super(GoSlateTranslatorService, self).prepare_strings(
+            strings, target_language, source_language)
+        glossary = self.get_glossary(source_language, target_language)
+        return protected, [glossary.protect(segment) for segment in segments]
+
+    def translate_segments(self, segments, target_language, source_language='en'):
+        direction = source_language+'-'+target_language
+        response = self.yandex_translate_obj.translate(segments, direction, 'html')
+        assert len(response['text']) == len(segments), 'unexpected number of translations in the response'
+        return response['text']
+
+    def finish_translations(self, protected, translations, target_language, source_language='en'):
+        glossary = self.get_glossary(source_language, target_language)
+        translations = [glossary.restore(translation) for translation in translations]
+        return super(GoSlateTranslatorService, self).finish_translations(
+            protected, translations, target_language, source_language)
+
+    def get_glossary(self, source_language, target_language):
+        """
+        Returns the `Glossary` of the language pair, it is loaded only once per service instance.
+        """
+        key = (source_language, target_language)
+        with self.glossaries_lock:
+            if key not in self.glossaries:
+                self.glossaries[key] = Glossary(self.get_custom_translations(source_language, target_language))
+            return self.glossaries[key]
+
+    def get_custom_translations(self, source_language, target_language):
+        """
+        Returns the custom translations (`original`, `translation`, `id`) for the language pair,
+        the ones with the highest priority first.
+        """
+        try:
+            from general.models import CustomTranslationDictionary
+        except ImportError:
+            return []
+        return list(CustomTranslationDictionary.objects
+                    .filter(input_language=source_language, output_language=target_language)
+                    .order_by('-priority').values_list('original', 'translation', 'id'))
 
 
     # def __init__(self):
@@ -144,149 +564,83 @@ class GoSlateTranslatorService(BaseTranslatorService):
     #     return self.service.translate(text, target_language, source_language)
 
     # def translate_strings(self, strings, target_language, source_language='en', optimized=True):
-    #     assert isinstance(strings, collections.Iterable), '`strings` should a iterable containing string_types'
+    #     assert isinstance(strings, Iterable), '`strings` should a iterable containing string_types'
     #     translations = self.service.translate(strings, target_language, source_language)
     #     return translations if optimized else [_ for _ in translations]
 
 
-# class GoogleAPITranslatorService(BaseTranslatorService):
-#     """
-#     Uses the paid Google API for translating.
-#     https://github.com/google/google-api-python-client
-#     """
-#
-#     def __init__(self, max_segments=128):
-#         assert googleapiclient, '`GoogleAPITranslatorService` requires `google-api-python-client` package'
-#
-#         self.developer_key = getattr(settings, 'GOOGLE_TRANSLATE_KEY', None)
-#         assert self.developer_key, ('`GOOGLE_TRANSLATE_KEY` is not configured, '
-#                                     'it is required by `GoogleAPITranslatorService`')
-#
-#         from googleapiclient.discovery import build
-#         self.service = build('translate', 'v2', developerKey=self.developer_key)
-#
-#         # the google translation API has a limit of max
-#         # 128 translations in a single request
-#         # and throws `Too many text segments Error`
-#         self.max_segments = max_segments
-#         self.translated_strings = []
-#
-#     def translate_string(self, text, target_language, source_language='en'):
-#         assert isinstance(text, six.string_types), '`text` should a string literal'
-#         response = self.service.translations() \
-#             .list(source=source_language, target=target_language, q=[text]).execute()
-#         return response.get('translations').pop(0).get('translatedText')
-#
-#     def translate_strings(self, strings, target_language, source_language='en', optimized=True):
-#         assert isinstance(strings, collections.MutableSequence), \
-#             '`strings` should be a sequence containing string_types'
-#         assert not optimized, 'optimized=True is not supported in `GoogleAPITranslatorService`'
-#         if len(strings) <= self.max_segments:
-#             setattr(self, 'translated_strings', getattr(self, 'translated_strings', []))
-#             response = self.service.translations() \
-#                 .list(source=source_language, target=target_language, q=strings).execute()
-#             self.translated_strings.extend([t.get('translatedText') for t in response.get('translations')])
-#             return self.translated_strings
-#         else:
-#             self.translate_strings(strings[0:self.max_segments], target_language, source_language, optimized)
-#             _translated_strings = self.translate_strings(strings[self.max_segments:],
-#                                                          target_language, source_language, optimized)
-#
-#             # reset the property or it will grow with subsequent calls
-#             self.translated_strings = []
-#             return _translated_strings
+class YandexTranslateClient(object):
+    """
+    The `translate()` of `yandex_translate.YandexTranslate`, through the shared HTTP transport
+    so the connections are kept alive between the requests.
+    """
+    api_url = 'https://translate.yandex.net/api/v1.5/tr.json/translate'
+
+    def __init__(self, key, transport):
+        from yandex_translate import YandexTranslateException
+
+        if not key:
+            raise YandexTranslateException(401)
+        self.key = key
+        self.transport = transport
+
+    def translate(self, text, lang, format='plain'):
+        from yandex_translate import YandexTranslateException
+
+        data = {'text': text, 'format': format, 'lang': lang, 'key': self.key}
+        response = self.transport.post(self.api_url, data=data)
+        try:
+            result = response.json()
+        except ValueError:
+            # not an error of the API, e.g. of a proxy
+            response.raise_for_status()
+            raise
+        if result.get('code', 200) != 200:
+            raise YandexTranslateException(result['code'])
+        return result
 
 
 class GoogleAPITranslatorService(BaseTranslatorService):
+    """
+    Uses the paid Google API for translating.
+    https://github.com/google/google-api-python-client
+    """
 
-    def __init__(self):
+    # the maximum characters in a request recommended by google
+    max_characters = 5000
+
+    def __init__(self, max_segments=128):
         self.developer_key = getattr(settings, 'GOOGLE_TRANSLATE_KEY', None)
-        self.translate_obj = build('translate', 'v2', developerKey=self.developer_key)
+
+        # the client is not thread safe, so every thread gets a client of its own,
+        # their requests share the connections of the transport
+        self.local = threading.local()
+
+        # the google translation API has a limit of max
+        # 128 translations in a single request
+        # and throws `Too many text segments Error`
+        self.max_segments = max_segments
+
+    def build_client(self):
+        discovery = import_optional('googleapiclient.discovery')
+        assert discovery, '`GoogleAPITranslatorService` requires `google-api-python-client` package'
+        return discovery.build('translate', 'v2', developerKey=self.developer_key,
+                               http=Httplib2Transport(get_transport()))
+
+    @property
+    def translate_obj(self):
+        if getattr(self.local, 'translate_obj', None) is None:
+            self.local.translate_obj = self.build_client()
+        return self.local.translate_obj
 
     def translate_string(self, text, target_language, source_language='en'):
         assert isinstance(text, six.string_types), '`text` should a string literal'
-        response = self.translate_obj.translations() \
-            .list(source=source_language, target=target_language, q=[text]).execute()
-        return response.get('translations').pop(0).get('translatedText')
+        # throttled, retried and protected like the batches
+        return self.translate_strings([text], target_language, source_language, False)[0]
 
-    def translate_strings(self, strings, target_language, source_language='en', optimized=True):
-        assert isinstance(strings, collections.Iterable), '`strings` should a iterable containing string_types'
-        direction = source_language+'-'+target_language
-        translation_list = strings
-        count = 0
-
-        from autotranslate.utils import look_placeholders
-        from .management.commands.translate_messages import fix_translation
-        for item in strings:
-            response = self.translate_obj.translations().list(source='en', target=target_language, q=item).execute()
-            translation_response = response['translations'][0]['translatedText']
-            try:
-                translation_response = fix_translation(item,  translation_response)
-            except IndexError:
-                pass
-
-            translation_response = translation_response.replace('[ ', '[').replace(' ]', ']')
-            import pdb; pdb.set_trace()
-            if "_____s_____[[[[xstr]]]]" in translation_response:
-                translation_response = translation_response.replace('_____s_____[[[[xstr]]]]', '%s')
-
-            if "_____s_____[[[[XSTR]]]]" in translation_response:
-                translation_response = translation_response.replace('_____s_____[[[[XSTR]]]]', '%s')
-
-            if "_____d_____[[[[xnum]]]]" in translation_response:
-                translation_response = translation_response.replace('_____d_____[[[[xnum]]]]', '%d')
-
-            if "_____d_____[[[[XNUM]]]]" in translation_response:
-                translation_response = translation_response.replace('_____d_____[[[[XNUM]]]]', '%d')
-
-            variables = re.findall('_____(.*?)_____', item)
-            translate_variables = re.findall('_____(.*?)_____', translation_response)
-            for translate_variable, variable in zip(translate_variables, variables):
-                if look_placeholders(item, variable, translation_response) == 's':
-                    translation_response = re.sub(r'_____' + re.escape(translate_variable) + r'_____', '%(' + variable + ')', translation_response)
-                    translation_response = translation_response.replace('[[[[xstr]]]]', 's')
-                    translation_response = translation_response.replace('[[[[XSTR]]]]', 's')
-                elif look_placeholders(item, variable, translation_response) == 'd':
-                    translation_response = re.sub(r'_____' + re.escape(translate_variable) + r'_____', '%(' + variable + ')', translation_response)
-                    translation_response = translation_response.replace('[[[[xnum]]]]', 'd')
-                    translation_response = translation_response.replace('[[[[XNUM]]]]', 'd')
-                else:
-                    translation_response = re.sub(r'_____' + re.escape(translate_variable) + r'_____', '%(' + variable + ')', translation_response)
-
-            translation_response = translation_response.replace('%(s)s', '%s')
-            translation_response = translation_response.replace('%(d)d', '%d')
-
-            translation_response = translation_response.replace('%(s) s', '%s')
-            translation_response = translation_response.replace('%(d) d', '%d')
-
-            # because French
-            translation_response = translation_response.replace(')_s', ')s')
-
-            translation_response = translation_response.replace(') s', ')s')
-            translation_response = translation_response.replace(') d', ')d')
-
-            variables = re.findall('\{(.*?)\}', item)
-            translate_variables = re.findall('\{(.*?)\}', translation_response)
-            for translate_variable, variable in zip(translate_variables, variables):
-                translation_response = re.sub(r'\{' + re.escape(translate_variable) + r'\}', '{' + variable + '}', translation_response )
-
-            if translation_response[0] == '\n' and item[0] != '\n':
-                translation_response = ' ' + translation_response
-
-            if translation_response.endswith('\n') and  not item.endswith('\n'):
-                translation_response = translation_response + ' '
-
-            # final cleanup
-            translation_response = translation_response.replace('&quot;', '"')
-
-            translation_response = translation_response.replace('[[[[xstr]]]]', 's')
-            translation_response = translation_response.replace('[[[[xnum]]]]', 'd')
-
-            translation_response = translation_response.replace('[[[[XSTR]]]]', 's')
-            translation_response = translation_response.replace('[[[[XNUM]]]]', 'd')
-
-            translation_list[count] = translation_response
-            count += 1
-            print item
-            print translation_response
-        return translation_list
+    def translate_segments(self, segments, target_language, source_language='en'):
+        response = self.translate_obj.translations() \
+            .list(source=source_language, target=target_language, q=segments).execute()
+        assert len(response['translations']) == len(segments), \
+            'unexpected number of translations in the response'
+        return [t['translatedText'] for t in response['translations']]
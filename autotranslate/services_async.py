@@ -0,0 +1,269 @@
+"""
+Asyncio counterparts of the translator services.
+
+The requests for all the batches of a `translate_strings` call are sent concurrently,
+with at most `max_concurrency` requests in flight per event loop.
+The requests of all the services in an event loop go through a single `aiohttp.ClientSession`,
+which keeps up to `AUTOTRANSLATE_HTTP['POOL_SIZE']` connections alive per host.
+Requires Python 3.5+ and the `aiohttp` package.
+"""
+import asyncio
+import atexit
+import functools
+import itertools
+import os
+import threading
+import weakref
+
+from django.conf import settings
+
+from autotranslate.compat import import_optional, setting_changed, Iterable
+from autotranslate.services import GoogleAPITranslatorService, GoSlateTranslatorService
+from autotranslate.throttling import monotonic
+from autotranslate.transport import get_http_settings
+
+aiohttp = import_optional('aiohttp')
+
+# the event loop running the coroutines of the synchronous interface, in a thread of its own
+_loop = None
+_loop_thread = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+# the event loop -> its `aiohttp.ClientSession`
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_loop():
+    """
+    Returns the event loop shared by the synchronous interface of the services,
+    it is started on first use and again in a forked process.
+    """
+    global _loop, _loop_thread, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name='autotranslate-asyncio')
+            _loop_thread.daemon = True
+            _loop_thread.start()
+            _loop_pid = os.getpid()
+        return _loop
+
+
+def run(coroutine):
+    """
+    Runs the `coroutine` in the shared event loop and returns its result.
+    The threads calling the services share the loop, so do their requests the connections of its session.
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, get_loop()).result()
+
+
+@atexit.register
+def stop_loop():
+    """
+    Closes the session of the shared event loop and stops it.
+    """
+    global _loop
+    with _loop_lock:
+        loop, _loop = _loop, None
+    if loop is None or _loop_pid != os.getpid():
+        return
+    close_sessions()
+    loop.call_soon_threadsafe(loop.stop)
+    _loop_thread.join()
+    loop.close()
+
+
+def get_session():
+    """
+    Returns the `aiohttp.ClientSession` of the running event loop, it is created on first use.
+    """
+    loop = asyncio.get_event_loop()
+    with _sessions_lock:
+        # the event loops closed without closing their sessions are not kept alive by them
+        for closed in [other for other in _sessions if other.is_closed()]:
+            del _sessions[closed]
+        session = _sessions.get(loop)
+        if session is None or session.closed:
+            config = get_http_settings()
+            connector = aiohttp.TCPConnector(limit=config['POOL_SIZE'], limit_per_host=config['POOL_SIZE'])
+            timeout = aiohttp.ClientTimeout(sock_connect=config['CONNECT_TIMEOUT'],
+                                            sock_read=config['READ_TIMEOUT'])
+            session = _sessions[loop] = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return session
+
+
+async def close_session():
+    """
+    Closes the session of the running event loop, to be awaited before an event loop of the application
+    which used the services is closed.
+    """
+    with _sessions_lock:
+        session = _sessions.pop(asyncio.get_event_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+def close_sessions():
+    """
+    Closes the sessions of all the event loops.
+    """
+    with _sessions_lock:
+        sessions = list(_sessions.items())
+        _sessions.clear()
+    for loop, session in sessions:
+        if loop.is_closed() or session.closed:
+            continue
+        if not loop.is_running():
+            loop.run_until_complete(session.close())
+        elif asyncio._get_running_loop() is loop:
+            # called by a coroutine of the loop
+            loop.create_task(session.close())
+        else:
+            asyncio.run_coroutine_threadsafe(session.close(), loop).result()
+
+
+def reset_sessions(*args, **kwargs):
+    """
+    Closes the sessions when their settings are changed by the tests.
+    """
+    if kwargs.get('setting') == 'AUTOTRANSLATE_HTTP':
+        close_sessions()
+
+
+setting_changed.connect(reset_sessions)
+
+
+class AsyncTranslatorServiceMixin(object):
+    """
+    Implements `.translate_strings_async()` on top of the `prepare_strings`, `finish_translations`
+    methods of a service and its own `translate_segments_async` coroutine.
+    `.translate_strings()` runs it in the shared event loop, so the service can be used
+    as `AUTOTRANSLATE_TRANSLATOR_SERVICE` as well.
+    """
+    api_url = None
+
+    def __init__(self, max_segments=128, max_concurrency=None):
+        assert aiohttp, '`{}` requires `aiohttp` package'.format(self.__class__.__name__)
+        super(AsyncTranslatorServiceMixin, self).__init__(max_segments=max_segments)
+
+        self.api_url = getattr(settings, self.api_url_setting, None) or self.api_url
+        self.max_concurrency = max_concurrency or getattr(settings, 'AUTOTRANSLATE_MAX_CONCURRENCY', 16)
+        self.semaphores = weakref.WeakKeyDictionary()
+
+    def get_semaphore(self):
+        # asyncio primitives are bound to the event loop they are used in
+        loop = asyncio.get_event_loop()
+        if loop not in self.semaphores:
+            self.semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return self.semaphores[loop]
+
+    def translate_strings(self, strings, target_language, source_language='en', optimized=True):
+        translations = run(self.translate_strings_async(strings, target_language, source_language))
+        return (t for t in translations) if optimized else translations
+
+    async def translate_strings_async(self, strings, target_language, source_language='en'):
+        assert isinstance(strings, Iterable), '`strings` should a iterable containing string_types'
+        loop = asyncio.get_event_loop()
+        start = monotonic()
+        # out of the event loop: the glossary is loaded by a query of the Django ORM, which does not run in it
+        protected, segments = await loop.run_in_executor(None, functools.partial(
+            self.prepare_strings, list(strings), target_language, source_language))
+        self.strings_processed('protect', protected, target_language, source_language, monotonic() - start)
+        semaphore = self.get_semaphore()
+
+        async def translate(session, batch):
+            async with semaphore:
+                return await self.translate_segments_throttled(session, batch, target_language, source_language)
+
+        packed = self.pack(segments)
+        session = get_session()
+        results = await asyncio.gather(*[
+            translate(session, [packed.pieces[index] for index in batch]) for batch in packed.batches])
+
+        translated = [None] * len(packed.pieces)
+        for batch, result in zip(packed.batches, results):
+            for index, translation in zip(batch, result):
+                translated[index] = translation
+        start = monotonic()
+        translations = await loop.run_in_executor(None, functools.partial(
+            self.finish_translations, protected, packed.join(translated), target_language, source_language))
+        self.strings_processed('restore', protected, target_language, source_language, monotonic() - start)
+        return translations
+
+    async def translate_segments_throttled(self, session, segments, target_language, source_language='en'):
+        """
+        Sends the request of `.translate_segments_async()` through the throttle of the service
+        and reports it by `autotranslate.signals.request_sent`.
+        """
+        throttle = self.throttle
+        request_start = monotonic()
+        for attempt in itertools.count():
+            await asyncio.sleep(throttle.reserve())
+            # the limiter is shared with the other threads and event loops, so it is polled
+            while not throttle.try_acquire():
+                await asyncio.sleep(0.01)
+
+            start = monotonic()
+            try:
+                result = await self.translate_segments_async(session, segments, target_language, source_language)
+            except Exception as e:
+                retryable = self.is_retryable(e)
+                throttle.release(monotonic() - start, overloaded=retryable)
+                delay = throttle.retry_delay(attempt, e, retryable)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+            else:
+                throttle.release(monotonic() - start)
+                self.request_sent(segments, target_language, source_language, monotonic() - request_start, attempt)
+                return result
+
+    async def translate_segments_async(self, session, segments, target_language, source_language='en'):
+        """
+        Translates at most `max_segments` prepared strings in a single request.
+        """
+        raise NotImplementedError('.translate_segments_async() must be overridden.')
+
+    def is_retryable(self, error):
+        if isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError)):
+            return True
+        return super(AsyncTranslatorServiceMixin, self).is_retryable(error)
+
+
+class AsyncGoogleAPITranslatorService(AsyncTranslatorServiceMixin, GoogleAPITranslatorService):
+    """
+    Uses the REST endpoint of the paid Google API directly.
+    """
+    api_url = 'https://translation.googleapis.com/language/translate/v2'
+    api_url_setting = 'GOOGLE_TRANSLATE_URL'
+
+    async def translate_segments_async(self, session, segments, target_language, source_language='en'):
+        data = [('key', self.developer_key or ''), ('source', source_language),
+                ('target', target_language), ('format', 'html')]
+        data.extend(('q', segment) for segment in segments)
+        async with session.post(self.api_url, data=data) as response:
+            response.raise_for_status()
+            translations = (await response.json(content_type=None))['data']['translations']
+        assert len(translations) == len(segments), 'unexpected number of translations in the response'
+        return [t['translatedText'] for t in translations]
+
+
+class AsyncGoSlateTranslatorService(AsyncTranslatorServiceMixin, GoSlateTranslatorService):
+    """
+    Uses the REST endpoint of the Yandex API directly.
+    """
+    api_url = 'https://translate.yandex.net/api/v1.5/tr.json/translate'
+    api_url_setting = 'YANDEX_TRANSLATE_URL'
+
+    async def translate_segments_async(self, session, segments, target_language, source_language='en'):
+        from yandex_translate import YandexTranslateException
+
+        data = [('key', self.developer_key), ('lang', source_language+'-'+target_language), ('format', 'html')]
+        data.extend(('text', segment) for segment in segments)
+        async with session.post(self.api_url, data=data) as response:
+            result = await response.json(content_type=None)
+        if result.get('code', 200) != 200:
+            raise YandexTranslateException(result['code'])
+        assert len(result['text']) == len(segments), 'unexpected number of translations in the response'
+        return result['text']
@@ -0,0 +1,37 @@
+"""
+Splits the message files of `translate_messages --shard I/N` across N machines.
+
+Every machine finds and parses all the message files, so they all compute the same split:
+the files are assigned, largest first, to the shard with the fewest strings to translate so far,
+the ties are broken by the file name and the shard number, never by the order the files were found in.
+"""
+import re
+
+SHARD = re.compile(r'^\s*(\d+)\s*/\s*(\d+)\s*$')
+
+
+def parse_shard(value):
+    """
+    Returns the `(index, count)` of a shard given as `I/N`, counted from 1.
+    """
+    match = SHARD.match(value or '')
+    if match is None:
+        raise ValueError('the shard should be given as I/N, e.g. 1/4, not {!r}'.format(value))
+    index, count = int(match.group(1)), int(match.group(2))
+    if not 1 <= index <= count:
+        raise ValueError('the shard {}/{} should be between 1/{} and {}/{}'.format(index, count, count, count, count))
+    return index, count
+
+
+def assign_shards(weights, count):
+    """
+    Returns the shard, from 1 to `count`, of each of the `weights`, a dict mapping the work units
+    to the number of strings to translate, so the shards get about the same number of strings.
+    """
+    loads = [0] * count
+    shards = {}
+    for unit in sorted(weights, key=lambda unit: (-weights[unit], unit)):
+        shard = min(range(count), key=lambda index: (loads[index], index))
+        loads[shard] += weights[unit]
+        shards[unit] = shard + 1
+    return shards
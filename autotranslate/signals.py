@@ -0,0 +1,21 @@
+"""
+Signals for pushing the metrics of the translations to a monitoring system.
+"""
+from django.dispatch import Signal
+
+# sent by the services after every successful request, with the keyword arguments
+# `target_language`, `source_language`, `segments`, `characters`, `latency` (seconds) and `retries`
+request_sent = Signal()
+
+# sent by the services after protecting the placeholders and glossary terms of the strings (`phase` 'protect')
+# and after restoring them in the translations (`phase` 'restore'), with the keyword arguments
+# `target_language`, `source_language`, `phase`, `strings` and `elapsed` (seconds)
+strings_processed = Signal()
+
+# sent by `CachedTranslatorService` after every lookup in the translation memory,
+# with the keyword arguments `target_language`, `source_language`, `hits` and `misses`
+memory_lookup = Signal()
+
+# sent by `translate_messages` when it completes, with the keyword argument `report`,
+# the dict written to the file of `--stats`
+run_finished = Signal()
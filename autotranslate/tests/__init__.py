@@ -12,3 +12,13 @@ if sys.version_info[:2] == (2, 6) and \
    pass
 else:
    from autotranslate.tests.test_translate_messages import *
+   from autotranslate.tests.test_placeholders import *
+   from autotranslate.tests.test_cache import *
+   from autotranslate.tests.test_services import *
+   from autotranslate.tests.test_services_async import *
+   from autotranslate.tests.test_throttling import *
+   from autotranslate.tests.test_packing import *
+   from autotranslate.tests.test_sharding import *
+   from autotranslate.tests.test_runtime import *
+   from autotranslate.tests.test_content import *
+   from autotranslate.tests.test_transport import *
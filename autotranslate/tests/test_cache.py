@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import time
+
+try:
+    # python2.6
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from django.test.utils import override_settings
+
+from autotranslate.cache import SQLiteTranslationMemory
+from autotranslate.services import BaseTranslatorService, CachedTranslatorService
+
+
+class FakeTranslatorService(BaseTranslatorService):
+    def __init__(self):
+        self.requests = []
+
+    def translate_strings(self, strings, target_language, source_language='en', optimized=True):
+        self.requests.append(list(strings))
+        return [u'{}:{}'.format(target_language, s) for s in strings]
+
+
+class TranslationMemoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.memory = SQLiteTranslationMemory(':memory:')
+
+    def test_get_set(self):
+        self.memory.set_many('svc', 'en', 'de', {u'City': u'Stadt'})
+        self.assertEqual({u'City': u'Stadt'}, self.memory.get_many('svc', 'en', 'de', [u'City', u'Town']))
+        self.assertEqual({}, self.memory.get_many('svc', 'en', 'fr', [u'City']))
+        self.assertEqual({}, self.memory.get_many('other', 'en', 'de', [u'City']))
+        self.assertEqual({'hits': 1, 'misses': 3}, self.memory.stats)
+
+    def test_normalized_lookup(self):
+        self.memory.set_many('svc', 'en', 'de', {u'Cafe\u0301': u'Kaffee'})
+        self.assertEqual({u'Caf\xe9': u'Kaffee'}, self.memory.get_many('svc', 'en', 'de', [u'Caf\xe9']))
+
+    def test_evict_max_entries(self):
+        self.memory.max_entries = 2
+        self.memory.set_many('svc', 'en', 'de', {u'a': u'A'})
+        time.sleep(0.01)
+        self.memory.set_many('svc', 'en', 'de', {u'b': u'B'})
+        time.sleep(0.01)
+        self.memory.get_many('svc', 'en', 'de', [u'a'])
+        self.memory.set_many('svc', 'en', 'de', {u'c': u'C'})
+        self.assertEqual(2, len(self.memory))
+        self.assertEqual({u'a': u'A', u'c': u'C'}, self.memory.get_many('svc', 'en', 'de', [u'a', u'b', u'c']))
+
+    def test_many_texts(self):
+        texts = [u'a{}'.format(i) for i in range(2500)]
+        self.memory.set_many('svc', 'en', 'de', dict((text, text.upper()) for text in texts[::2]))
+        found = self.memory.get_many('svc', 'en', 'de', texts)
+        self.assertEqual(dict((text, text.upper()) for text in texts[::2]), found)
+        self.assertEqual(set(texts[::2]), self.memory.contains_many('svc', 'en', 'de', texts))
+
+    def test_evict_slack(self):
+        self.memory.max_entries = 100
+        for i in range(110):
+            self.memory.set_many('svc', 'en', 'de', {u'a{}'.format(i): u'A'})
+        # evicted past the slack only
+        self.assertEqual(110, len(self.memory))
+        self.memory.set_many('svc', 'en', 'de', {u'b': u'B'})
+        self.assertEqual(100, len(self.memory))
+
+    def test_evict_max_age(self):
+        self.memory.set_many('svc', 'en', 'de', {u'a': u'A'})
+        self.memory.max_age = 0.001
+        time.sleep(0.01)
+        self.assertEqual({}, self.memory.get_many('svc', 'en', 'de', [u'a']))
+        self.memory.evict()
+        self.assertEqual(0, len(self.memory))
+
+    def test_default_location(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            with override_settings(AUTOTRANSLATE_CACHE_DIR=cache_dir):
+                memory = SQLiteTranslationMemory()
+                memory.set_many('svc', 'en', 'de', {u'City': u'Stadt'})
+                # kept between the runs
+                self.assertEqual({u'City': u'Stadt'},
+                                 SQLiteTranslationMemory().get_many('svc', 'en', 'de', [u'City']))
+            self.assertEqual(os.path.join(cache_dir, 'translation_memory.sqlite3'), memory.location)
+        finally:
+            shutil.rmtree(cache_dir)
+
+
+class CachedTranslatorServiceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.service = FakeTranslatorService()
+        self.translator = CachedTranslatorService(self.service, SQLiteTranslationMemory(':memory:'))
+
+    def test_translate_strings(self):
+        self.assertEqual([u'de:a', u'de:b', u'de:a'],
+                         self.translator.translate_strings([u'a', u'b', u'a'], 'de', 'en', False))
+        self.assertEqual([[u'a', u'b']], self.service.requests)
+
+        self.assertEqual([u'de:c', u'de:b'], self.translator.translate_strings([u'c', u'b'], 'de', 'en', False))
+        self.assertEqual([[u'a', u'b'], [u'c']], self.service.requests)
+
+    def test_translate_strings_cached(self):
+        self.translator.translate_strings([u'a'], 'de', 'en', False)
+        self.assertEqual([u'de:a'], list(self.translator.translate_strings([u'a'], 'de')))
+        self.assertEqual(u'de:a', self.translator.translate_string(u'a', 'de'))
+        self.assertEqual(1, len(self.service.requests))
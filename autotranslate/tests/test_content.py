@@ -0,0 +1,64 @@
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import models
+from django.test import TransactionTestCase
+from django.test.utils import override_settings
+
+from autotranslate.content import localized_field_name, translate_fields
+from autotranslate.services import BaseTranslatorService
+
+
+class Article(models.Model):
+    title = models.CharField(max_length=100, blank=True)
+    title_de = models.CharField(max_length=100, blank=True)
+    title_pt_br = models.CharField(max_length=100, blank=True)
+    body = models.TextField(blank=True)
+    body_de = models.TextField(blank=True)
+    body_pt_br = models.TextField(blank=True)
+
+    class Meta:
+        app_label = 'autotranslate'
+
+
+class RecordingTranslatorService(BaseTranslatorService):
+    requests = []
+
+    def translate_segments(self, segments, target_language, source_language='en'):
+        self.requests.append((target_language, list(segments)))
+        return [u'{}:{}'.format(target_language, segment) for segment in segments]
+
+
+@override_settings(AUTOTRANSLATE_TRANSLATOR_SERVICE='autotranslate.tests.test_content.RecordingTranslatorService')
+class TranslateFieldsTestCase(TransactionTestCase):
+    def setUp(self):
+        del RecordingTranslatorService.requests[:]
+        for index in range(5):
+            Article.objects.create(title=u'News', body=u'Body {}'.format(index % 3))
+
+    def test_localized_field_name(self):
+        self.assertEqual('title_pt_br', localized_field_name('title', 'pt-BR'))
+
+    def test_translate_fields(self):
+        counts = translate_fields(Article, ['title', 'body'], ['de', 'pt-BR'], chunk_size=2)
+        self.assertEqual(5, counts['rows'])
+        self.assertEqual(5, counts['updated'])
+        # identical values are translated once, also across the chunks
+        self.assertEqual({'de': 4, 'pt-BR': 4}, counts['strings'])
+        self.assertEqual(4, len(RecordingTranslatorService.requests))
+
+        article = Article.objects.order_by('pk')[2]
+        self.assertEqual(u'de:News', article.title_de)
+        self.assertEqual(u'pt-BR:Body 2', article.body_pt_br)
+
+        # the translated fields are left with --untranslated
+        Article.objects.filter(pk=article.pk).update(body_de=u'')
+        del RecordingTranslatorService.requests[:]
+        call_command('translate_fields', 'autotranslate.Article', 'title', 'body', locale=['de'],
+                     skip_translated=True)
+        self.assertEqual([('de', [u'Body 2'])], RecordingTranslatorService.requests)
+        self.assertEqual(u'de:Body 2', Article.objects.get(pk=article.pk).body_de)
+
+    def test_missing_field(self):
+        with self.assertRaises(CommandError):
+            call_command('translate_fields', 'autotranslate.Article', 'title', locale=['fr'])
+        self.assertEqual([], RecordingTranslatorService.requests)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+try:
+    # python2.6
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from autotranslate.packing import pack, split_text
+from autotranslate.services import PseudoTranslatorService
+
+
+class SplitTextTestCase(unittest.TestCase):
+    def test_sentences(self):
+        text = u'Hello world. This is a test!\nAnother sentence here? x'
+        pieces, separators = split_text(text, 30)
+        self.assertEqual([u'Hello world. This is a test!', u'Another sentence here? x'], pieces)
+        self.assertEqual([u'\n'], separators)
+
+    def test_words(self):
+        pieces, separators = split_text(u'abcdefghij klmnopqr stu', 8)
+        self.assertEqual([u'abcdefgh', u'ij', u'klmnopqr', u'stu'], pieces)
+        self.assertEqual([u'', u' ', u' '], separators)
+
+    def test_tags(self):
+        text = u'abcdef<T123P0/>ghijklmn<T123T12/>opq' * 20
+        pieces, separators = split_text(text, 16)
+        self.assertEqual(text, u''.join(pieces))
+        for piece in pieces:
+            self.assertTrue(len(piece) <= 16)
+            # every tag is whole in a piece
+            self.assertEqual(piece.count(u'<'), piece.count(u'>'))
+        self.assertEqual([u'abcdef<T123P0/>g', u'hijklmn', u'<T123T12/>opqabc'], pieces[:3])
+
+        # a tag longer than a request is kept whole
+        self.assertEqual([u'ab', u'<T123P0/>', u'cd'], split_text(u'ab<T123P0/>cd', 4)[0])
+
+
+class PackTestCase(unittest.TestCase):
+    def test_segments_only(self):
+        packed = pack([u'a', u'b', u'c'], 2)
+        self.assertEqual([[0, 1], [2]], packed.batches)
+
+    def test_in_order(self):
+        packed = pack([u'a', u'b', u'c' * 9], 2, 10)
+        self.assertEqual([[0, 1], [2]], packed.batches)
+
+    def test_decreasing(self):
+        strings = [u'a' * 30, u'b' * 40, u'c' * 30, u'd' * 40]
+        packed = pack(strings, 128, 70)
+        self.assertEqual([[0, 1], [2, 3]], packed.batches)
+        self.assertEqual(strings, packed.join(packed.pieces))
+
+    def test_oversized(self):
+        strings = [u'Short.', u'A first sentence. A second sentence.']
+        packed = pack(strings, 128, 20)
+        self.assertEqual([u'Short.', u'A first sentence.', u'A second sentence.'], packed.pieces)
+        for batch in packed.batches:
+            self.assertTrue(sum(len(packed.pieces[index]) for index in batch) <= 20)
+        self.assertEqual(strings, packed.join(packed.pieces))
+
+    def test_service(self):
+        service = PseudoTranslatorService(max_characters=20, expansion=0)
+        self.assertEqual([u'[Šĥöŕţ.]', u'[À ƒíŕšţ šéñţéñçé.] [À šéçöñđ šéñţéñçé.]'],
+                         service.translate_strings([u'Short.', u'A first sentence. A second sentence.'],
+                                                   'de', 'en', False))
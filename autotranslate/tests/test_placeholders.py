@@ -0,0 +1,58 @@
+try:
+    # python2.6
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from autotranslate.placeholders import protect
+
+
+class ProtectTestCase(unittest.TestCase):
+    def assertTemplate(self, template, text):
+        self.assertEqual(template, protect(text).template)
+
+    def test_named_placeholders(self):
+        self.assertTemplate(u'foo <T123P0/> bar', u'foo %(item)s bar')
+        self.assertTemplate(u'foo <T123P0/> bar', u'foo %(item_name)d bar')
+        self.assertEqual((u'%(item_name)s',), protect(u'foo %(item_name)s bar').placeholders)
+
+        self.assertTemplate(u'foo % (item)s bar', u'foo % (item)s bar')
+
+    def test_positional_placeholders(self):
+        self.assertTemplate(u'foo <T123P0/> bar', u'foo %s bar')
+        self.assertTemplate(u'foo <T123P0/> bar', u'foo %.2f bar')
+        self.assertTemplate(u'foo <T123P0/> bar <T123P1/>', u'foo %s bar %s')
+        self.assertTemplate(u'foo <T123P0/><T123P1/>', u'foo %s%s')
+        self.assertTemplate(u'100%% sure', u'100%% sure')
+
+    def test_percent_in_prose(self):
+        self.assertTemplate(u'50%off', u'50%off')
+        self.assertTemplate(u'10%x faster, %i', u'10%x faster, %i')
+        self.assertTemplate(u'<T123P0/> of <T123P1/> at <T123P2/>', u'%5i of %(total)x at %.1e')
+
+    def test_format_placeholders(self):
+        self.assertTemplate(u'foo <T123P0/> bar <T123P1/>', u'foo {name} bar {0:>3}')
+
+    def test_html(self):
+        self.assertTemplate(u'<T123P0/>foo<T123P1/> <T123P2/>', u'<a href="/">foo</a> <br/>')
+
+
+class RestoreTestCase(unittest.TestCase):
+    def assertRestored(self, expected, text, translation):
+        self.assertEqual(expected, protect(text).restore(translation))
+
+    def test_restore_placeholders(self):
+        self.assertRestored(u'baz %(item)s zilot', u'foo %(item)s bar', u'baz <T123P0/> zilot')
+        self.assertRestored(u'baz%(item_name)szilot', u'foo %(item_name)s bar', u'baz<t123p0 />zilot')
+        self.assertRestored(u'baz %s zilot', u'foo %s bar', u'baz <T123P0></T123P0> zilot')
+        self.assertRestored(u'baz %s%s zilot', u'foo %s%s bar', u'baz <T123P0/><T123P1/> zilot')
+        self.assertRestored(u'%(b)s baz %(a)s', u'%(a)s foo %(b)s', u'<T123P1/> baz <T123P0/>')
+        self.assertRestored(u'baz {name}', u'foo {name}', u'baz <T123P0/>')
+
+    def test_restore_html(self):
+        self.assertRestored(u'<b>baz</b>', u'<b>foo</b>', u'<T123P0/>baz<T123P1/>')
+
+    def test_restore_formatting(self):
+        self.assertRestored(u'\nbaz\n', u'\nfoo\n', u'baz')
+        self.assertRestored(u'"baz" & co', u'"foo" & co', u'&quot;baz&quot; &amp; co')
+        self.assertRestored(u'&amp; baz', u'&amp; foo', u'&amp; baz')
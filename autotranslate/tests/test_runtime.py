@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+import threading
+
+try:
+    # python2.6
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+import polib
+from django.test.utils import override_settings
+from django.utils import translation
+from django.utils.translation import trans_real
+
+from autotranslate.runtime import Backfill, RuntimeTranslations, install
+from autotranslate.services import BaseTranslatorService
+
+
+class CountingTranslatorService(BaseTranslatorService):
+    def __init__(self):
+        self.requests = []
+
+    def translate_segments(self, segments, target_language, source_language='en'):
+        self.requests.append((target_language, list(segments)))
+        return [segment.upper() for segment in segments]
+
+
+class BackfillTestCase(unittest.TestCase):
+    def setUp(self):
+        self.locale_path = tempfile.mkdtemp()
+        self.service = CountingTranslatorService()
+
+    def tearDown(self):
+        shutil.rmtree(self.locale_path)
+
+    def test_coalesced(self):
+        backfill = Backfill(self.service, delay=0.05, write_back=False)
+        results = []
+
+        def request():
+            results.append(backfill.translate('de', (None, u'Hello', None)))
+            results.append(backfill.translate('de', (None, u'Apple', u'Apples')))
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(backfill.wait(5))
+
+        # the source text is served meanwhile, a single request translates them
+        self.assertEqual([None] * 16, results)
+        self.assertEqual([('de', [u'Hello', u'Apple', u'Apples'])], self.service.requests)
+        self.assertEqual((u'HELLO',), backfill.translate('de', (None, u'Hello', None)))
+        self.assertEqual((u'APPLE', u'APPLES'), backfill.translate('de', (None, u'Apple', u'Apples')))
+
+    def test_write_back(self):
+        path = os.path.join(self.locale_path, 'de', 'LC_MESSAGES', 'django.po')
+        os.makedirs(os.path.dirname(path))
+        po = polib.POFile()
+        po.metadata = {'Content-Type': 'text/plain; charset=UTF-8',
+                       'Plural-Forms': 'nplurals=2; plural=(n != 1);'}
+        po.append(polib.POEntry(msgid=u'Hello', msgstr=u''))
+        po.append(polib.POEntry(msgid=u'Bye', msgstr=u'Tschuss'))
+        po.save(path)
+
+        backfill = Backfill(self.service, delay=0)
+        with override_settings(LOCALE_PATHS=[self.locale_path]):
+            for message in ((None, u'Hello', None), (None, u'Bye', None), (u'menu', u'Apple', u'Apples')):
+                backfill.translate('de', message)
+            self.assertTrue(backfill.wait(5))
+
+        po = polib.pofile(path)
+        self.assertEqual(u'HELLO', po.find(u'Hello').msgstr)
+        self.assertIn('fuzzy', po.find(u'Hello').flags)
+        self.assertEqual(u'Tschuss', po.find(u'Bye').msgstr)
+        entry = po.find(u'Apple', msgctxt=u'menu')
+        self.assertEqual({0: u'APPLE', 1: u'APPLES'}, entry.msgstr_plural)
+
+
+    def test_write_back_concurrent(self):
+        path = os.path.join(self.locale_path, 'de', 'LC_MESSAGES', 'django.po')
+        backfills = [Backfill(self.service, set_fuzzy=False) for _ in range(4)]
+
+        def write(index):
+            for n in range(10):
+                backfills[index].write_messages('de', {(None, u'm{}-{}'.format(index, n), None): (u'x',)})
+
+        with override_settings(LOCALE_PATHS=[self.locale_path]):
+            threads = [threading.Thread(target=write, args=(index,)) for index in range(len(backfills))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        # every process re-reads the file once it holds the lock, no message is lost
+        self.assertEqual(40, len(polib.pofile(path)))
+
+    def test_failed_cooldown(self):
+        service = CountingTranslatorService()
+
+        def fail(segments, target_language, source_language='en'):
+            service.requests.append((target_language, list(segments)))
+            raise ValueError('unavailable')
+        service.translate_segments = fail
+        service.is_retryable = lambda error: False
+
+        backfill = Backfill(service, delay=0, write_back=False, retry_after=60)
+        self.assertEqual(None, backfill.translate('de', (None, u'Hello', None)))
+        self.assertTrue(backfill.wait(5))
+        # not queued again by the next requests
+        self.assertEqual(None, backfill.translate('de', (None, u'Hello', None)))
+        self.assertTrue(backfill.wait(5))
+        self.assertEqual(1, len(service.requests))
+
+        backfill.retry_after = 0
+        backfill.translate('de', (None, u'Hello', None))
+        self.assertTrue(backfill.wait(5))
+        self.assertEqual(2, len(service.requests))
+
+
+class InstallTestCase(unittest.TestCase):
+    def test_gettext(self):
+        backfill = Backfill(CountingTranslatorService(), delay=0, write_back=False)
+        with override_settings(LANGUAGE_CODE='en', LOCALE_PATHS=[]):
+            with translation.override('de'):
+                install('de', backfill)
+                install('de', backfill)
+                try:
+                    self.assertEqual(u'A new message', translation.ugettext(u'A new message'))
+                    self.assertEqual(u'new apples', translation.ungettext(u'new apple', u'new apples', 2))
+                    self.assertEqual(u'Menu', translation.pgettext(u'context', u'Menu'))
+                    self.assertTrue(backfill.wait(5))
+
+                    self.assertEqual(u'A NEW MESSAGE', translation.ugettext(u'A new message'))
+                    self.assertEqual(u'NEW APPLES', translation.ungettext(u'new apple', u'new apples', 2))
+                    self.assertEqual(u'NEW APPLE', translation.ungettext(u'new apple', u'new apples', 1))
+                    self.assertEqual(u'MENU', translation.pgettext(u'context', u'Menu'))
+                    self.assertEqual([u'A new message', u'new apple', u'new apples', u'Menu'],
+                                     [string for language, strings in backfill.translator.requests
+                                      for string in strings])
+                finally:
+                    de = trans_real.translation('de')
+                    if isinstance(de._fallback, RuntimeTranslations):
+                        de._fallback = de._fallback._fallback
+
+    def test_source_language(self):
+        backfill = Backfill(CountingTranslatorService(), delay=0, write_back=False)
+        install('en-us', backfill)
+        self.assertEqual(None, backfill.thread)
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+try:
+    # python2.6
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from autotranslate.glossary import Glossary
+from django.test.utils import override_settings
+
+from autotranslate.services import (GoogleAPITranslatorService, GoSlateTranslatorService, PseudoTranslationError,
+                                    PseudoTranslatorService, RouterTranslatorService)
+from autotranslate.throttling import Throttle, TokenBucket
+from autotranslate.utils import get_translator
+
+
+class FakeGoogleRequest(object):
+    def __init__(self, client, q):
+        self.client = client
+        self.q = q
+
+    def execute(self):
+        self.client.requests.append(list(self.q))
+        return {'translations': [{'translatedText': text.upper()} for text in self.q]}
+
+
+class FakeGoogleClient(object):
+    def __init__(self):
+        self.requests = []
+
+    def translations(self):
+        return self
+
+    def list(self, source, target, q):
+        return FakeGoogleRequest(self, q)
+
+
+class FakeYandexClient(object):
+    def __init__(self):
+        self.requests = []
+
+    def translate(self, text, lang, format='plain'):
+        self.requests.append(list(text))
+        return {'code': 200, 'lang': lang, 'text': [t.upper() for t in text]}
+
+
+class FakeGoogleAPITranslatorService(GoogleAPITranslatorService):
+    def build_client(self):
+        return FakeGoogleClient()
+
+
+class FakeGoSlateTranslatorService(GoSlateTranslatorService):
+    def __init__(self, max_segments=128, custom_translations=()):
+        super(FakeGoSlateTranslatorService, self).__init__(max_segments)
+        self.custom_translations = custom_translations
+        self.queries = 0
+
+    def build_client(self):
+        return FakeYandexClient()
+
+    def get_custom_translations(self, source_language, target_language):
+        self.queries += 1
+        return self.custom_translations
+
+
+class BatchingTestCase(unittest.TestCase):
+    strings = [u'one', u'two', u'three', u'four', u'five']
+
+    def assertBatched(self, service, client):
+        self.assertEqual([u'ONE', u'TWO', u'THREE', u'FOUR', u'FIVE'],
+                         service.translate_strings(list(self.strings), 'de', 'en', False))
+        self.assertEqual([[u'one', u'two'], [u'three', u'four'], [u'five']], client.requests)
+
+    def test_google_batches(self):
+        service = FakeGoogleAPITranslatorService(max_segments=2)
+        self.assertBatched(service, service.translate_obj)
+
+    def test_yandex_batches(self):
+        service = FakeGoSlateTranslatorService(max_segments=2)
+        self.assertBatched(service, service.yandex_translate_obj)
+
+    def test_single_string(self):
+        # through the same path as the batches: glossary, placeholders and retries
+        service = FakeGoSlateTranslatorService(custom_translations=[(u'city', u'Stadt', 7)])
+        self.assertEqual(u'%(count)s Stadt', service.translate_string(u'%(count)s city', 'de', 'en'))
+        self.assertEqual(1, len(service.yandex_translate_obj.requests))
+        service = FakeGoogleAPITranslatorService()
+        self.assertEqual(u'ONE', service.translate_string(u'one', 'de', 'en'))
+        self.assertEqual([[u'one']], service.translate_obj.requests)
+
+    def test_single_request(self):
+        service = FakeGoogleAPITranslatorService()
+        service.translate_strings(list(self.strings), 'de', 'en', False)
+        self.assertEqual(1, len(service.translate_obj.requests))
+
+
+class GlossaryTestCase(unittest.TestCase):
+    def test_loaded_once_per_language_pair(self):
+        service = FakeGoSlateTranslatorService(custom_translations=[(u'Django', u'Django', 1)])
+        service.translate_strings([u'Django rocks', u'Django'], 'de', 'en', False)
+        service.translate_strings([u'Django'], 'de', 'en', False)
+        self.assertEqual(1, service.queries)
+        service.translate_strings([u'Django'], 'fr', 'en', False)
+        self.assertEqual(2, service.queries)
+
+    def test_protected(self):
+        service = FakeGoSlateTranslatorService(custom_translations=[(u'city', u'Stadt', 7)])
+        self.assertEqual([u'THE Stadt'], service.translate_strings([u'the city'], 'de', 'en', False))
+        self.assertEqual([[u'the <T123T7/>']], service.yandex_translate_obj.requests)
+
+    def test_priority(self):
+        glossary = Glossary([(u'New York', u'NY', 1), (u'New', u'Neu', 2), (u'New', u'Nouveau', 3)])
+        self.assertEqual(u'<T123T1/> is <T123T2/>', glossary.protect(u'New York is New'))
+        self.assertEqual(u'NY ist Neu', glossary.restore(u'<T123T1 /> ist <t123t2/>'))
+        self.assertEqual(u'<T123T9/>', glossary.restore(u'<T123T9/>'))
+        self.assertEqual(u'NY ist Neu', glossary.restore(u'<t123t1></T123T1> ist < T123T2 / ></ T123T2 >'))
+        self.assertEqual(u'NY ist Neu', glossary.restore(u'<T123T1/> ist </T123T4><T123T2/>'))
+
+
+class PlaceholdersTestCase(unittest.TestCase):
+    def test_placeholders_restored(self):
+        service = FakeGoogleAPITranslatorService()
+        self.assertEqual([u'HELLO %(name)s, <b>{count}</b> NEW\n'],
+                         service.translate_strings([u'hello %(name)s, <b>{count}</b> new\n'], 'de', 'en', False))
+        self.assertEqual([[u'hello <T123P0/>, <T123P1/><T123P2/><T123P3/> new\n']], service.translate_obj.requests)
+
+
+class PseudoTranslatorServiceTestCase(unittest.TestCase):
+    def test_pseudo_translate(self):
+        service = PseudoTranslatorService()
+        self.assertEqual([u'[Çíţíéš~]', u'\n[%(count)s <b>çíţíéš</b> &amp; ţöŵñš~~~~]\n', u''],
+                         service.translate_strings([u'Cities', u'\n%(count)s <b>cities</b> &amp; towns\n', u''],
+                                                   'de', 'en', False))
+
+    def test_batches(self):
+        service = PseudoTranslatorService(max_segments=2, expansion=0)
+        self.assertEqual([u'[à]', u'[ƀ]', u'[ç]'], service.translate_strings([u'a', u'b', u'c'], 'de', 'en', False))
+        with self.assertRaises(AssertionError):
+            service.translate_segments([u'a', u'b', u'c'], 'de')
+
+    def test_errors(self):
+        service = PseudoTranslatorService(error_rate=0.5, seed=1)
+        service._throttle = Throttle(retries=10, backoff=0)
+        self.assertEqual([u'[Çíţíéš~]'], service.translate_strings([u'Cities'], 'de', 'en', False))
+
+        service = PseudoTranslatorService(error_rate=1)
+        service._throttle = Throttle(retries=1, backoff=0)
+        with self.assertRaises(PseudoTranslationError):
+            service.translate_strings([u'Cities'], 'de', 'en', False)
+
+
+class RecordingPseudoTranslatorService(PseudoTranslatorService):
+    def __init__(self, **kwargs):
+        super(RecordingPseudoTranslatorService, self).__init__(expansion=0, **kwargs)
+        self.strings = []
+
+    def translate_segments(self, segments, target_language, source_language='en'):
+        self.strings.extend(segments)
+        return super(RecordingPseudoTranslatorService, self).translate_segments(segments, target_language,
+                                                                                source_language)
+
+
+class RouterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.strings = [u'a{}'.format(i) for i in range(40)]
+        self.expected = [u'[à{}]'.format(i) for i in range(40)]
+
+    def test_latency_weighted(self):
+        fast, slow = RecordingPseudoTranslatorService(), RecordingPseudoTranslatorService()
+        router = RouterTranslatorService([fast, slow])
+        router.latencies = [0.01, 0.03]
+        self.assertEqual(self.expected, router.translate_strings(self.strings, 'de', 'en', False))
+        self.assertEqual(self.strings[:30], fast.strings)
+        self.assertEqual(self.strings[30:], slow.strings)
+
+    def test_rate_limit(self):
+        limited, other = RecordingPseudoTranslatorService(max_segments=2), RecordingPseudoTranslatorService()
+        limited._throttle = Throttle(rate=1)
+        limited._throttle.bucket = TokenBucket(rate=5)
+        router = RouterTranslatorService([limited, other])
+        router.latencies = [0.01, 0.01]
+        router.translate_strings(self.strings, 'de', 'en', False)
+        # at most 10 strings per second of the limited service against 100 of the other one
+        self.assertEqual(4, len(limited.strings))
+
+    def test_failover(self):
+        broken = RecordingPseudoTranslatorService(error_rate=1)
+        broken._throttle = Throttle(retries=0)
+        working = RecordingPseudoTranslatorService()
+        router = RouterTranslatorService([broken, working], cooldown=60)
+        self.assertEqual(self.expected, router.translate_strings(self.strings, 'de', 'en', False))
+        self.assertEqual(self.strings[20:] + self.strings[:20], working.strings)
+
+        # the broken service is left alone now
+        working.strings = []
+        router.translate_strings(self.strings, 'de', 'en', False)
+        self.assertEqual(self.strings, working.strings)
+
+    def test_all_failed(self):
+        services = [RecordingPseudoTranslatorService(error_rate=1) for _ in range(2)]
+        for service in services:
+            service._throttle = Throttle(retries=0)
+        with self.assertRaises(PseudoTranslationError):
+            RouterTranslatorService(services).translate_strings(self.strings, 'de', 'en', False)
+
+    def test_pool_reused(self):
+        router = RouterTranslatorService([RecordingPseudoTranslatorService(), RecordingPseudoTranslatorService()])
+        self.addCleanup(router.close)
+        router.translate_strings(self.strings, 'de', 'en', False)
+        pools = dict(router.pools)
+        self.assertEqual(1, len(pools))
+        self.assertEqual(self.expected, router.translate_strings(self.strings, 'de', 'en', False))
+        self.assertEqual(pools, router.pools)
+
+    def test_concurrent_callers(self):
+        lock = threading.Lock()
+        in_flight = [0, 0]
+
+        class SlowService(RecordingPseudoTranslatorService):
+            def translate_segments(self, segments, target_language, source_language='en'):
+                with lock:
+                    in_flight[0] += 1
+                    in_flight[1] = max(in_flight)
+                time.sleep(0.2)
+                with lock:
+                    in_flight[0] -= 1
+                return super(SlowService, self).translate_segments(segments, target_language, source_language)
+
+        router = RouterTranslatorService([SlowService(), SlowService()])
+        router.latencies = [0.01, 0.01]
+        self.addCleanup(router.close)
+        results = []
+        callers = [threading.Thread(target=lambda: results.append(
+            router.translate_strings(self.strings, 'de', 'en', False))) for _ in range(4)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+
+        self.assertEqual([self.expected] * 4, results)
+        # the callers do not queue their shares behind each other, 8 requests at once
+        self.assertTrue(in_flight[1] > 4, in_flight[1])
+        self.assertEqual(4, len(router.pools))
+
+    def test_settings(self):
+        with override_settings(AUTOTRANSLATE_TRANSLATOR_SERVICE=[
+                'autotranslate.services.PseudoTranslatorService', 'autotranslate.services.GoSlateTranslatorService']):
+            translator = get_translator()
+        self.assertIsInstance(translator, RouterTranslatorService)
+        self.assertEqual([PseudoTranslatorService, GoSlateTranslatorService],
+                         [service.__class__ for service in translator.services])
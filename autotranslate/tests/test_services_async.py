@@ -0,0 +1,179 @@
+import json
+import threading
+import time
+
+try:
+    # python2.6
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from six.moves import BaseHTTPServer, socketserver
+from django.test import TransactionTestCase
+from django.test.utils import override_settings
+from six.moves.urllib.parse import parse_qsl
+
+from autotranslate.compat import import_optional
+
+try:
+    from autotranslate import services_async
+except SyntaxError:
+    # asyncio is available in Python 3.5+ only
+    services_async = None
+
+aiohttp = import_optional('aiohttp')
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Answers like the Google (`q` parameters) or Yandex (`text` parameters) API,
+    the translation of a string is the string in upper case.
+    """
+    # keeps the connections alive
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        with server.lock:
+            server.connections.add(self.client_address)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            server.requests += 1
+
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')
+        params = parse_qsl(body)
+        time.sleep(server.latency)
+
+        if any(key == 'q' for key, value in params):
+            translations = [{'translatedText': value.upper()} for key, value in params if key == 'q']
+            result = {'data': {'translations': translations}}
+        else:
+            result = {'code': 200, 'text': [value.upper() for key, value in params if key == 'text']}
+
+        with server.lock:
+            server.in_flight -= 1
+
+        content = json.dumps(result).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.05):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), StandInHandler)
+        self.lock = threading.Lock()
+        self.latency = latency
+        self.in_flight = self.max_in_flight = self.requests = 0
+        self.connections = set()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/'.format(self.server_address[1])
+
+
+@unittest.skipUnless(services_async and aiohttp, 'requires Python 3.5+ and `aiohttp`')
+class AsyncServicesTestCase(unittest.TestCase):
+    strings = [u'string {}'.format(i) for i in range(20)]
+
+    def setUp(self):
+        self.server = StandInServer()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        services_async.close_sessions()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_service(self, service_class, **kwargs):
+        service = service_class(**kwargs)
+        service.api_url = self.server.url
+        return service
+
+    def assertTranslated(self, service_class):
+        service = self.get_service(service_class, max_segments=2, max_concurrency=4)
+        translations = services_async.run(service.translate_strings_async(self.strings, 'de'))
+        self.assertEqual([s.upper() for s in self.strings], translations)
+        self.assertEqual(10, self.server.requests)
+        self.assertTrue(1 < self.server.max_in_flight <= 4)
+
+    def test_google(self):
+        self.assertTranslated(services_async.AsyncGoogleAPITranslatorService)
+
+    def test_yandex(self):
+        self.assertTranslated(services_async.AsyncGoSlateTranslatorService)
+
+    def test_sync_interface(self):
+        service = self.get_service(services_async.AsyncGoogleAPITranslatorService, max_segments=3)
+        self.assertEqual([s.upper() for s in self.strings],
+                         service.translate_strings(list(self.strings), 'de', 'en', False))
+        self.assertEqual(7, self.server.requests)
+
+    def test_connections_reused(self):
+        service = self.get_service(services_async.AsyncGoSlateTranslatorService, max_segments=2)
+        with override_settings(AUTOTRANSLATE_HTTP={'POOL_SIZE': 3}):
+            service.translate_strings(list(self.strings), 'de', 'en', False)
+            self.assertTrue(1 < len(self.server.connections) <= 3)
+            connections = set(self.server.connections)
+
+            service.translate_strings(list(self.strings), 'de', 'en', False)
+            self.assertEqual(20, self.server.requests)
+            # kept alive by the session of the event loop
+            self.assertEqual(connections, self.server.connections)
+
+
+    def test_threads_share_loop(self):
+        from multiprocessing.pool import ThreadPool
+
+        service = self.get_service(services_async.AsyncGoogleAPITranslatorService, max_segments=5)
+        for _ in range(3):
+            # short-lived threads, as the ones of --jobs
+            pool = ThreadPool(3)
+            try:
+                results = pool.map(lambda strings: service.translate_strings(strings, 'de', 'en', False),
+                                   [self.strings] * 3)
+            finally:
+                pool.close()
+                pool.join()
+            self.assertEqual([[s.upper() for s in self.strings]] * 3, results)
+        # neither an event loop nor a session is left behind per thread
+        self.assertEqual([services_async.get_loop()], list(services_async._sessions))
+
+
+@unittest.skipUnless(services_async and aiohttp, 'requires Python 3.5+ and `aiohttp`')
+class AsyncGlossaryTestCase(TransactionTestCase):
+    def setUp(self):
+        self.server = StandInServer(latency=0)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        services_async.close_sessions()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_glossary_query(self):
+        from autotranslate.tests.test_content import Article
+
+        class GlossaryService(services_async.AsyncGoSlateTranslatorService):
+            def get_custom_translations(self, source_language, target_language):
+                # a query of the Django ORM, as the one of the glossary model
+                return list(Article.objects.order_by('pk').values_list('title', 'title_de', 'pk'))
+
+        article = Article.objects.create(title=u'New York', title_de=u'NY')
+        service = GlossaryService()
+        service.api_url = self.server.url
+        self.assertEqual([u'NY IS BIG'], service.translate_strings([u'New York is big'], 'de', 'en', False))
+        self.assertEqual({('en', 'de')}, set(service.glossaries))
+        self.assertEqual(1, len(service.get_glossary('en', 'de')))
+        article.delete()
@@ -0,0 +1,24 @@
+try:
+    # python2.6
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from autotranslate.sharding import assign_shards, parse_shard
+
+
+class ShardingTestCase(unittest.TestCase):
+    def test_parse_shard(self):
+        self.assertEqual((2, 4), parse_shard('2/4'))
+        for value in ('0/4', '5/4', '2', 'a/b'):
+            with self.assertRaises(ValueError):
+                parse_shard(value)
+
+    def test_balanced_by_strings(self):
+        weights = {'de/big.po': 90, 'de/small.po': 10, 'es/big.po': 90, 'es/small.po': 10, 'fr/empty.po': 0}
+        shards = assign_shards(weights, 2)
+        self.assertEqual([100, 100], [sum(weights[unit] for unit in shards if shards[unit] == index)
+                                      for index in (1, 2)])
+        # the same on every machine, whatever the order the files were found in
+        self.assertEqual(shards, assign_shards(dict(reversed(list(weights.items()))), 2))
+        self.assertEqual(set([1]), set(assign_shards(weights, 1).values()))
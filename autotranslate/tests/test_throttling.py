@@ -0,0 +1,101 @@
+try:
+    # python2.6
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from django.test.utils import override_settings
+
+from autotranslate.services import BaseTranslatorService
+from autotranslate.throttling import AdaptiveLimiter, Throttle, TokenBucket, error_status, get_throttle
+
+
+class FakeResponse(object):
+    def __init__(self, status):
+        self.status = status
+
+
+class FakeHttpError(Exception):
+    def __init__(self, status):
+        super(FakeHttpError, self).__init__(status)
+        self.resp = FakeResponse(status)
+
+
+class FlakyTranslatorService(BaseTranslatorService):
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.requests = 0
+
+    def translate_segments(self, segments, target_language, source_language='en'):
+        self.requests += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return [segment.upper() for segment in segments]
+
+
+class TokenBucketTestCase(unittest.TestCase):
+    def test_burst(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        self.assertEqual(0, bucket.reserve())
+        self.assertEqual(0, bucket.reserve())
+        # the third request waits for the next token
+        self.assertAlmostEqual(0.1, bucket.reserve(), places=2)
+        self.assertAlmostEqual(0.2, bucket.reserve(), places=2)
+
+
+class AdaptiveLimiterTestCase(unittest.TestCase):
+    def test_limit(self):
+        limiter = AdaptiveLimiter(max_concurrency=4, target_latency=1.0)
+        for _ in range(4):
+            self.assertTrue(limiter.try_acquire())
+        self.assertFalse(limiter.try_acquire())
+
+        limiter.release(0.1, overloaded=True)
+        self.assertEqual(2, limiter.limit)
+        limiter.release(0.1, overloaded=True)
+        self.assertEqual(1, limiter.limit)
+        limiter.release(5.0)
+        self.assertEqual(1, limiter.limit)
+        limiter.release(0.1)
+        self.assertEqual(2, limiter.limit)
+        self.assertEqual(0, limiter.in_flight)
+
+
+class ThrottleTestCase(unittest.TestCase):
+    def test_error_status(self):
+        self.assertEqual(429, error_status(FakeHttpError(429)))
+        self.assertEqual(None, error_status(ValueError()))
+
+    def test_retry(self):
+        service = FlakyTranslatorService([FakeHttpError(429), IOError('connection reset')])
+        service._throttle = Throttle(retries=2, backoff=0)
+        self.assertEqual([u'CITY'], service.translate_strings([u'City'], 'de', 'en', False))
+        self.assertEqual(3, service.requests)
+
+    def test_retries_exhausted(self):
+        service = FlakyTranslatorService([FakeHttpError(503)] * 3)
+        service._throttle = Throttle(retries=2, backoff=0)
+        with self.assertRaises(FakeHttpError):
+            service.translate_strings([u'City'], 'de', 'en', False)
+        self.assertEqual(3, service.requests)
+
+    def test_not_retryable(self):
+        service = FlakyTranslatorService([FakeHttpError(403)])
+        service._throttle = Throttle(retries=2, backoff=0)
+        with self.assertRaises(FakeHttpError):
+            service.translate_strings([u'City'], 'de', 'en', False)
+        self.assertEqual(1, service.requests)
+
+    def test_settings(self):
+        with override_settings(AUTOTRANSLATE_THROTTLE={
+                'RATE': 5, 'RETRIES': 1, 'MAX_CONCURRENCY': 8,
+                'BACKENDS': {'FlakyTranslatorService': {'RATE': 2}}}):
+            throttle = FlakyTranslatorService([]).throttle
+            self.assertEqual(2, throttle.bucket.rate)
+            self.assertEqual(1, throttle.retries)
+            self.assertEqual(8, throttle.limiter.max_concurrency)
+            self.assertEqual(5, get_throttle('GoogleAPITranslatorService').bucket.rate)
+
+        throttle = get_throttle('FlakyTranslatorService')
+        self.assertEqual(None, throttle.bucket)
+        self.assertEqual(None, throttle.limiter)
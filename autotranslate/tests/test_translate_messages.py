@@ -1,4 +1,7 @@
+import json
 import os
+import shutil
+import tempfile
 
 try:
     # python2.6
@@ -7,34 +10,30 @@ except ImportError:
     import unittest
 
 import polib
+from django.core.management.base import CommandError
+from django.test.utils import override_settings
 
-from autotranslate.management.commands.translate_messages import humanize_placeholders, restore_placeholders, Command
+from autotranslate import signals
+from autotranslate.checkpoint import Journal
+from autotranslate.management.commands.translate_messages import Command, load_worker, save_worker
+from autotranslate.services import BaseTranslatorService
 
 
-class HumanizeTestCase(unittest.TestCase):
-    def test_named_placeholders(self):
-        self.assertEqual('foo __item__ bar', humanize_placeholders('foo %(item)s bar'))
-        self.assertEqual('foo __item_name__ bar', humanize_placeholders('foo %(item_name)s bar'))
+class UpperTranslatorService(BaseTranslatorService):
+    requests = []
 
-        self.assertEqual('foo % (item)s bar', humanize_placeholders('foo % (item)s bar'))
+    def translate_segments(self, segments, target_language, source_language='en'):
+        self.requests.append((target_language, list(segments)))
+        return [segment.upper() for segment in segments]
 
-    def test_positional_placeholders(self):
-        self.assertEqual('foo __item__ bar', humanize_placeholders('foo %s bar'))
-        self.assertEqual('foo __number__ bar', humanize_placeholders('foo %d bar'))
-        self.assertEqual('foo __item__ bar __item__', humanize_placeholders('foo %s bar %s'))
-        self.assertEqual('foo __item____item__', humanize_placeholders('foo %s%s'))
 
+class BrokenTranslatorService(UpperTranslatorService):
+    broken = True
 
-class RestoreTestCase(unittest.TestCase):
-    def test_restore_placeholders(self):
-        self.assertEqual('baz %(item)s zilot',
-                         restore_placeholders('foo %(item)s bar', 'baz __over__ zilot'))
-        self.assertEqual('baz %(item_name)s zilot',
-                         restore_placeholders('foo %(item_name)s bar', 'baz __item_name__ zilot'))
-        self.assertEqual('baz %s zilot',
-                         restore_placeholders('foo %s bar', 'baz __item__ zilot'))
-        self.assertEqual('baz %s%s zilot',
-                         restore_placeholders('foo %s%s bar', 'baz __item____item__ zilot'))
+    def translate_segments(self, segments, target_language, source_language='en'):
+        if self.broken and 'Cities' in segments:
+            raise ValueError('timeout')
+        return super(BrokenTranslatorService, self).translate_segments(segments, target_language, source_language)
 
 
 class POFileTestCase(unittest.TestCase):
@@ -73,3 +72,445 @@ class POFileTestCase(unittest.TestCase):
         self.assertEqual(['PLURAL'] * (len(entry.msgstr_plural) - 1),
                          [v for k, v in entry.msgstr_plural.items() if k != 0])
         self.assertTrue(entry.translated())
+
+
+class RecordingCommand(Command):
+    def __init__(self, fail_on=None):
+        super(RecordingCommand, self).__init__()
+        self.fail_on = fail_on
+        self.translated = []
+
+    def load_catalog(self, catalog):
+        if catalog.target_language == self.fail_on:
+            raise ValueError(catalog.target_language)
+        self.translated.append(catalog.target_language)
+
+
+class WatchingCommand(Command):
+    def __init__(self, changes):
+        super(WatchingCommand, self).__init__()
+        self.changes = changes
+
+    def wait(self):
+        if not self.changes:
+            raise KeyboardInterrupt
+        self.changes.pop(0)()
+
+
+class HandleTestCase(unittest.TestCase):
+    locales = ['de', 'es', 'fr', 'it']
+
+    def setUp(self):
+        self.locale_path = tempfile.mkdtemp()
+        for locale in self.locales:
+            os.makedirs(os.path.join(self.locale_path, locale, 'LC_MESSAGES'))
+            shutil.copy(os.path.join(os.path.dirname(__file__), 'data/django.po'),
+                        os.path.join(self.locale_path, locale, 'LC_MESSAGES'))
+
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.locale_path)
+        shutil.rmtree(self.cache_dir)
+
+    def handle(self, cmd, **options):
+        options = dict(dict(locale=[], set_fuzzy=False, skip_translated=False), **options)
+        with override_settings(LOCALE_PATHS=[self.locale_path], AUTOTRANSLATE_CACHE_DIR=self.cache_dir):
+            cmd.handle(**options)
+
+    def test_find_files(self):
+        cmd = Command()
+        cmd.set_options(locale=['es', 'de'], set_fuzzy=False, skip_translated=False)
+        with override_settings(LOCALE_PATHS=[self.locale_path]):
+            files = list(cmd.find_files())
+        self.assertEqual([('de', 'django.po'), ('es', 'django.po')],
+                         [(language, file_name) for root, file_name, language in files])
+
+    def test_jobs(self):
+        cmd = RecordingCommand()
+        self.handle(cmd, jobs=4)
+        self.assertEqual(self.locales, sorted(cmd.translated))
+
+    def test_failure_exit_code(self):
+        for jobs in (1, 3):
+            cmd = RecordingCommand(fail_on='es')
+            with self.assertRaises(CommandError):
+                self.handle(cmd, jobs=jobs)
+            # the other files are translated nevertheless
+            self.assertEqual(['de', 'fr', 'it'], sorted(cmd.translated))
+
+    def test_incremental(self):
+        service = 'autotranslate.tests.test_translate_messages.UpperTranslatorService'
+        manifest = os.path.join(self.locale_path, 'manifest.json')
+        requests = UpperTranslatorService.requests
+        del requests[:]
+        with override_settings(AUTOTRANSLATE_TRANSLATOR_SERVICE=service):
+            self.handle(Command(), incremental=True, manifest=manifest)
+            self.assertEqual(self.locales, sorted(language for language, segments in requests))
+            # saved once at the end of the run
+            with open(manifest) as f:
+                self.assertEqual(len(self.locales), len(json.load(f)))
+            po = polib.pofile(os.path.join(self.locale_path, 'de', 'LC_MESSAGES', 'django.po'))
+            self.assertEqual('LOCATION', po.find('Location').msgstr)
+
+            # nothing changed
+            del requests[:]
+            self.handle(Command(), incremental=True, manifest=manifest)
+            self.assertEqual([], requests)
+
+            # only the new entry is translated
+            po.append(polib.POEntry(msgid='Street', msgstr=''))
+            po.save()
+            self.handle(Command(), incremental=True, manifest=manifest)
+            self.assertEqual([('de', ['Street'])], requests)
+
+    def test_default_paths(self):
+        service = 'autotranslate.tests.test_translate_messages.UpperTranslatorService'
+        with override_settings(AUTOTRANSLATE_TRANSLATOR_SERVICE=service):
+            self.handle(Command(), incremental=True)
+        # out of the locale paths
+        self.assertEqual(['manifest.json'], os.listdir(self.cache_dir))
+        self.assertEqual(sorted(self.locales), sorted(os.listdir(self.locale_path)))
+
+    def test_deduplication(self):
+        service = 'autotranslate.tests.test_translate_messages.UpperTranslatorService'
+        requests = UpperTranslatorService.requests
+        del requests[:]
+        # the same strings in another message file and under another context
+        de = os.path.join(self.locale_path, 'de', 'LC_MESSAGES')
+        po = polib.pofile(os.path.join(de, 'django.po'))
+        po.append(polib.POEntry(msgctxt='address', msgid='City', msgstr=''))
+        po.save()
+        shutil.copy(os.path.join(de, 'django.po'), os.path.join(de, 'djangojs.po'))
+
+        with override_settings(AUTOTRANSLATE_TRANSLATOR_SERVICE=service):
+            self.handle(Command(), locale=['de', 'es'], jobs=2)
+        self.assertEqual([('de', ['Location', 'City', 'Cities']), ('es', ['Location', 'City', 'Cities'])],
+                         sorted(requests))
+        for file_name in ('django.po', 'djangojs.po'):
+            po = polib.pofile(os.path.join(de, file_name))
+            self.assertEqual('CITY', po.find('City', msgctxt='address').msgstr)
+            self.assertEqual('CITIES', po.find('City').msgstr_plural[1])
+
+    def test_resume(self):
+        service = 'autotranslate.tests.test_translate_messages.BrokenTranslatorService'
+        checkpoint = os.path.join(self.locale_path, 'checkpoint.jsonl')
+        requests = UpperTranslatorService.requests
+        del requests[:]
+        with override_settings(AUTOTRANSLATE_TRANSLATOR_SERVICE=service, AUTOTRANSLATE_CHECKPOINT_SIZE=1):
+            BrokenTranslatorService.broken = True
+            with self.assertRaises(CommandError):
+                self.handle(Command(), locale=['de'], checkpoint=checkpoint)
+            self.assertEqual([('de', ['Location']), ('de', ['City'])], requests)
+            self.assertTrue(os.path.exists(checkpoint))
+
+            del requests[:]
+            BrokenTranslatorService.broken = False
+            self.handle(Command(), locale=['de'], checkpoint=checkpoint, resume=True)
+            self.assertEqual([('de', ['Cities'])], requests)
+            self.assertFalse(os.path.exists(checkpoint))
+
+        po = polib.pofile(os.path.join(self.locale_path, 'de', 'LC_MESSAGES', 'django.po'))
+        self.assertEqual('LOCATION', po.find('Location').msgstr)
+        self.assertEqual('CITIES', po.find('City').msgstr_plural[1])
+
+    def test_without_checkpoint(self):
+        service = 'autotranslate.tests.test_translate_messages.UpperTranslatorService'
+        checkpoint = os.path.join(self.locale_path, 'checkpoint.jsonl')
+        # the cache directory cannot be created
+        blocker = os.path.join(self.cache_dir, 'file')
+        open(blocker, 'w').close()
+        with override_settings(AUTOTRANSLATE_TRANSLATOR_SERVICE=service, AUTOTRANSLATE_CACHE_DIR=blocker,
+                               LOCALE_PATHS=[self.locale_path]):
+            Command().handle(locale=['de'], set_fuzzy=False, skip_translated=False)
+
+            # used by another run, which is left alone
+            journal = Journal(checkpoint)
+            journal.write('es', {u'City': u'Ciudad'})
+            try:
+                self.handle(Command(), locale=['es'], checkpoint=checkpoint)
+                with open(checkpoint) as f:
+                    self.assertEqual(1, len(f.readlines()))
+            finally:
+                journal.close(remove=True)
+        self.assertFalse(os.path.exists(checkpoint))
+
+        for locale in ('de', 'es'):
+            po = polib.pofile(os.path.join(self.locale_path, locale, 'LC_MESSAGES', 'django.po'))
+            self.assertEqual('LOCATION', po.find('Location').msgstr)
+
+    def test_write_if_changed(self):
+        service = 'autotranslate.tests.test_translate_messages.UpperTranslatorService'
+        path = os.path.join(self.locale_path, 'de', 'LC_MESSAGES', 'django.po')
+        os.chmod(path, 0o644)
+        with override_settings(AUTOTRANSLATE_TRANSLATOR_SERVICE=service):
+            cmd = Command()
+            self.handle(cmd, locale=['de'])
+            self.assertEqual(0o644, os.stat(path).st_mode & 0o777)
+            self.assertEqual('LOCATION', polib.pofile(path).find('Location').msgstr)
+
+            # the same translations, the file is not written again
+            os.utime(path, (0, 0))
+            self.handle(cmd, locale=['de'])
+            self.assertEqual(0, os.stat(path).st_mtime)
+        self.assertEqual(['django.po'], os.listdir(os.path.dirname(path)))
+
+    def test_stats(self):
+        service = 'autotranslate.tests.test_translate_messages.UpperTranslatorService'
+        stats = os.path.join(self.locale_path, 'stats.json')
+        reports = []
+
+        def receiver(sender, report, **kwargs):
+            reports.append(report)
+
+        signals.run_finished.connect(receiver)
+        try:
+            with override_settings(AUTOTRANSLATE_TRANSLATOR_SERVICE=service):
+                self.handle(Command(), locale=['de', 'es'], stats=stats)
+        finally:
+            signals.run_finished.disconnect(receiver)
+
+        with open(stats) as f:
+            report = json.load(f)
+        self.assertEqual([report], json.loads(json.dumps(reports)))
+        self.assertEqual({'total': 2, 'written': 2, 'unchanged': 0, 'failed': 0, 'compiled': 0}, report['files'])
+        self.assertEqual(['de', 'es'], sorted(report['locales']))
+        self.assertEqual({'files': 1, 'strings': 3, 'unique': 3, 'requests': 1, 'segments': 3,
+                          'characters': len('LocationCityCities'), 'retries': 0,
+                          'cache_hits': 0, 'cache_misses': 0}, report['locales']['de'])
+        for phase in ('discover', 'parse', 'extract', 'plan', 'translate', 'network', 'protect', 'restore', 'update',
+                      'save'):
+            self.assertIn(phase, report['phases'])
+
+    def test_compile(self):
+        service = 'autotranslate.tests.test_translate_messages.UpperTranslatorService'
+        path = os.path.join(self.locale_path, 'de', 'LC_MESSAGES', 'django.po')
+        mo_path = os.path.join(self.locale_path, 'de', 'LC_MESSAGES', 'django.mo')
+        with override_settings(AUTOTRANSLATE_TRANSLATOR_SERVICE=service):
+            cmd = Command()
+            self.handle(cmd, locale=['de'], compile=True)
+            mo = polib.mofile(mo_path)
+            self.assertEqual('LOCATION', mo.find('Location').msgstr)
+            self.assertEqual('CITIES', mo.find('City').msgstr_plural[1])
+
+            # neither the message file nor the .mo file changed
+            mtime = int(os.path.getmtime(path)) + 10
+            os.utime(mo_path, (mtime, mtime))
+            self.handle(cmd, locale=['de'], compile=True)
+            self.assertEqual(mtime, os.path.getmtime(mo_path))
+
+            # fuzzy translations are left out
+            self.handle(cmd, locale=['de'], compile=True, set_fuzzy=True)
+            self.assertEqual(None, polib.mofile(mo_path).find('Location'))
+
+    def test_processes(self):
+        service = 'autotranslate.tests.test_translate_messages.UpperTranslatorService'
+        manifest = os.path.join(self.locale_path, 'manifest.json')
+        with open(os.path.join(self.locale_path, 'it', 'LC_MESSAGES', 'django.po'), 'w') as f:
+            f.write('garbage')
+        with override_settings(AUTOTRANSLATE_TRANSLATOR_SERVICE=service):
+            with self.assertRaises(CommandError):
+                self.handle(Command(), processes=2, incremental=True, manifest=manifest, compile=True)
+            for locale in ('de', 'es', 'fr'):
+                path = os.path.join(self.locale_path, locale, 'LC_MESSAGES', 'django.po')
+                self.assertEqual('LOCATION', polib.pofile(path).find('Location').msgstr)
+                self.assertEqual('CITIES', polib.mofile(path[:-3] + '.mo').find('City').msgstr_plural[1])
+
+            # the manifest is recorded by the workers
+            requests = UpperTranslatorService.requests
+            del requests[:]
+            self.handle(Command(), locale=['de', 'es', 'fr'], processes=2, incremental=True, manifest=manifest)
+            self.assertEqual([], requests)
+
+    def test_worker_keeps_catalog(self):
+        root = os.path.join(self.locale_path, 'de', 'LC_MESSAGES')
+        options = {'locale': [], 'skip_translated': False, 'set_fuzzy': False, 'compile': False}
+        state = {'root': root, 'file_name': 'django.po', 'target_language': 'de', 'translated': None,
+                 'record': False}
+        with override_settings(LOCALE_PATHS=[self.locale_path]):
+            state['strings'] = load_worker((options, state))['strings']
+            state['translations'] = dict((string, string.upper()) for string in state['strings'])
+            # the file loaded is saved without parsing it again
+            result = save_worker((options, state))
+            self.assertNotIn('error', result)
+            self.assertNotIn('parse', result['phases'])
+
+            del state['translations']
+            state['strings'] = load_worker((options, state))['strings']
+            # changed meanwhile, the change is kept
+            po = polib.pofile(os.path.join(root, 'django.po'))
+            po.metadata['Last-Translator'] = u'Someone'
+            po.find('Location').msgstr = u''
+            po.save()
+            state['translations'] = dict((string, string.upper()) for string in state['strings'])
+            result = save_worker((options, state))
+            self.assertNotIn('error', result)
+            self.assertIn('parse', result['phases'])
+
+        po = polib.pofile(os.path.join(root, 'django.po'))
+        self.assertEqual('LOCATION', po.find('Location').msgstr)
+        self.assertEqual(u'Someone', po.metadata['Last-Translator'])
+
+    def test_max_parsed_size(self):
+        service = 'autotranslate.tests.test_translate_messages.UpperTranslatorService'
+        test = self
+
+        class ChangingCommand(Command):
+            def translate_plan(self, strings, target_language):
+                if target_language == 'it':
+                    po = polib.pofile(os.path.join(test.locale_path, 'it', 'LC_MESSAGES', 'django.po'))
+                    po.append(polib.POEntry(msgid='Street', msgstr=''))
+                    po.save()
+                return super(ChangingCommand, self).translate_plan(strings, target_language)
+
+        for processes in (0, 2):
+            self.tearDown()
+            self.setUp()
+            # only the first file of every process is kept parsed, the others are parsed again to be saved
+            max_size = os.path.getsize(os.path.join(self.locale_path, 'es', 'LC_MESSAGES', 'django.po'))
+            with override_settings(AUTOTRANSLATE_TRANSLATOR_SERVICE=service, AUTOTRANSLATE_MAX_PARSED_SIZE=max_size):
+                with self.assertRaises(CommandError):
+                    self.handle(ChangingCommand(), processes=processes)
+
+            for locale in self.locales:
+                po = polib.pofile(os.path.join(self.locale_path, locale, 'LC_MESSAGES', 'django.po'))
+                if locale == 'it':
+                    # changed since it was loaded, left alone
+                    self.assertEqual('', po.find('Location').msgstr)
+                    self.assertIsNotNone(po.find('Street'))
+                else:
+                    self.assertEqual('LOCATION', po.find('Location').msgstr)
+
+    def test_dry_run(self):
+        service = 'autotranslate.tests.test_translate_messages.UpperTranslatorService'
+        memory = {'LOCATION': os.path.join(self.locale_path, 'memory.sqlite3')}
+        stats = os.path.join(self.locale_path, 'stats.json')
+        path = os.path.join(self.locale_path, 'es', 'LC_MESSAGES', 'django.po')
+        with open(path, 'rb') as f:
+            contents = f.read()
+        requests = UpperTranslatorService.requests
+        with override_settings(AUTOTRANSLATE_TRANSLATOR_SERVICE=service, AUTOTRANSLATE_TRANSLATION_MEMORY=memory):
+            self.handle(Command(), locale=['de'])
+            del requests[:]
+            self.handle(Command(), locale=['de', 'es'], dry_run=True, stats=stats)
+
+        # nothing is translated or written
+        self.assertEqual([], requests)
+        with open(path, 'rb') as f:
+            self.assertEqual(contents, f.read())
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+        with open(stats) as f:
+            report = json.load(f)
+        characters = len('LocationCityCities')
+        self.assertEqual({'locale': 'es', 'strings': 3, 'characters': characters, 'requests': 1, 'cache_hits': 0},
+                         report['dry_run']['files'][path])
+        self.assertEqual({'locale': 'de', 'strings': 3, 'characters': characters, 'requests': 0, 'cache_hits': 3},
+                         report['dry_run']['files'][path.replace('/es/', '/de/')])
+        self.assertEqual({'unique': 3, 'characters': characters, 'requests': 0, 'cache_hits': 3},
+                         report['dry_run']['locales']['de'])
+        self.assertEqual({'unique': 3, 'characters': characters, 'requests': 1, 'cache_hits': 0},
+                         report['dry_run']['locales']['es'])
+
+    def test_shard(self):
+        service = 'autotranslate.tests.test_translate_messages.UpperTranslatorService'
+        reports = [os.path.join(self.locale_path, 'shard{}.json'.format(index)) for index in (1, 2)]
+        with override_settings(AUTOTRANSLATE_TRANSLATOR_SERVICE=service):
+            self.handle(Command(), shard='1/2', stats=reports[0])
+            # the other shard is missing
+            with self.assertRaises(CommandError):
+                self.handle(Command(), merge_shard=reports[:1])
+
+            self.handle(Command(), shard='2/2', stats=reports[1])
+            self.handle(Command(), merge_shard=reports)
+
+        units = []
+        for path in reports:
+            with open(path) as f:
+                shard = json.load(f)['shard']
+            self.assertEqual(2, len(shard['units']))
+            units.extend(shard['units'])
+        self.assertEqual(['0:{}/LC_MESSAGES/django.po'.format(locale) for locale in self.locales], sorted(units))
+        for locale in self.locales:
+            path = os.path.join(self.locale_path, locale, 'LC_MESSAGES', 'django.po')
+            self.assertEqual('LOCATION', polib.pofile(path).find('Location').msgstr)
+
+        with self.assertRaises(CommandError):
+            self.handle(Command(), shard='3/2')
+
+    def test_shard_incremental(self):
+        service = 'autotranslate.tests.test_translate_messages.UpperTranslatorService'
+        for extra, locale in enumerate(self.locales):
+            path = os.path.join(self.locale_path, locale, 'LC_MESSAGES', 'django.po')
+            po = polib.pofile(path)
+            for number in range(extra * 2):
+                po.append(polib.POEntry(msgid=u'Street {}'.format(number), msgstr=u''))
+            po.save()
+
+        def shard_units(manifest):
+            stats = os.path.join(self.locale_path, 'shard.json')
+            self.handle(Command(), shard='1/2', incremental=True, manifest=manifest, stats=stats)
+            with open(stats) as f:
+                return sorted(json.load(f)['shard']['units'])
+
+        with override_settings(AUTOTRANSLATE_TRANSLATOR_SERVICE=service):
+            # a machine running for the first time
+            units = shard_units(os.path.join(self.locale_path, 'first.json'))
+            # a machine which translated all the files before, they are unchanged
+            manifest = os.path.join(self.locale_path, 'manifest.json')
+            self.handle(Command(), incremental=True, manifest=manifest)
+            self.assertEqual(units, shard_units(manifest))
+        self.assertEqual(2, len(units))
+
+    def test_watch(self):
+        service = 'autotranslate.tests.test_translate_messages.UpperTranslatorService'
+        manifest = os.path.join(self.locale_path, 'manifest.json')
+        path = os.path.join(self.locale_path, 'de', 'LC_MESSAGES', 'django.po')
+        requests = UpperTranslatorService.requests
+        del requests[:]
+
+        def add_entries(*entries):
+            def change():
+                po = polib.pofile(path)
+                for msgctxt, msgid in entries:
+                    po.append(polib.POEntry(msgctxt=msgctxt, msgid=msgid, msgstr=u''))
+                po.save()
+            return change
+
+        # nothing changed, a new message, a message translated before in another context
+        cmd = WatchingCommand([lambda: None, add_entries((None, u'Country')), add_entries((u'map', u'City'))])
+        with override_settings(AUTOTRANSLATE_TRANSLATOR_SERVICE=service):
+            self.handle(cmd, locale=['de'], watch=True, manifest=manifest)
+
+        self.assertEqual([('de', [u'Location', u'City', u'Cities']), ('de', [u'Country'])], requests)
+        po = polib.pofile(path)
+        self.assertEqual(u'COUNTRY', po.find(u'Country').msgstr)
+        self.assertEqual(u'CITY', po.find(u'City', msgctxt=u'map').msgstr)
+        self.assertEqual(None, cmd.cache)
+
+    def test_watch_change_during_run(self):
+        service = 'autotranslate.tests.test_translate_messages.UpperTranslatorService'
+        manifest = os.path.join(self.locale_path, 'manifest.json')
+        path = os.path.join(self.locale_path, 'de', 'LC_MESSAGES', 'django.po')
+
+        class ChangingCommand(WatchingCommand):
+            changed = False
+
+            def translate_plan(self, strings, target_language):
+                if not self.changed:
+                    # `makemessages` while the first run translates
+                    self.changed = True
+                    po = polib.pofile(path)
+                    po.append(polib.POEntry(msgid=u'Country', msgstr=u''))
+                    po.save()
+                return super(ChangingCommand, self).translate_plan(strings, target_language)
+
+        cmd = ChangingCommand([lambda: None, lambda: None])
+        with override_settings(AUTOTRANSLATE_TRANSLATOR_SERVICE=service):
+            self.handle(cmd, locale=['de'], watch=True, manifest=manifest)
+
+        # not overwritten by the first run, translated by the next one
+        po = polib.pofile(path)
+        self.assertEqual(u'COUNTRY', po.find(u'Country').msgstr)
+        self.assertEqual(u'LOCATION', po.find(u'Location').msgstr)
+
@@ -0,0 +1,84 @@
+import json
+
+try:
+    # python2.6
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+import six
+from django.test.utils import override_settings
+
+from autotranslate.compat import import_optional
+from autotranslate.services import GoogleAPITranslatorService, GoSlateTranslatorService
+from autotranslate.transport import Transport, get_transport
+
+requests = import_optional('requests')
+
+
+class FakeAdapter(requests.adapters.BaseAdapter if requests else object):
+    """
+    Answers the requests of the transport with the `responses` by URL, without any network.
+    """
+
+    def __init__(self, responses):
+        super(FakeAdapter, self).__init__()
+        self.responses = responses
+        self.requests = []
+
+    def send(self, request, timeout=None, **kwargs):
+        self.requests.append((request, timeout))
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.headers['Content-Type'] = 'application/json'
+        response._content = json.dumps(self.responses(request)).encode('utf-8')
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+@unittest.skipUnless(requests, 'requires `requests` package')
+class TransportTestCase(unittest.TestCase):
+    def test_pool(self):
+        transport = Transport(pool_size=4, connect_timeout=1, read_timeout=2)
+        adapter = transport.session.get_adapter('https://translate.yandex.net/')
+        self.assertEqual(4, adapter.poolmanager.connection_pool_kw['maxsize'])
+        self.assertEqual((1, 2), transport.timeout)
+
+    @override_settings(AUTOTRANSLATE_HTTP={'CONNECT_TIMEOUT': 3, 'READ_TIMEOUT': 7},
+                       YANDEX_TRANSLATE_KEY='key')
+    def test_yandex(self):
+        def respond(request):
+            text = [value for name, value in six.moves.urllib.parse.parse_qsl(request.body) if name == 'text']
+            return {'code': 200, 'lang': 'en-de', 'text': [t.upper() for t in text]}
+
+        adapter = FakeAdapter(respond)
+        transport = get_transport()
+        transport.session.mount('https://', adapter)
+        self.assertIs(transport, get_transport())
+
+        service = GoSlateTranslatorService()
+        service.get_custom_translations = lambda source_language, target_language: []
+        self.assertEqual([u'ONE', u'TWO'], service.translate_strings([u'one', u'two'], 'de', 'en', False))
+        self.assertEqual([u'THREE'], service.translate_strings([u'three'], 'de', 'en', False))
+        # every request goes through the pooled session, with the timeouts of the settings
+        self.assertEqual([(3, 7), (3, 7)], [timeout for request, timeout in adapter.requests])
+
+    @unittest.skipIf(six.PY2 or not import_optional('googleapiclient.discovery'),
+                     'requires `google-api-python-client` with the discovery documents built in')
+    @override_settings(AUTOTRANSLATE_HTTP={}, GOOGLE_TRANSLATE_KEY='key')
+    def test_google(self):
+        def respond(request):
+            query = six.moves.urllib.parse.parse_qsl(six.moves.urllib.parse.urlparse(request.url).query)
+            return {'data': {'translations': [{'translatedText': value.upper()}
+                                              for name, value in query if name == 'q']}}
+
+        adapter = FakeAdapter(respond)
+        get_transport().session.mount('https://', adapter)
+        service = GoogleAPITranslatorService()
+        self.assertEqual([u'ONE', u'TWO'], service.translate_strings([u'one', u'two'], 'de', 'en', False))
+        self.assertEqual(1, len(adapter.requests))
@@ -0,0 +1,215 @@
+"""
+Rate limiting, retries and adaptive concurrency of the requests sent to the translation services.
+
+Every service gets a `Throttle` of its own, configured by `AUTOTRANSLATE_THROTTLE`:
+
+- a token bucket spacing the requests to at most `RATE` per second, with bursts of `BURST`
+- retries of the quota errors, 5xx responses and network errors, with exponential backoff and full jitter
+- an additive increase/multiplicative decrease limit of the requests in flight,
+  shrinking on quota errors and on latencies above `TARGET_LATENCY`
+"""
+import itertools
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+monotonic = getattr(time, 'monotonic', time.time)
+
+
+def error_status(error):
+    """
+    Returns the HTTP status of the response that raised `error`, if any.
+    """
+    # aiohttp.ClientResponseError
+    status = getattr(error, 'status', None)
+    if status is None:
+        # googleapiclient.errors.HttpError
+        status = getattr(getattr(error, 'resp', None), 'status', None)
+    if status is None:
+        # requests.HTTPError
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket(object):
+    """
+    Allows `rate` requests per second on average and bursts of `burst` requests.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(1, rate))
+        self.tokens = self.burst
+        self.updated = monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes a token and returns the number of seconds to wait until it is available.
+        """
+        with self.lock:
+            now = monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+
+class AdaptiveLimiter(object):
+    """
+    Limits the number of requests in flight, between `min_concurrency` and `max_concurrency`.
+
+    The limit grows by one per round of successful requests and is halved on overload,
+    a latency above `target_latency` shrinks it slowly.
+    """
+
+    def __init__(self, max_concurrency, min_concurrency=1, target_latency=None):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = max(1, min(min_concurrency, max_concurrency))
+        self.target_latency = target_latency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def try_acquire(self):
+        with self.condition:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency, overloaded=False):
+        with self.condition:
+            self.in_flight -= 1
+            if overloaded:
+                self.limit = self.limit / 2
+            elif self.target_latency is not None and latency > self.target_latency:
+                self.limit = self.limit * 0.9
+            else:
+                self.limit = self.limit + 1 / self.limit
+            self.limit = min(self.max_concurrency, max(self.min_concurrency, self.limit))
+            self.condition.notify_all()
+
+
+class Throttle(object):
+    """
+    Sends the requests of a service through its rate limit, concurrency limit and retries.
+    """
+
+    def __init__(self, rate=None, burst=None, retries=3, backoff=0.5, max_backoff=30.0,
+                 max_concurrency=None, min_concurrency=1, target_latency=None):
+        """
+        :param rate:            requests per second, None for no rate limit
+        :param burst:           requests allowed at once, defaults to `rate`
+        :param retries:         retries of a failed request before giving up
+        :param backoff:         the maximum delay before the first retry in seconds, doubled on every retry
+        :param max_backoff:     the maximum delay before a retry in seconds
+        :param max_concurrency: maximum number of requests in flight, None for no limit
+        :param min_concurrency: the adaptive limit never goes below this number
+        :param target_latency:  latency in seconds above which the adaptive limit shrinks
+        """
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.limiter = AdaptiveLimiter(max_concurrency, min_concurrency, target_latency) \
+            if max_concurrency else None
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def reserve(self):
+        """
+        Returns the number of seconds to wait before sending the next request.
+        """
+        return self.bucket.reserve() if self.bucket is not None else 0
+
+    def try_acquire(self):
+        return self.limiter.try_acquire() if self.limiter is not None else True
+
+    def acquire(self):
+        if self.limiter is not None:
+            self.limiter.acquire()
+
+    def release(self, latency, overloaded=False):
+        if self.limiter is not None:
+            self.limiter.release(latency, overloaded)
+
+    def retry_delay(self, attempt, error, retryable):
+        """
+        Returns the number of seconds to wait before retrying the request which raised `error`,
+        or None if it should not be retried.
+        """
+        if not retryable or attempt >= self.retries:
+            return None
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        logger.warning('request failed with {!r}, retrying in {:.2f}s'.format(error, delay))
+        return delay
+
+    def call(self, func, args, is_retryable):
+        """
+        Returns `func(*args)`, retrying it while `is_retryable(error)` allows.
+        """
+        for attempt in itertools.count():
+            delay = self.reserve()
+            if delay:
+                time.sleep(delay)
+
+            self.acquire()
+            start = monotonic()
+            try:
+                result = func(*args)
+            except Exception as e:
+                retryable = is_retryable(e)
+                self.release(monotonic() - start, overloaded=retryable)
+                delay = self.retry_delay(attempt, e, retryable)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+            else:
+                self.release(monotonic() - start)
+                return result
+
+
+def get_throttle(backend):
+    """
+    Returns a new `Throttle` for the `backend` service class name, configured by `AUTOTRANSLATE_THROTTLE`.
+
+    e.g.
+    AUTOTRANSLATE_THROTTLE = {
+        'RATE': 10,
+        'BURST': 20,
+        'RETRIES': 5,
+        'BACKOFF': 0.5,
+        'MAX_BACKOFF': 30,
+        'MAX_CONCURRENCY': 16,
+        'MIN_CONCURRENCY': 1,
+        'TARGET_LATENCY': 2.0,
+        'BACKENDS': {
+            'GoSlateTranslatorService': {'RATE': 5},
+        },
+    }
+    """
+    config = dict(getattr(settings, 'AUTOTRANSLATE_THROTTLE', None) or {})
+    config.update(config.pop('BACKENDS', {}).get(backend, {}))
+    return Throttle(
+        rate=config.get('RATE'),
+        burst=config.get('BURST'),
+        retries=config.get('RETRIES', 3),
+        backoff=config.get('BACKOFF', 0.5),
+        max_backoff=config.get('MAX_BACKOFF', 30.0),
+        max_concurrency=config.get('MAX_CONCURRENCY'),
+        min_concurrency=config.get('MIN_CONCURRENCY', 1),
+        target_latency=config.get('TARGET_LATENCY'),
+    )
@@ -0,0 +1,143 @@
+"""
+The HTTP transport shared by the translator services.
+
+The requests of all the services and threads go through a single `requests.Session`,
+its connection pool keeps the connections alive, so the TLS handshake is paid once per connection
+instead of once per request.
+
+    AUTOTRANSLATE_HTTP = {
+        'POOL_SIZE': 10,
+        'CONNECT_TIMEOUT': 10,
+        'READ_TIMEOUT': 60,
+    }
+"""
+import threading
+
+from django.conf import settings
+
+from autotranslate.compat import import_optional, setting_changed
+
+DEFAULTS = {
+    # connections kept alive per host, as many requests are sent at once
+    'POOL_SIZE': 10,
+    # wait for more connections instead of opening ones which are not kept
+    'POOL_BLOCK': False,
+    'CONNECT_TIMEOUT': 10,
+    'READ_TIMEOUT': 60,
+}
+
+
+class Transport(object):
+    """
+    Sends the requests of the services through a pool of keep-alive connections.
+
+    It is thread safe: the connections are taken from the pool by one request at a time,
+    and the APIs of the services do not set cookies, the only other state of the session.
+    """
+
+    def __init__(self, pool_size=DEFAULTS['POOL_SIZE'], pool_block=DEFAULTS['POOL_BLOCK'],
+                 connect_timeout=DEFAULTS['CONNECT_TIMEOUT'], read_timeout=DEFAULTS['READ_TIMEOUT']):
+        """
+        :param pool_size:       connections kept alive per host
+        :param pool_block:      wait for a connection of the pool when they are all in use
+        :param connect_timeout: seconds to wait for a connection
+        :param read_timeout:    seconds to wait for a response
+        """
+        requests = import_optional('requests')
+        assert requests, 'the HTTP transport requires `requests` package'
+        adapters = import_optional('requests.adapters')
+
+        self.session = requests.Session()
+        adapter = adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=pool_block)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.timeout = (connect_timeout, read_timeout)
+
+    def request(self, method, url, **kwargs):
+        """
+        Returns the `requests.Response` of the request, see `requests.Session.request()`.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class Httplib2Response(dict):
+    """
+    The `httplib2.Response` of a `requests.Response`: its headers lowercased, `status` and `reason`.
+    """
+
+    def __init__(self, response):
+        super(Httplib2Response, self).__init__((name.lower(), value) for name, value in response.headers.items())
+        self.status = response.status_code
+        self.reason = response.reason
+        self['status'] = str(response.status_code)
+
+
+class Httplib2Transport(object):
+    """
+    The `httplib2.Http` interface of the `Transport`, for the clients of `google-api-python-client`.
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        response = self.transport.request(method, uri, data=body, headers=headers,
+                                          allow_redirects=redirections > 0)
+        return Httplib2Response(response), response.content
+
+
+def get_http_settings():
+    """
+    Returns `AUTOTRANSLATE_HTTP` with the defaults of the keys missing.
+    """
+    return dict(DEFAULTS, **(getattr(settings, 'AUTOTRANSLATE_HTTP', None) or {}))
+
+
+def create_transport():
+    """
+    Returns a new `Transport` configured by `AUTOTRANSLATE_HTTP`.
+    """
+    config = get_http_settings()
+    return Transport(pool_size=config['POOL_SIZE'], pool_block=config['POOL_BLOCK'],
+                     connect_timeout=config['CONNECT_TIMEOUT'], read_timeout=config['READ_TIMEOUT'])
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_transport():
+    """
+    Returns the shared `Transport`, it is created on first use.
+    """
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = create_transport()
+    return _transport
+
+
+def reset_transport(*args, **kwargs):
+    """
+    Discards the shared `Transport` when its settings are changed by the tests.
+    """
+    global _transport
+    if kwargs.get('setting') == 'AUTOTRANSLATE_HTTP':
+        with _transport_lock:
+            if _transport is not None:
+                _transport.close()
+            _transport = None
+
+
+setting_changed.connect(reset_transport)
@@ -1,7 +1,10 @@
+import hashlib
+import os
+import threading
+
 import six
-import re
 
-from autotranslate.compat import importlib
+from autotranslate.compat import importlib, setting_changed
 from django.conf import settings
 
 
@@ -34,21 +37,108 @@ def import_from_string(val, setting_name):
                           .format(val, setting_name, e.__class__.__name__, e))
 
 
-TranslatorService = getattr(settings, 'AUTOTRANSLATE_TRANSLATOR_SERVICE',
-                            'autotranslate.services.GoSlateTranslatorService')
-translator = perform_import(TranslatorService, 'AUTOTRANSLATE_TRANSLATOR_SERVICE')()
+def get_cache_dir():
+    """
+    Returns the directory of the state kept between the runs, out of the locale paths,
+    which are usually under version control.
+    """
+    directory = getattr(settings, 'AUTOTRANSLATE_CACHE_DIR', None)
+    if directory is None:
+        root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        # one per project
+        project = hashlib.sha1(os.path.abspath(settings.LOCALE_PATHS[0]).encode('utf-8')).hexdigest()[:16]
+        directory = os.path.join(root, 'autotranslate', project)
+    try:
+        os.makedirs(directory)
+    except OSError:
+        # created meanwhile by another process
+        if not os.path.isdir(directory):
+            raise
+    return directory
 
-translate_string = translator.translate_string
-translate_strings = translator.translate_strings
 
+def get_translation_memory():
+    """
+    Returns a new translation memory configured by `AUTOTRANSLATE_TRANSLATION_MEMORY`,
+    or None if it is not enabled. The SQLite database is kept in the cache directory unless LOCATION is given.
 
-def look_placeholders(msgid, variable, translate_variable):
-    for place_holder in re.findall('_____(.*?)_____\[\[\[\[xstr\]\]\]\]', msgid):
-        if variable == place_holder:
-            return 's'
+    e.g.
+    AUTOTRANSLATE_TRANSLATION_MEMORY = {
+        'BACKEND': 'autotranslate.cache.SQLiteTranslationMemory',
+        'LOCATION': '/var/cache/autotranslate.sqlite3',
+        'MAX_ENTRIES': 500000,
+        'MAX_AGE': 60 * 60 * 24 * 180,
+    }
+    """
+    config = getattr(settings, 'AUTOTRANSLATE_TRANSLATION_MEMORY', None)
+    if not config:
+        return None
 
-    for place_holder in re.findall('_____(.*?)_____\[\[\[\[xnum\]\]\]\]', msgid):
-        if variable == place_holder:
-            return 'd'
+    backend = perform_import(config.get('BACKEND', 'autotranslate.cache.SQLiteTranslationMemory'),
+                             'AUTOTRANSLATE_TRANSLATION_MEMORY')
+    options = {'max_entries': config.get('MAX_ENTRIES'), 'max_age': config.get('MAX_AGE')}
+    if 'LOCATION' in config:
+        options['location'] = config['LOCATION']
+    return backend(**options)
+
+
+def create_translator():
+    """
+    Returns a new instance of the service configured by `AUTOTRANSLATE_TRANSLATOR_SERVICE`,
+    or a router of the services if it is a list of them,
+    wrapped by the translation memory if it is enabled.
+    """
+    service_class = getattr(settings, 'AUTOTRANSLATE_TRANSLATOR_SERVICE',
+                            'autotranslate.services.GoSlateTranslatorService')
+    service_class = perform_import(service_class, 'AUTOTRANSLATE_TRANSLATOR_SERVICE')
+    if isinstance(service_class, list):
+        # several services, the strings are split across them
+        from autotranslate.services import RouterTranslatorService
+        translator = RouterTranslatorService([cls() for cls in service_class])
     else:
-        return
+        translator = service_class()
+
+    translation_memory = get_translation_memory()
+    if translation_memory is not None:
+        from autotranslate.services import CachedTranslatorService
+        translator = CachedTranslatorService(translator, translation_memory)
+    return translator
+
+
+_translator = None
+_translator_lock = threading.Lock()
+
+
+def get_translator():
+    """
+    Returns the shared translator, it is created on first use
+    so importing the app does not import or set up any of the services.
+    """
+    global _translator
+    if _translator is None:
+        with _translator_lock:
+            if _translator is None:
+                _translator = create_translator()
+    return _translator
+
+
+def reset_translator(*args, **kwargs):
+    """
+    Discards the shared translator, e.g. when its settings are changed by the tests.
+    """
+    global _translator
+    setting = kwargs.get('setting', '')
+    if setting.startswith('AUTOTRANSLATE_') or setting.endswith('_TRANSLATE_KEY'):
+        with _translator_lock:
+            _translator = None
+
+
+setting_changed.connect(reset_translator)
+
+
+def translate_string(text, target_language, source_language='en'):
+    return get_translator().translate_string(text, target_language, source_language)
+
+
+def translate_strings(strings, target_language, source_language='en', optimized=True):
+    return get_translator().translate_strings(strings, target_language, source_language, optimized)
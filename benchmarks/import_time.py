@@ -0,0 +1,35 @@
+"""
+Measures how long importing the `translate_messages` command takes,
+i.e. what every `manage.py` invocation pays for the app, in a fresh interpreter.
+
+    python benchmarks/import_time.py [runs]
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+import time
+import django
+from django.conf import settings
+
+settings.configure(INSTALLED_APPS=['autotranslate'])
+django.setup()
+
+start = time.time()
+import autotranslate.management.commands.translate_messages
+print(time.time() - start)
+"""
+
+
+def main(runs=5):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.environ.get('PYTHONPATH', '')]))
+    timings = [float(subprocess.check_output([sys.executable, '-c', SCRIPT], env=env)) for _ in range(runs)]
+    print('import translate_messages: best {:.1f}ms, worst {:.1f}ms of {} runs'.format(
+        min(timings) * 1000, max(timings) * 1000, runs))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
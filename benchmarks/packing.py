@@ -0,0 +1,40 @@
+"""
+Measures the packing of the strings into requests on a large synthetic catalog of mixed lengths.
+
+    python benchmarks/packing.py [number of strings]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from autotranslate import packing  # noqa
+from placeholders import make_messages  # noqa
+
+# the limits of a request of the Google API
+MAX_SEGMENTS = 128
+MAX_CHARACTERS = 5000
+
+
+def main(count=100000, repeat=3):
+    strings = make_messages(count)
+    pieces = packing.pack(strings, MAX_SEGMENTS, MAX_CHARACTERS).pieces
+
+    in_order = min(timeit.repeat(lambda: packing.pack_in_order(pieces, MAX_SEGMENTS, MAX_CHARACTERS),
+                                 number=1, repeat=repeat))
+    decreasing = min(timeit.repeat(lambda: packing.pack_decreasing(pieces, MAX_SEGMENTS, MAX_CHARACTERS),
+                                   number=1, repeat=repeat))
+    total = min(timeit.repeat(lambda: packing.pack(strings, MAX_SEGMENTS, MAX_CHARACTERS), number=1, repeat=repeat))
+
+    print('{} strings, {} pieces, {} characters'.format(count, len(pieces), sum(len(piece) for piece in pieces)))
+    print('in order:   {:.3f}s, {} requests'.format(
+        in_order, len(packing.pack_in_order(pieces, MAX_SEGMENTS, MAX_CHARACTERS))))
+    print('decreasing: {:.3f}s, {} requests'.format(
+        decreasing, len(packing.pack_decreasing(pieces, MAX_SEGMENTS, MAX_CHARACTERS))))
+    print('pack:       {:.3f}s'.format(total))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,49 @@
+"""
+Measures the placeholder protect/restore engine on a synthetic catalog.
+
+    python benchmarks/placeholders.py [number of messages]
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autotranslate import placeholders  # noqa
+
+WORDS = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'adipiscing', 'elit']
+PLACEHOLDERS = ['%s', '%d', '%(name)s', '%(count)d', '{name}', '{0}', '<b>', '</b>', '<a href="/">', '</a>']
+
+
+def make_messages(count, seed=0):
+    """
+    Returns `count` messages of 1 to 200 words, about one in eight of them a placeholder.
+    """
+    generator = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        length = generator.choice([1, 3, 10, 40, 200])
+        messages.append(u' '.join(generator.choice(PLACEHOLDERS) if generator.random() < 0.125
+                                  else generator.choice(WORDS) for _ in range(length)))
+    return messages
+
+
+def main(count=20000, repeat=3):
+    messages = make_messages(count)
+    protected = placeholders.protect_many(messages)
+    # the service returns the template, in upper case
+    translations = [p.template.upper() for p in protected]
+
+    protect = min(timeit.repeat(lambda: placeholders.protect_many(messages), number=1, repeat=repeat))
+    restore = min(timeit.repeat(lambda: [p.restore(t) for p, t in zip(protected, translations)],
+                                number=1, repeat=repeat))
+
+    size = sum(len(m) for m in messages)
+    print('{} messages, {} characters'.format(count, size))
+    print('protect: {:.3f}s ({:.1f} us/message)'.format(protect, protect / count * 1e6))
+    print('restore: {:.3f}s ({:.1f} us/message)'.format(restore, restore / count * 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
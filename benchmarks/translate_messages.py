@@ -0,0 +1,226 @@
+"""
+Runs `translate_messages` end-to-end on synthetic catalogs against the pseudo-translation service
+and reports wall time, requests issued, peak memory and the time spent in every phase.
+
+    python benchmarks/translate_messages.py                         # the default suite
+    python benchmarks/translate_messages.py --large                 # and the 1M entries scenario
+    python benchmarks/translate_messages.py --entries 1000000 --locales 2 --latency 0.05 --jobs 4
+    python benchmarks/translate_messages.py --save                  # store the results as the baseline
+    python benchmarks/translate_messages.py --compare               # fail on regressions from the baseline
+
+Every scenario runs in a fresh interpreter, so the peak memory is its own.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from placeholders import make_messages  # noqa
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# entries, locales, latency of a request in seconds, jobs, processes
+SUITE = [
+    dict(entries=1000, locales=4, latency=0, jobs=1, processes=0),
+    dict(entries=10000, locales=4, latency=0, jobs=1, processes=0),
+    dict(entries=10000, locales=4, latency=0.02, jobs=1, processes=0),
+    dict(entries=10000, locales=4, latency=0.02, jobs=4, processes=0),
+    dict(entries=10000, locales=4, latency=0, jobs=1, processes=4),
+    dict(entries=80000, locales=4, latency=0, jobs=1, processes=0),
+    dict(entries=80000, locales=4, latency=0, jobs=1, processes=4),
+]
+
+# run with --large only, it takes several GB of memory and tens of minutes
+SUITE_LARGE = [
+    dict(entries=1000000, locales=1, latency=0, jobs=1, processes=0),
+]
+
+# the phases reported by `translate_messages --stats`, summed over the jobs
+PHASES = ('discover', 'parse', 'extract', 'plan', 'translate', 'network', 'protect', 'restore', 'update', 'save',
+          'compile')
+
+HEADER = u'''msgid ""
+msgstr ""
+"Content-Type: text/plain; charset=UTF-8\\n"
+"Plural-Forms: nplurals=2; plural=(n != 1);\\n"
+
+'''
+
+
+def scenario_name(scenario):
+    name = '{entries}x{locales}-latency{latency}-jobs{jobs}'.format(**scenario)
+    if scenario.get('processes'):
+        name += '-processes{processes}'.format(**scenario)
+    return name
+
+
+def quote(text):
+    return u'"{}"'.format(text.replace(u'\\', u'\\\\').replace(u'"', u'\\"').replace(u'\n', u'\\n'))
+
+
+def write_catalogs(locale_path, entries, locales, seed=0):
+    """
+    Writes a catalog of `entries` messages for each of the `locales`, one in ten of them with a plural form.
+    The catalogs are written as text, so generating them does not count towards the peak memory.
+    """
+    messages = make_messages(entries, seed)
+    for index in range(locales):
+        directory = os.path.join(locale_path, 'l{}'.format(index), 'LC_MESSAGES')
+        os.makedirs(directory)
+        with open(os.path.join(directory, 'django.po'), 'wb') as f:
+            f.write(HEADER.encode('utf-8'))
+            for number, message in enumerate(messages):
+                # the msgids of a catalog are unique
+                msgid = u'{} {}'.format(message, number)
+                if number % 10 == 0:
+                    lines = [u'msgid ' + quote(msgid), u'msgid_plural ' + quote(msgid + u' s'),
+                             u'msgstr[0] ""', u'msgstr[1] ""']
+                else:
+                    lines = [u'msgid ' + quote(msgid), u'msgstr ""']
+                f.write((u'\n'.join(lines) + u'\n\n').encode('utf-8'))
+
+
+def peak_memory(children=False):
+    """
+    Returns the peak resident memory in MB of the process, or of the largest of its worker processes
+    of --processes with `children`, or None if it is not known.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return usage / (1024.0 * 1024.0) if sys.platform == 'darwin' else usage / 1024.0
+
+
+def run_scenario(scenario):
+    """
+    Runs a single scenario in this interpreter and returns its results.
+    """
+    import django
+    from django.conf import settings
+
+    locale_path = tempfile.mkdtemp()
+    try:
+        write_catalogs(locale_path, scenario['entries'], scenario['locales'])
+        settings.configure(
+            INSTALLED_APPS=['autotranslate'],
+            USE_I18N=True,
+            LOCALE_PATHS=[locale_path],
+            AUTOTRANSLATE_TRANSLATOR_SERVICE='autotranslate.services.PseudoTranslatorService',
+            AUTOTRANSLATE_PSEUDO={'LATENCY': scenario['latency']},
+        )
+        django.setup()
+
+        from django.core.management import call_command
+
+        stats = os.path.join(locale_path, 'stats.json')
+        start = time.time()
+        call_command('translate_messages', jobs=scenario['jobs'], processes=scenario.get('processes', 0), stats=stats)
+        wall_time = time.time() - start
+        with open(stats) as f:
+            report = json.load(f)
+    finally:
+        shutil.rmtree(locale_path)
+
+    return {
+        'wall_time': wall_time,
+        'requests': sum(counters['requests'] for counters in report['locales'].values()),
+        'segments': sum(counters['segments'] for counters in report['locales'].values()),
+        'peak_memory': peak_memory(),
+        'peak_memory_workers': peak_memory(children=True) if scenario.get('processes') else None,
+        'phases': report['phases'],
+    }
+
+
+def run(scenario):
+    """
+    Runs the scenario in a fresh interpreter and returns its results.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.environ.get('PYTHONPATH', '')]))
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--run', json.dumps(scenario)],
+                                     env=env)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def format_memory(megabytes):
+    return '{:.1f}'.format(megabytes) if megabytes is not None else '?'
+
+
+def report(name, result, baseline=None):
+    memory = format_memory(result['peak_memory'])
+    if result.get('peak_memory_workers') is not None:
+        memory += '+{}'.format(format_memory(result['peak_memory_workers']))
+    line = '{:<36} {:>8.2f}s {:>7} requests {:>12} MB  {}'.format(
+        name, result['wall_time'], result['requests'], memory,
+        ' '.join('{}={:.2f}s'.format(phase, result['phases'][phase])
+                 for phase in PHASES if phase in result['phases']))
+    if baseline is not None:
+        line += '  ({:+.0%} vs baseline)'.format(result['wall_time'] / baseline['wall_time'] - 1)
+    print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, help='entries of each catalog')
+    parser.add_argument('--locales', type=int, default=4, help='number of catalogs, one per locale')
+    parser.add_argument('--latency', type=float, default=0, help='latency of a request to the fake service')
+    parser.add_argument('--jobs', type=int, default=1, help='--jobs of translate_messages')
+    parser.add_argument('--processes', type=int, default=0, help='--processes of translate_messages')
+    parser.add_argument('--large', action='store_true', help='run the 1M entries scenario as well')
+    parser.add_argument('--save', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--compare', action='store_true',
+                        help='exit with an error if a scenario is slower than the baseline by --tolerance')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown, 0.2 = 20%%')
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run:
+        print(json.dumps(run_scenario(json.loads(args.run))))
+        return 0
+
+    if args.entries:
+        suite = [dict(entries=args.entries, locales=args.locales, latency=args.latency, jobs=args.jobs,
+                      processes=args.processes)]
+    else:
+        suite = SUITE + (SUITE_LARGE if args.large else [])
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+
+    results, regressions = {}, []
+    for scenario in suite:
+        name = scenario_name(scenario)
+        results[name] = run(scenario)
+        report(name, results[name], baseline.get(name))
+        if name in baseline and results[name]['wall_time'] > baseline[name]['wall_time'] * (1 + args.tolerance):
+            regressions.append(name)
+
+    if args.save:
+        baseline.update(results)
+        with open(BASELINE, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print('baseline saved to {}'.format(BASELINE))
+
+    if args.compare and regressions:
+        print('slower than the baseline: {}'.format(', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())